@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import re
+from urllib.parse import urlsplit
+
+from lxml import etree
+
+# 네이버 뉴스 요약봇 안내 문구 (본문 줄 필터를 통과하므로 따로 지움)
+SUMMARY_NOTICE = ("자동 추출 기술로 요약된 내용입니다. 요약 기술의 특성상 본문의 주요 내용이 제외될 수 있어, "
+                  "전체 맥락을 이해하기 위해서는 기사 본문 전체보기를 권장합니다.\n"
+                  "이동 통신망을 이용하여 음성을 재생하면 별도의 데이터 통화료가 부과될 수 있습니다.")
+
+# <meta charset="..."> / <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+SNIFF_BYTES   = 4096        # 인코딩을 찾을 때 보는 앞부분 크기
+
+
+def sniff_encoding(head, default="utf-8"):
+    """HTML 앞부분의 BOM/meta 태그로 인코딩 판단 (없으면 default)"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    m = _META_CHARSET.search(head)
+    if m:
+        label = m.group(1).decode("ascii")
+        try:
+            codecs.lookup(label)
+            return label
+        except LookupError:
+            pass
+    return default
+
+
+class ExtractRule:
+    """사이트별 기사 본문 추출 규칙
+
+    - 텍스트 노드를 줄 단위로 보며 min_len자보다 길고 마침표로 끝나는 줄만 본문으로 봄
+    - 기자 이메일(@와 . 포함) 줄을 만나면 그 줄까지 넣고 끝 (뒤는 읽지 않음)
+    - root_id가 있으면 그 id의 요소 안만 보고, 요소가 끝나면 바로 끝 (페이지에 없으면 페이지 전체)
+    - skip_tags 안의 텍스트는 무시, 결과에서 remove의 문구는 지움
+    """
+
+    def __init__(self, root_id=None, min_len=20, skip_tags=("script", "style", "template"),
+                 remove=(SUMMARY_NOTICE,)):
+        self.root_id   = root_id
+        self.min_len   = min_len
+        self.skip_tags = frozenset(skip_tags)
+        self.remove    = tuple(remove)
+
+    def is_stop(self, line):
+        return "@" in line and "." in line
+
+    def accept(self, line):
+        return len(line) > self.min_len and line.endswith(".")
+
+    def finish(self, lines):
+        text = "\n".join(lines)
+        for phrase in self.remove:
+            text = text.replace(phrase, "")
+        return text.strip()
+
+
+DEFAULT_RULE = ExtractRule()
+
+# 호스트(접미사) → 규칙. 더 긴 접미사가 우선
+SITE_RULES = {
+    "news.naver.com": ExtractRule(root_id="dic_area"),
+}
+
+
+def register_rule(host, rule):
+    """사이트 규칙 추가/교체 (host는 도메인 접미사, 예: "news.naver.com")"""
+    SITE_RULES[host.lower()] = rule
+
+
+def rule_for(url):
+    host = urlsplit(url).hostname or ""
+    for suffix in sorted(SITE_RULES, key=len, reverse=True):
+        if host == suffix or host.endswith("." + suffix):
+            return SITE_RULES[suffix]
+    return DEFAULT_RULE
+
+
+class _LineFilter:
+    def __init__(self, rule):
+        self.rule  = rule
+        self.lines = []
+        self.done  = False
+
+    def feed(self, line):
+        if self.done:
+            return
+        if self.rule.is_stop(line):
+            self.lines.append(line)
+            self.done = True
+        elif self.rule.accept(line):
+            self.lines.append(line)
+
+
+class _ArticleTarget:
+    """lxml 파서 타깃 - 텍스트 노드를 문서 순서대로 줄 필터에 넘김"""
+
+    def __init__(self, rule):
+        self.rule       = rule
+        self.buf        = []
+        self.skip       = 0         # skip_tags 중첩 깊이
+        self.root_depth = 0         # root 요소 안 깊이 (0이면 밖)
+        self.root_seen  = False
+        self.root_ended = False
+        self.page       = _LineFilter(rule)
+        self.root       = _LineFilter(rule)
+
+    @property
+    def done(self):
+        if self.root_seen:
+            return self.root_ended or self.root.done
+        return self.page.done
+
+    def _flush(self):
+        if not self.buf:
+            return
+        # BeautifulSoup get_text(separator="\n", strip=True) 후 줄 나누기와 같은 결과
+        string = "".join(self.buf).strip()
+        self.buf = []
+        if not string or self.root_ended:
+            return
+        target = self.root if self.root_depth else (None if self.root_seen else self.page)
+        if target is not None:
+            for line in string.split("\n"):
+                target.feed(line)
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in self.rule.skip_tags:
+            self.skip += 1
+        if self.root_depth:
+            self.root_depth += 1
+        elif (self.rule.root_id and not self.root_seen
+              and attrib.get("id") == self.rule.root_id):
+            self.root_seen  = True
+            self.root_depth = 1
+
+    def end(self, tag):
+        self._flush()
+        if tag in self.rule.skip_tags and self.skip:
+            self.skip -= 1
+        if self.root_depth:
+            self.root_depth -= 1
+            if not self.root_depth:
+                self.root_ended = True
+
+    def data(self, text):
+        if not self.skip:
+            self.buf.append(text)
+
+    def comment(self, text):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return self.root.lines if self.root_seen else self.page.lines
+
+
+class ArticleParser:
+    """받는 대로 HTML 조각을 넣고, 본문 끝(기자 이메일 등)을 만나면 더 받지 않아도 됨
+
+    encoding(응답 헤더의 charset)이 없으면 앞부분 SNIFF_BYTES 안의 meta 태그로 정하고, 그것도 없으면 UTF-8.
+
+        parser = ArticleParser(rule_for(url), encoding)
+        async for chunk in response.aiter_bytes():
+            if parser.feed(chunk):
+                break
+        text = parser.close()
+    """
+
+    def __init__(self, rule=DEFAULT_RULE, encoding=None):
+        self.rule     = rule
+        self.target   = _ArticleTarget(rule)
+        self.encoding = encoding
+        self.parser   = None
+        self.head     = bytearray()     # 인코딩을 정할 때까지 모아 둔 앞부분
+
+    def _start(self):
+        encoding = self.encoding or sniff_encoding(bytes(self.head))
+        try:
+            self.parser = etree.HTMLParser(target=self.target, encoding=encoding)
+        except LookupError:             # libxml2가 모르는 charset 이름
+            self.parser = etree.HTMLParser(target=self.target, encoding=sniff_encoding(bytes(self.head)))
+        if self.head:
+            self.parser.feed(bytes(self.head))
+        self.head = None
+
+    def feed(self, chunk):
+        """조각 하나 파싱 → 본문을 다 찾았는지"""
+        if self.parser is None:
+            self.head += chunk
+            if self.encoding is None and len(self.head) < SNIFF_BYTES:
+                return False
+            self._start()
+        else:
+            self.parser.feed(bytes(chunk))
+        return self.target.done
+
+    def close(self):
+        if self.parser is None:
+            self._start()
+        try:
+            lines = self.parser.close()
+        except etree.XMLSyntaxError:
+            lines = self.target.close()
+        return self.rule.finish(lines)
+
+
+def extract_article(html, rule=DEFAULT_RULE, encoding=None):
+    """HTML 전체(bytes/str)에서 기사 본문 추출"""
+    if isinstance(html, str):
+        html, encoding = html.encode("utf-8"), "utf-8"
+    parser = ArticleParser(rule, encoding)
+    parser.feed(html)
+    return parser.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import av                   # PyAV: 메모리에서 바로 디코딩
+except ImportError:             # 없으면 ffmpeg 프로세스로 변환
+    av = None
+
+# ---------- 변환 설정 ----------
+TARGET_SR   = 16000             # 16kHz 모노
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg") \
+              or "C:\\ffmpeg\\bin\\ffmpeg.exe"
+
+
+def pcm_to_wav(pcm: np.ndarray, sr: int = TARGET_SR) -> bytes:
+    """16bit 모노 PCM → WAV 바이트"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(np.asarray(pcm, dtype="<i2").tobytes())
+    return buf.getvalue()
+
+
+def decode_with_av(data: bytes, sr: int = TARGET_SR) -> np.ndarray:
+    """PyAV로 메모리 디코딩 + 리샘플 → int16 모노 PCM"""
+    chunks = []
+    with av.open(io.BytesIO(data)) as container:
+        stream    = container.streams.audio[0]
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=sr)
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                chunks.append(out.to_ndarray().reshape(-1))
+        for out in resampler.resample(None):        # 남은 샘플 flush
+            chunks.append(out.to_ndarray().reshape(-1))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+
+def decode_with_ffmpeg(data: bytes, sr: int = TARGET_SR) -> np.ndarray:
+    """ffmpeg 프로세스로 디코딩 (표준 입출력 파이프, 임시 파일 없음)"""
+    cmd = [
+        FFMPEG_PATH, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-ar", str(sr),     # 샘플레이트
+        "-ac", "1",         # 모노
+        "-f", "s16le", "pipe:1"
+    ]
+    result = subprocess.run(cmd, input=data, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 변환 실패: {result.stderr.decode(errors='replace')}")
+    return np.frombuffer(result.stdout, dtype="<i2")
+
+
+def to_wav(data: bytes, sr: int = TARGET_SR) -> bytes:
+    """임의 형식(WebM 등) 오디오 바이트 → sr Hz 모노 WAV 바이트"""
+    pcm = None
+    if av is not None:
+        try:
+            pcm = decode_with_av(data, sr)
+        except (av.error.FFmpegError, IndexError, ValueError):
+            pcm = None          # PyAV가 못 읽는 입력은 ffmpeg로 재시도
+    if pcm is None:
+        pcm = decode_with_ffmpeg(data, sr)
+    if len(pcm) == 0:
+        raise RuntimeError("WAV 파일이 비어있습니다.")
+    return pcm_to_wav(pcm, sr)
+
+
+# ---------- 이어 붙이기 (문장별 TTS 결과) ----------
+def read_audio(data: bytes):
+    """WAV 등 오디오 바이트 → (float32 모노, 샘플레이트)"""
+    y, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    return y.mean(axis=1), sr
+
+
+def resample_linear(y: np.ndarray, sr: int, target_sr: int) -> np.ndarray:
+    """선형 보간 리샘플 (무음 클립 등 짧은 보조 신호용)"""
+    if sr == target_sr or len(y) == 0:
+        return y
+    n = max(int(round(len(y) * target_sr / sr)), 1)
+    return np.interp(np.linspace(0, len(y) - 1, n), np.arange(len(y)), y).astype(np.float32)
+
+
+def float_to_pcm(y: np.ndarray) -> np.ndarray:
+    return (np.clip(y, -1.0, 1.0) * 32767).astype("<i2")
+
+
+def stream_wav_header(sr: int) -> bytes:
+    """길이를 모르는 스트리밍용 WAV 헤더 (16bit 모노, 크기 필드는 최대값)"""
+    header = bytearray(pcm_to_wav(np.zeros(0, dtype=np.int16), sr))
+    header[4:8] = (0xFFFFFFFF).to_bytes(4, "little")
+    header[40:44] = (0xFFFFFFFF).to_bytes(4, "little")
+    return bytes(header)
+
+
+def concat_audio(clips, gap: bytes = None) -> bytes:
+    """오디오 바이트들을 순서대로 이어 하나의 WAV로 (사이에 gap 클립 삽입, 첫 클립 샘플레이트 기준)"""
+    pcm, sr = [], None
+    gap_y = None
+    for i, data in enumerate(clips):
+        y, clip_sr = read_audio(data)
+        if sr is None:
+            sr = clip_sr
+            if gap:
+                gap_y = resample_linear(*read_audio(gap), sr)
+        if i and gap_y is not None:
+            pcm.append(gap_y)
+        pcm.append(resample_linear(y, clip_sr, sr))
+    if sr is None:
+        raise RuntimeError("이어 붙일 오디오가 없습니다.")
+    return pcm_to_wav(float_to_pcm(np.concatenate(pcm)), sr)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+_KEY = re.compile(r"[0-9a-f]{64}")     # 캐시 키 = sha256 16진수
+
+
+class DiskLRUCache:
+    """메모리 LRU + 디스크 파일 캐시 (키 하나 = cache_dir/<key><suffix> 파일 하나)
+
+    - 메모리: 최근 사용 max_items개
+    - 디스크: 임시 파일에 쓰고 os.replace로 바꿔 넣어 여러 프로세스가 같은 디렉터리를 써도 안전.
+              읽을 때 수정 시각을 갱신하고, 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제
+    - 키는 파일 경로에 쓰므로 sha256 16진수(64자리 소문자)만 허용
+
+    하위 클래스가 suffix, binary와 _load(f), _dump(value, f)를 정함.
+    """
+
+    suffix      = ""
+    binary      = False
+    load_errors = (OSError, ValueError)     # 깨졌거나 없는 파일은 캐시에 없는 것으로
+
+    def __init__(self, cache_dir, max_items, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._mem  = OrderedDict()      # key -> 값
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def is_key(key):
+        """make_key가 만든 형식(64자리 소문자 16진수)인지"""
+        return isinstance(key, str) and _KEY.fullmatch(key) is not None
+
+    def _load(self, f):
+        raise NotImplementedError
+
+    def _dump(self, value, f):
+        raise NotImplementedError
+
+    def _path(self, key):
+        if not self.is_key(key):
+            raise ValueError(f"잘못된 캐시 키입니다: {key!r}")
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def _remember(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def contains(self, key):
+        with self._lock:
+            if key in self._mem:
+                return True
+        return self.is_key(key) and os.path.exists(self._path(key))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+        if not self.is_key(key):
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb" if self.binary else "r",
+                      encoding=None if self.binary else "utf-8") as f:
+                value = self._load(f)
+            os.utime(path)              # LRU 기준 시각 갱신
+        except self.load_errors:
+            return None
+        with self._lock:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp  = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb" if self.binary else "w",
+                  encoding=None if self.binary else "utf-8") as f:
+            self._dump(value, f)
+        os.replace(tmp, path)           # 다른 프로세스와 동시에 써도 안전
+        with self._lock:
+            self._remember(key, value)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.suffix) or name.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+
+class Subscription:
+    """구독자 하나의 이벤트 버퍼 (최대 buffer개, 넘치면 오래된 것부터 버림)
+
+    진행률 이벤트는 누적 상태라 밀린 중간 이벤트는 버려도 되고, 마지막 이벤트는 항상 남는다.
+    """
+
+    def __init__(self, hub, topic, buffer):
+        self.hub     = hub
+        self.topic   = topic
+        self.pending = deque(maxlen=buffer)     # (이벤트 ID, 데이터)
+        self.ready   = asyncio.Event()
+        self.closed  = False
+        self.dropped = 0                        # 느려서 버린 이벤트 수
+
+    @property
+    def done(self):
+        """주제가 닫혔고 받을 이벤트도 남지 않았는지"""
+        return self.closed and not self.pending
+
+    def _push(self, event):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(event)
+        self.ready.set()
+
+    def _close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def get(self, timeout=None):
+        """다음 이벤트 (이벤트 ID, 데이터) → timeout초 동안 없거나 끝났으면 None"""
+        while not self.pending:
+            if self.closed:
+                return None
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.pending.popleft()
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventHub:
+    """프로세스 안 이벤트 방송 - 작업 ID(주제)별로 한 번 발행하면 모든 구독자가 받음
+
+    - 주제마다 최근 history개 이벤트를 보관해 나중에 온 구독자와 재연결(Last-Event-ID)에 다시 보냄
+    - 이벤트 ID는 주제 안에서 1부터 증가
+    - 닫힌 주제는 linger초 동안 남겨 두었다가 (늦게 붙은 구독자도 마지막 이벤트를 받도록) 지움
+    - 이벤트 루프에서만 사용
+    """
+
+    def __init__(self, history=100, buffer=64, linger=60):
+        self.history = history
+        self.buffer  = buffer
+        self.linger  = linger
+        self.topics  = {}               # 주제 -> {"events", "last_id", "subscribers", "closed"}
+        self.expiry  = OrderedDict()    # 닫힌 주제 -> 지울 시각 (닫힌 순서)
+
+    def _sweep(self):
+        now = time.monotonic()
+        while self.expiry:
+            topic, deadline = next(iter(self.expiry.items()))
+            if deadline > now:
+                break
+            del self.expiry[topic]
+            self.topics.pop(topic, None)
+
+    def _topic(self, topic):
+        self._sweep()
+        state = self.topics.get(topic)
+        if state is None:
+            state = {"events": deque(maxlen=self.history), "last_id": 0,
+                     "subscribers": set(), "closed": False}
+            self.topics[topic] = state
+        return state
+
+    def has(self, topic):
+        self._sweep()
+        return topic in self.topics
+
+    def publish(self, topic, data):
+        """이벤트 발행 → 이벤트 ID (닫힌 주제면 None)"""
+        state = self._topic(topic)
+        if state["closed"]:
+            return None
+        state["last_id"] += 1
+        event = (state["last_id"], data)
+        state["events"].append(event)
+        for sub in state["subscribers"]:
+            sub._push(event)
+        return state["last_id"]
+
+    def close(self, topic):
+        """더 이상 발행하지 않음 - 구독자들은 남은 이벤트를 받고 끝남"""
+        state = self.topics.get(topic)
+        if state is None or state["closed"]:
+            return
+        state["closed"] = True
+        for sub in state["subscribers"]:
+            sub._close()
+        self.expiry[topic] = time.monotonic() + self.linger
+
+    def subscribe(self, topic, last_event_id=None):
+        """구독 시작 - 보관 중인 이벤트 중 last_event_id 다음 것부터 먼저 받음 (없는 주제면 KeyError)"""
+        self._sweep()
+        state = self.topics[topic]
+        sub = Subscription(self, topic, self.buffer)
+        for event in state["events"]:
+            if last_event_id is None or event[0] > last_event_id:
+                sub._push(event)
+        if state["closed"]:
+            sub._close()
+        else:
+            state["subscribers"].add(sub)
+        return sub
+
+    def _unsubscribe(self, sub):
+        state = self.topics.get(sub.topic)
+        if state is not None:
+            state["subscribers"].discard(sub)
+
+    def stats(self):
+        self._sweep()
+        return {
+            "topics": len(self.topics),
+            "subscribers": sum(len(s["subscribers"]) for s in self.topics.values())
+        }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+
+try:
+    from pykospacing import Spacing     # Keras 모델 (로드에 수 초)
+except ImportError:
+    Spacing = None
+
+MAX_CHUNK = 190         # PyKoSpacing 모델 입력 길이(약 200자) 이하로 자름
+
+_spacing = None
+_spacing_lock = threading.Lock()
+
+# 문장이 끝나는 지점 (공백을 모두 지운 텍스트 기준)
+_SENTENCE_END = re.compile(r"[.!?。]+")
+
+
+def get_spacing():
+    """PyKoSpacing 모델을 프로세스당 한 번만 로드"""
+    global _spacing
+    if _spacing is None:
+        with _spacing_lock:
+            if _spacing is None:
+                if Spacing is None:
+                    raise RuntimeError("pykospacing이 설치되어 있지 않습니다.")
+                _spacing = Spacing()
+    return _spacing
+
+
+def split_for_spacing(text, max_len=MAX_CHUNK):
+    """모델 입력 길이 이하로 자름 (가능하면 문장 끝에서, 없으면 max_len에서)"""
+    chunks = []
+    while len(text) > max_len:
+        cut = 0
+        for m in _SENTENCE_END.finditer(text, 0, max_len):
+            cut = m.end()
+        if cut < max_len // 4:
+            cut = max_len
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def space_text(text, max_len=MAX_CHUNK):
+    """공백을 지운 텍스트를 조각내 띄어쓰기 보정 후 다시 이어 붙임"""
+    spacing = get_spacing()
+    return " ".join(spacing(chunk).strip() for chunk in split_for_spacing(text, max_len))
+
+
+def space_texts(texts, max_len=MAX_CHUNK):
+    """여러 텍스트(페이지 등)를 한 번에 보정 - 스레드 전환은 묶음당 한 번"""
+    return [space_text(text, max_len) for text in texts]
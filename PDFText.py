@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+import fitz
+import numpy as np
+
+from DiskCache import DiskLRUCache
+
+LAYOUT_VERSION = 1      # 단 검출/읽기 순서 로직이 바뀌면 올려서 캐시 무효화
+
+
+def open_pdf(pdf):
+    """파일 경로 또는 PDF 바이트로 문서 열기"""
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(pdf), filetype="pdf")
+    return fitz.open(pdf)
+
+
+def page_count(pdf):
+    with open_pdf(pdf) as doc:
+        return doc.page_count
+
+
+def detect_columns(boxes, page_width, max_columns=3, min_gap=0.02, min_column=0.15,
+                   span=0.6, max_cross=0.1):
+    """블록들의 x 범위로 단 경계를 찾음 → 경계 x 좌표 목록 (1단이면 빈 목록)
+
+    폭이 페이지의 span 비율 이상인 블록은 빼고, 남은 블록이 거의 덮지 않는
+    (걸치는 블록이 max_cross 비율 이하 - 여러 단에 걸친 제목 등) 구간 중
+    폭이 min_gap 이상인 것을 넓은 순으로 최대 max_columns-1개 골라 단 사이 여백으로 본다.
+    단 폭은 min_column 비율 이상이어야 함.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    x0, x1 = boxes[:, 0], boxes[:, 2]
+    narrow = (x1 - x0) < span * page_width
+    if narrow.sum() < 2 or max_columns < 2:
+        return []
+
+    # x축 1pt 단위 점유도: 블록 시작에 +1, 끝에 -1 → 누적합
+    width = int(np.ceil(page_width)) + 1
+    coverage = np.zeros(width + 1)
+    np.add.at(coverage, np.clip(np.floor(x0[narrow]).astype(int), 0, width), 1)
+    np.add.at(coverage, np.clip(np.ceil(x1[narrow]).astype(int), 0, width), -1)
+    occupied = np.cumsum(coverage)[:width] > int(max_cross * narrow.sum() + 0.5)
+    filled = np.flatnonzero(occupied)
+    if len(filled) == 0:
+        return []
+    lo, hi = filled[0], filled[-1]
+
+    # 글자 영역 안쪽의 빈 구간 (시작, 끝)
+    empty = np.concatenate([[0], (~occupied[lo:hi + 1]).astype(int), [0]])
+    edges = np.diff(empty)
+    starts = np.flatnonzero(edges == 1) + lo
+    ends = np.flatnonzero(edges == -1) + lo
+    wide = (ends - starts) >= max(min_gap * page_width, 4)
+    starts, ends = starts[wide], ends[wide]
+
+    splits = []
+    for i in np.argsort(starts - ends):         # 넓은 여백부터
+        x = (starts[i] + ends[i]) / 2
+        bounds = sorted(splits + [x])
+        edges_x = [lo] + bounds + [hi]
+        if min(np.diff(edges_x)) >= min_column * page_width:
+            splits = bounds
+        if len(splits) >= max_columns - 1:
+            break
+    return [float(x) for x in splits]
+
+
+def reading_order(boxes, splits):
+    """블록 읽기 순서 (위→아래로 가며, 여러 단에 걸친 블록이 나오면 그 위까지를 단 순서대로 먼저 읽음)"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    if not splits:
+        return list(np.lexsort((boxes[:, 0], boxes[:, 1])))
+    first = np.searchsorted(splits, boxes[:, 0], side="right")
+    last = np.searchsorted(splits, boxes[:, 2], side="left")
+    spanning = first != last
+
+    order, band = [], [[] for _ in range(len(splits) + 1)]
+    for i in np.lexsort((boxes[:, 0], boxes[:, 1])):
+        if spanning[i]:
+            for column in band:
+                order.extend(column)
+                column.clear()
+            order.append(i)
+        else:
+            band[first[i]].append(i)
+    for column in band:
+        order.extend(column)
+    return order
+
+
+def page_layout(page, column_split_ratio=None):
+    """한 페이지의 단 경계와 읽기 순서대로 이은 텍스트 → {"columns": [...], "text": ...}
+
+    column_split_ratio를 주면 자동 검출 대신 그 비율 위치 하나로 나눔 (이전 방식).
+    """
+    if column_split_ratio is not None:
+        return {"columns": [page.rect.width * column_split_ratio],
+                "text": page_text(page, column_split_ratio)}
+    blocks = [b for b in page.get_text("blocks") if b[4].strip()]
+    if not blocks:
+        return {"columns": [], "text": ""}
+    boxes = [b[:4] for b in blocks]
+    splits = detect_columns(boxes, page.rect.width)
+    text = "\n".join(blocks[i][4] for i in reading_order(boxes, splits))
+    return {"columns": splits, "text": text}
+
+
+def page_text(page, column_split_ratio=0.5):
+    """한 페이지를 왼쪽 단 → 오른쪽 단 순서로 읽은 텍스트 (고정 비율 위치로 나눔)"""
+    blocks = page.get_text("blocks")
+    page_width = page.rect.width
+    split_x = page_width * column_split_ratio
+
+    left_col = []
+    right_col = []
+
+    for block in blocks:
+        x0, y0, x1, y1, text, *_ = block
+        if x1 < split_x:
+            left_col.append((y0, text))
+        elif x0 >= split_x:
+            right_col.append((y0, text))
+        else:
+            left_col.append((y0, text))
+
+    left_col.sort()
+    right_col.sort()
+
+    left_text = "\n".join([t for _, t in left_col])
+    right_text = "\n".join([t for _, t in right_col])
+    return left_text + "\n" + right_text
+
+
+def iter_page_layouts(pdf, column_split_ratio=None, start=0, stop=None):
+    """페이지별 레이아웃({"columns", "text"})을 하나씩 내보냄 (start ~ stop-1 페이지)"""
+    with open_pdf(pdf) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for number in range(start, stop):
+            yield page_layout(doc[number], column_split_ratio)
+
+
+def iter_pages_text(pdf, column_split_ratio=None, start=0, stop=None):
+    """페이지별 텍스트를 하나씩 내보냄 (start ~ stop-1 페이지)"""
+    for layout in iter_page_layouts(pdf, column_split_ratio, start, stop):
+        yield layout["text"]
+
+
+def extract_page_range(pdf, start, stop, column_split_ratio=None):
+    """페이지 구간 하나의 레이아웃 목록 (작업 프로세스에서 실행)"""
+    return list(iter_page_layouts(pdf, column_split_ratio, start, stop))
+
+
+def page_shards(count, shard_pages=16, first_pages=4):
+    """페이지 구간 나누기 - 첫 구간은 작게 잡아 앞 페이지가 빨리 나오도록"""
+    shards = []
+    start = 0
+    size = min(first_pages, shard_pages) if first_pages else shard_pages
+    while start < count:
+        shards.append((start, min(start + size, count)))
+        start += size
+        size = shard_pages
+    return shards
+
+
+def extract_two_columns_text(pdf_path, column_split_ratio=None):
+    return "\n\n".join(iter_pages_text(pdf_path, column_split_ratio))
+
+
+class LayoutIndexStore(DiskLRUCache):
+    """PDF 내용 해시별 레이아웃 색인 캐시 (DiskLRUCache - 메모리 LRU + 디스크 JSON)
+
+    색인: {"pages": [{"columns": [...], "text": ...}, ...], "spaced": [띄어쓰기 보정한 페이지 텍스트] (있으면)}
+    같은 PDF를 다시 올리면 파싱/띄어쓰기 없이 바로 돌려줌.
+    디스크 용량이 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제.
+    """
+
+    suffix = ".json"
+
+    def __init__(self, cache_dir=os.path.join("temp", "pdf_layout"),
+                 max_items=32, max_bytes=256 * 1024 * 1024):
+        super().__init__(cache_dir, max_items, max_bytes)
+
+    @classmethod
+    def make_key(cls, data, column_split_ratio=None):
+        return cls.finish_key(hashlib.sha256(data), column_split_ratio)
+
+    @staticmethod
+    def finish_key(h, column_split_ratio=None):
+        """PDF 내용을 모두 넣은 sha256 해시 객체로 키 만들기 (조각으로 받으면서 해시할 때)"""
+        h.update(f"|ratio={column_split_ratio}|v={LAYOUT_VERSION}".encode())
+        return h.hexdigest()
+
+    def _load(self, f):
+        return json.load(f)
+
+    def _dump(self, index, f):
+        json.dump(index, f, ensure_ascii=False)
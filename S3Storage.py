@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+
+from botocore.exceptions import ClientError
+
+MIN_PART_SIZE = 5 * 1024 * 1024     # S3 멀티파트 최소 파트 크기 (마지막 파트 제외)
+CHUNK_SIZE    = 256 * 1024          # 입력 스트림을 읽는 단위
+
+
+class EmptyUploadError(ValueError):
+    """업로드할 데이터가 한 바이트도 없음"""
+
+
+async def iter_bytes(data, chunk_size=CHUNK_SIZE):
+    """메모리의 바이트를 복사 없이 청크로 나눠 흘려보냄"""
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+async def iter_upload(file, chunk_size=CHUNK_SIZE):
+    """FastAPI UploadFile 본문을 청크 단위로 읽기"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class RecentUploads:
+    """방금 올린 객체를 메모리에 잠시 보관 (총 바이트 기준 LRU)
+
+    녹음 직후 곧바로 분석 요청이 오므로, 이 서버가 올린 파일은 S3에서
+    다시 받지 않고 여기서 꺼내 씀. 이벤트 루프에서만 사용.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_item_bytes=8 * 1024 * 1024):
+        self.max_bytes      = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.items          = OrderedDict()
+        self.size           = 0
+
+    def get(self, key):
+        data = self.items.get(key)
+        if data is not None:
+            self.items.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_item_bytes:
+            return
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class S3Storage:
+    """버킷 하나에 대한 비동기 스트리밍 업로드 (boto3 호출은 스레드에서 실행)
+
+    입력을 part_size 단위로 잘라 멀티파트로 올리고, 동시에 올라가는 파트는
+    max_concurrency개로 제한 → 업로드당 메모리는 파일 크기와 무관하게
+    약 part_size * (max_concurrency + 1).
+    part_size보다 작은 파일은 put_object 한 번으로 끝냄.
+    endpoint_url을 주면 S3 호환 서버(MinIO, moto 등)를 사용 (경로 방식 URL).
+    recent를 주면 업로드한 객체를 메모리에 남겨 두었다가 fetch에서 바로 돌려줌.
+    """
+
+    def __init__(self, client, bucket, region=None, endpoint_url=None, public_url=None,
+                 part_size=8 * 1024 * 1024, max_concurrency=4, recent=None):
+        self.client          = client
+        self.bucket          = bucket
+        self.region          = region
+        self.endpoint_url    = endpoint_url.rstrip("/") if endpoint_url else None
+        self.public_url      = public_url.rstrip("/") if public_url else None
+        self.part_size       = max(int(part_size), MIN_PART_SIZE)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.recent          = recent
+
+    # ---------- URL ----------
+    def object_url(self, key):
+        """객체의 공개 URL"""
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        if self.endpoint_url:
+            return f"{self.endpoint_url}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def key_from_url(self, url):
+        """이 버킷의 객체 URL이면 객체 키, 아니면 None"""
+        if not self.bucket or not url:
+            return None
+        prefixes = []
+        if self.public_url:
+            prefixes.append(self.public_url + "/")
+        if self.endpoint_url:
+            prefixes.append(f"{self.endpoint_url}/{self.bucket}/")
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                key = unquote(urlsplit(url).path[len(urlsplit(prefix).path):])
+                return key or None
+
+        parts = urlsplit(url)
+        host  = parts.netloc.lower()
+        path  = unquote(parts.path.lstrip("/"))
+        if parts.scheme not in ("http", "https") or not host.endswith(".amazonaws.com"):
+            return None
+        # 가상 호스트 방식: {bucket}.s3[.{region}].amazonaws.com/{key}
+        if host.startswith(self.bucket.lower() + ".s3"):
+            return path or None
+        # 경로 방식: s3[.{region}].amazonaws.com/{bucket}/{key}
+        if host.startswith("s3") and path.startswith(self.bucket + "/"):
+            return path[len(self.bucket) + 1:] or None
+        return None
+
+    async def exists(self, key):
+        """객체가 버킷에 있는지"""
+        if self.recent is not None and self.recent.get(key) is not None:
+            return True
+        try:
+            await self._call(self.client.head_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    # ---------- 다운로드 ----------
+    async def fetch(self, key):
+        """객체를 메모리로 읽기 (최근 업로드 캐시 → S3 순)"""
+        if self.recent is not None:
+            data = self.recent.get(key)
+            if data is not None:
+                return data
+
+        def read():
+            res = self.client.get_object(Bucket=self.bucket, Key=key)
+            with res["Body"] as body:
+                return body.read()
+
+        data = await asyncio.to_thread(read)
+        if self.recent is not None:
+            self.recent.put(key, data)
+        return data
+
+    # ---------- 업로드 ----------
+    async def _call(self, fn, **kwargs):
+        return await asyncio.to_thread(fn, **kwargs)
+
+    async def _upload_part(self, key, upload_id, number, body, slots):
+        try:
+            res = await self._call(self.client.upload_part, Bucket=self.bucket, Key=key,
+                                   UploadId=upload_id, PartNumber=number, Body=body)
+            return {"ETag": res["ETag"], "PartNumber": number}
+        finally:
+            slots.release()
+
+    async def upload(self, key, chunks, content_type="application/octet-stream"):
+        """비동기 바이트 청크 스트림을 key로 업로드 → 업로드한 바이트 수"""
+        slots     = asyncio.Semaphore(self.max_concurrency)
+        buf       = bytearray()
+        tasks     = []
+        upload_id = None
+        total     = 0
+        # 최근 업로드 캐시에 넣을 만큼 작으면 사본을 모아 둠 (넘치면 버림)
+        keep_max  = self.recent.max_item_bytes if self.recent is not None else -1
+        kept      = bytearray() if keep_max >= 0 else None
+
+        async def submit(body):
+            nonlocal upload_id
+            if upload_id is None:
+                res = await self._call(self.client.create_multipart_upload, Bucket=self.bucket,
+                                       Key=key, ContentType=content_type)
+                upload_id = res["UploadId"]
+            await slots.acquire()               # 빈 자리가 날 때까지 입력 읽기를 멈춤
+            for t in tasks:                     # 먼저 실패한 파트가 있으면 바로 중단
+                if t.done() and t.exception():
+                    slots.release()
+                    raise t.exception()
+            tasks.append(asyncio.create_task(
+                self._upload_part(key, upload_id, len(tasks) + 1, body, slots)))
+
+        try:
+            async for chunk in chunks:
+                buf += chunk
+                total += len(chunk)
+                if kept is not None:
+                    if total <= keep_max:
+                        kept += chunk
+                    else:
+                        kept = None
+                while len(buf) >= self.part_size:
+                    body = bytes(buf[:self.part_size])
+                    del buf[:self.part_size]
+                    await submit(body)
+
+            if total == 0:
+                raise EmptyUploadError("업로드할 데이터가 비어있습니다.")
+
+            if upload_id is None:               # 파트 하나도 안 되는 작은 파일
+                await self._call(self.client.put_object, Bucket=self.bucket, Key=key,
+                                 Body=bytes(buf), ContentType=content_type)
+                if kept is not None:
+                    self.recent.put(key, bytes(kept))
+                return total
+
+            if buf:
+                await submit(bytes(buf))
+                buf = bytearray()
+            parts = await asyncio.gather(*tasks)
+            await self._call(self.client.complete_multipart_upload, Bucket=self.bucket,
+                             Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+            if kept is not None:
+                self.recent.put(key, bytes(kept))
+            return total
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if upload_id is not None:           # 올라간 파트가 버킷에 남지 않도록 정리
+                try:
+                    await asyncio.shield(self._call(self.client.abort_multipart_upload,
+                                                    Bucket=self.bucket, Key=key,
+                                                    UploadId=upload_id))
+                except Exception:
+                    pass
+            raise
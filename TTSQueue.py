@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# 우선순위 (숫자가 작을수록 먼저)
+PRIORITIES = {
+    "interactive": 0,   # 사용자가 화면에서 기다리는 연습 문장
+    "bulk": 1           # 미리 만들어 두는 문장 (한가할 때 처리)
+}
+
+
+class TTSQueue:
+    """TTS 서버로 가는 합성 작업 대기열
+
+    - 동시에 TTS 서버로 보내는 작업은 concurrency개 (워커를 미리 띄워 둠)
+    - 우선순위 순으로 꺼내고, 같은 우선순위 안에서는 사용자별로 돌아가며 하나씩 (한 사용자가 몰아 넣어도 공평하게)
+    - bulk 작업은 reserved개 자리를 interactive용으로 비워 두고 실행
+    - 작업 상태는 info 딕셔너리(status, start_time, end_time, error ...)에 기록하고,
+      바뀔 때마다 on_change(작업 ID, info)로 알림 (작업 저장소에 다시 쓰기)
+    """
+
+    def __init__(self, concurrency=2, reserved=1, on_change=None):
+        self.concurrency  = max(int(concurrency), 1)
+        self.bulk_limit   = max(self.concurrency - int(reserved), 1)
+        self.pending      = {p: OrderedDict() for p in sorted(PRIORITIES.values())}   # 우선순위 → 사용자 → 작업들
+        self.jobs         = {}      # 작업 ID → 대기 중/실행 중인 작업
+        self.running      = {}      # 작업 ID → 실행 중인 asyncio.Task
+        self.running_bulk = 0
+        self.wakeup       = asyncio.Event()
+        self.workers      = []
+        self.closed       = False
+        self.on_change    = on_change
+
+    # ---------- 수명 ----------
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        self.closed = True
+        for task in self.workers + list(self.running.values()):
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        for job in list(self.jobs.values()):
+            if not job["future"].done():
+                job["future"].cancel()
+
+    # ---------- 작업 넣기/빼기 ----------
+    def submit(self, job_id, run, user="anonymous", priority="interactive", info=None):
+        """run()이 만드는 코루틴을 대기열에 넣음 → 결과를 받을 Future"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"알 수 없는 우선순위입니다: {priority}")
+        future = asyncio.get_running_loop().create_future()
+        # 아무도 기다리지 않는 작업(bulk)의 예외가 경고로 남지 않도록
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        job = {
+            "id": job_id,
+            "run": run,
+            "user": user or "anonymous",
+            "priority": PRIORITIES[priority],
+            "info": info if info is not None else {},
+            "future": future
+        }
+        job["info"].update(status="queued", priority=priority)
+        job["info"].setdefault("start_time", datetime.now().isoformat())
+        self.jobs[job_id] = job
+        self._enqueue(job)
+        self._changed(job)
+        return future
+
+    async def run(self, job_id, run, user="anonymous", priority="interactive", info=None):
+        """대기열을 거쳐 실행하고 결과 반환 (기다리던 쪽이 취소되면 작업도 취소)"""
+        future = self.submit(job_id, run, user, priority, info)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self.cancel(job_id)
+            raise
+
+    def _enqueue(self, job):
+        users = self.pending[job["priority"]]
+        users.setdefault(job["user"], deque()).append(job)
+        self.wakeup.set()
+
+    def _dequeue(self, job):
+        users = self.pending[job["priority"]]
+        queue = users.get(job["user"])
+        if queue is None or job not in queue:
+            return False
+        queue.remove(job)
+        if not queue:
+            del users[job["user"]]
+        return True
+
+    def promote(self, job_id, priority):
+        """대기 중인 작업의 우선순위를 올림 (interactive 요청이 같은 bulk 작업을 기다리게 된 경우)"""
+        job = self.jobs.get(job_id)
+        if job is None or PRIORITIES[priority] >= job["priority"]:
+            return
+        if self._dequeue(job):
+            job["priority"] = PRIORITIES[priority]
+            job["info"]["priority"] = priority
+            self._enqueue(job)
+            self._changed(job)
+
+    def cancel(self, job_id):
+        """대기 중이면 빼고, 실행 중이면 중단 → 취소했는지"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        if self._dequeue(job):
+            self._finish(job, "cancelled")
+            job["future"].cancel()
+            return True
+        task = self.running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return True
+        return False
+
+    def position(self, job_id):
+        """대기 중인 작업 앞에 있는 작업 수 (새로 들어오는 작업은 제외, 실행 중이거나 없으면 None)"""
+        job = self.jobs.get(job_id)
+        if job is None or job_id in self.running:
+            return None
+        ahead = 0
+        for priority, users in self.pending.items():
+            if priority < job["priority"]:
+                ahead += sum(len(queue) for queue in users.values())
+            elif priority == job["priority"]:
+                # 라운드 로빈: 내 앞 순번의 사용자는 k+1개, 뒤 순번은 k개까지 먼저 나감
+                k = users[job["user"]].index(job)
+                before = True
+                for user, queue in users.items():
+                    if user == job["user"]:
+                        ahead += k
+                        before = False
+                    else:
+                        ahead += min(len(queue), k + 1 if before else k)
+        return ahead
+
+    def stats(self):
+        names = {v: k for k, v in PRIORITIES.items()}
+        return {
+            "running": len(self.running),
+            "concurrency": self.concurrency,
+            "queued": {names[p]: sum(len(q) for q in users.values())
+                       for p, users in self.pending.items()}
+        }
+
+    # ---------- 워커 ----------
+    def _next(self):
+        for priority, users in self.pending.items():
+            if priority > 0 and self.running_bulk >= self.bulk_limit:
+                continue
+            if users:
+                # 맨 앞 사용자의 작업 하나를 꺼내고 그 사용자는 뒤로 보냄 (라운드 로빈)
+                user, queue = next(iter(users.items()))
+                job = queue.popleft()
+                if queue:
+                    users.move_to_end(user)
+                else:
+                    del users[user]
+                return job
+        return None
+
+    def _changed(self, job):
+        if self.on_change is not None:
+            self.on_change(job["id"], job["info"])
+
+    def _finish(self, job, status, error=None):
+        job["info"]["status"] = status
+        job["info"]["end_time"] = datetime.now().isoformat()
+        if error is not None:
+            job["info"]["error"] = error
+        self.jobs.pop(job["id"], None)
+        self._changed(job)
+
+    async def _worker(self):
+        while True:
+            job = self._next()
+            if job is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            bulk = job["priority"] > 0
+            self.running_bulk += bulk
+            job["info"]["status"] = "processing"
+            job["info"]["started_at"] = datetime.now().isoformat()
+            self._changed(job)
+            task = asyncio.create_task(job["run"]())
+            self.running[job["id"]] = task
+            try:
+                result = await task
+                self._finish(job, "completed")
+                if not job["future"].done():
+                    job["future"].set_result(result)
+            except asyncio.CancelledError:
+                self._finish(job, "cancelled")
+                job["future"].cancel()
+                if self.closed:
+                    raise
+            except Exception as e:
+                self._finish(job, "error", str(e))
+                if not job["future"].done():
+                    job["future"].set_exception(e)
+            finally:
+                self.running.pop(job["id"], None)
+                self.running_bulk -= bulk
+                self.wakeup.set()           # bulk 자리가 비었을 수 있음
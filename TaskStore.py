@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import redis        # TASK_STORE=redis://... 일 때만 필요
+except ImportError:
+    redis = None
+
+# 더 이상 바뀌지 않는 작업 상태
+FINISHED = ("completed", "error", "cancelled")
+
+
+class MemoryTaskStore:
+    """프로세스 메모리 작업 저장소 (기본값, 테스트용 대용으로도 사용)
+
+    마지막으로 갱신된 지 ttl초가 지난 작업은 지우고, 최대 max_items개까지만 보관.
+    get이 돌려주는 딕셔너리는 저장된 것 그 자체라 바로 고쳐도 되지만,
+    다른 저장소와 똑같이 동작하도록 고친 뒤에는 put/update로 알린다.
+    """
+
+    blocking = False        # 이벤트 루프에서 바로 호출해도 되는지 (AsyncTaskStore 참고)
+
+    def __init__(self, ttl=6 * 3600, max_items=10000):
+        self.ttl       = ttl
+        self.max_items = max_items
+        self.tasks     = OrderedDict()      # 작업 ID -> (갱신 시각, 작업 정보), 오래된 것부터
+
+    def _evict(self):
+        deadline = time.monotonic() - self.ttl
+        while self.tasks:
+            task_id, (updated, _) = next(iter(self.tasks.items()))
+            if updated > deadline and len(self.tasks) <= self.max_items:
+                break
+            del self.tasks[task_id]
+
+    def put(self, task_id, record):
+        self.tasks[task_id] = (time.monotonic(), record)
+        self.tasks.move_to_end(task_id)
+        self._evict()
+
+    def get(self, task_id):
+        self._evict()
+        entry = self.tasks.get(task_id)
+        return entry[1] if entry else None
+
+    def update(self, task_id, **fields):
+        """있는 작업에 필드를 덮어씀 → 갱신된 작업 정보 (없으면 None)"""
+        record = self.get(task_id)
+        if record is None:
+            return None
+        record.update(fields)
+        self.put(task_id, record)
+        return record
+
+    def delete(self, task_id):
+        self.tasks.pop(task_id, None)
+
+    def items(self):
+        self._evict()
+        return [(task_id, record) for task_id, (_, record) in self.tasks.items()]
+
+    def close(self):
+        pass
+
+
+class SQLiteTaskStore:
+    """SQLite 파일 작업 저장소 - 재시작해도 남고, 같은 서버의 uvicorn 워커끼리 공유 (WAL 모드)
+
+    다른 워커가 쓰는 중이면 최대 10초까지 기다릴 수 있어 AsyncTaskStore로 스레드에서 호출.
+    """
+
+    PURGE_INTERVAL = 60     # 만료된 행 정리 주기(초)
+    blocking = True
+
+    def __init__(self, path, ttl=6 * 3600):
+        self.ttl    = ttl
+        self.lock   = threading.Lock()
+        self.conn   = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.purged = 0.0
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tasks ("
+                          "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated_at)")
+
+    def _purge(self, now):
+        if now - self.purged >= self.PURGE_INTERVAL:
+            self.purged = now
+            self.conn.execute("DELETE FROM tasks WHERE updated_at < ?", (now - self.ttl,))
+
+    def _put(self, task_id, record, now):
+        self.conn.execute("INSERT OR REPLACE INTO tasks (id, data, updated_at) VALUES (?, ?, ?)",
+                          (task_id, json.dumps(record, ensure_ascii=False, default=str), now))
+
+    def _get(self, task_id, now):
+        row = self.conn.execute("SELECT data FROM tasks WHERE id = ? AND updated_at >= ?",
+                                (task_id, now - self.ttl)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, task_id, record):
+        now = time.time()
+        with self.lock:
+            self._put(task_id, record, now)
+            self._purge(now)
+
+    def get(self, task_id):
+        with self.lock:
+            return self._get(task_id, time.time())
+
+    def update(self, task_id, **fields):
+        now = time.time()
+        with self.lock:
+            # 다른 워커의 갱신과 섞이지 않도록 읽기~쓰기를 한 트랜잭션으로
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                record = self._get(task_id, now)
+                if record is not None:
+                    record.update(fields)
+                    self._put(task_id, record, now)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return record
+
+    def delete(self, task_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def items(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT id, data FROM tasks WHERE updated_at >= ? ORDER BY updated_at",
+                                     (time.time() - self.ttl,)).fetchall()
+        return [(task_id, json.loads(data)) for task_id, data in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RedisTaskStore:
+    """Redis 작업 저장소 - 여러 서버가 공유 (키마다 만료 시간, 목록은 갱신 시각 순 정렬 집합)
+
+    동기 클라이언트라 AsyncTaskStore로 스레드에서 호출.
+    """
+
+    blocking = True
+
+    def __init__(self, client, ttl=6 * 3600, prefix="task:"):
+        self.client = client
+        self.ttl    = int(ttl)
+        self.prefix = prefix
+        self.index  = f"{prefix}index"
+
+    def put(self, task_id, record):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + task_id, json.dumps(record, ensure_ascii=False, default=str), ex=self.ttl)
+        pipe.zadd(self.index, {task_id: now})
+        pipe.zremrangebyscore(self.index, "-inf", now - self.ttl)
+        pipe.execute()
+
+    def get(self, task_id):
+        data = self.client.get(self.prefix + task_id)
+        return json.loads(data) if data else None
+
+    def update(self, task_id, **fields):
+        key = self.prefix + task_id
+        result = {}
+
+        def merge(pipe):
+            # WATCH 중에 다른 쪽이 고치면 처음부터 다시
+            data = pipe.get(key)
+            record = json.loads(data) if data else None
+            if record is not None:
+                record.update(fields)
+                pipe.multi()
+                pipe.set(key, json.dumps(record, ensure_ascii=False, default=str), ex=self.ttl)
+                pipe.zadd(self.index, {task_id: time.time()})
+            result["record"] = record
+
+        self.client.transaction(merge, key)
+        return result["record"]
+
+    def delete(self, task_id):
+        pipe = self.client.pipeline()
+        pipe.delete(self.prefix + task_id)
+        pipe.zrem(self.index, task_id)
+        pipe.execute()
+
+    def items(self):
+        ids = [i.decode() if isinstance(i, bytes) else i
+               for i in self.client.zrangebyscore(self.index, time.time() - self.ttl, "+inf")]
+        if not ids:
+            return []
+        values = self.client.mget([self.prefix + task_id for task_id in ids])
+        return [(task_id, json.loads(data)) for task_id, data in zip(ids, values) if data]
+
+    def close(self):
+        self.client.close()
+
+
+def open_task_store(url="memory", ttl=6 * 3600, max_items=10000):
+    """설정 문자열로 작업 저장소 만들기
+
+    memory | sqlite:///절대/경로.db, sqlite://상대경로.db, sqlite://:memory: | redis://호스트:포트/DB번호
+    """
+    if not url or url == "memory":
+        return MemoryTaskStore(ttl, max_items)
+    if url.startswith("sqlite://"):
+        return SQLiteTaskStore(url[len("sqlite://"):] or ":memory:", ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis is None:
+            raise RuntimeError("redis 패키지가 설치되어 있지 않습니다. (pip install redis)")
+        return RedisTaskStore(redis.Redis.from_url(url), ttl)
+    raise ValueError(f"알 수 없는 작업 저장소입니다: {url}")
+
+
+class AsyncTaskStore:
+    """이벤트 루프에서 작업 저장소를 쓰기 위한 감싸개
+
+    네트워크/파일을 쓰는 저장소(blocking=True)는 전용 스레드 하나에서 요청 순서대로 실행해
+    루프를 막지 않고, 메모리 저장소는 그대로 바로 호출.
+    """
+
+    def __init__(self, store):
+        self.store    = store
+        self.executor = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-store")
+                         if store.blocking else None)
+
+    async def _call(self, method, *args, **kwargs):
+        if self.executor is None:
+            return method(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(method, *args, **kwargs))
+
+    async def put(self, task_id, record):
+        await self._call(self.store.put, task_id, record)
+
+    def put_nowait(self, task_id, record):
+        """기다리지 않고 저장 (동기 콜백용) - 앞뒤 요청과의 순서는 유지"""
+        if self.executor is None:
+            self.store.put(task_id, record)
+        else:
+            self.executor.submit(self.store.put, task_id, dict(record))
+
+    async def get(self, task_id):
+        return await self._call(self.store.get, task_id)
+
+    async def update(self, task_id, **fields):
+        return await self._call(self.store.update, task_id, **fields)
+
+    async def delete(self, task_id):
+        await self._call(self.store.delete, task_id)
+
+    async def items(self):
+        return await self._call(self.store.items)
+
+    async def close(self):
+        await self._call(self.store.close)
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class JobRunner:
+    """백그라운드 작업 실행기 - 진행률과 결과를 작업 저장소(AsyncTaskStore)에 기록
+
+    run(report)는 코루틴 함수. report(progress, message, **필드)로 진행 상황을 남기고
+    결과 필드 딕셔너리를 돌려주면 작업 정보에 합쳐서 completed로 기록.
+    report는 기다리지 않고 돌아오며, 쌓인 진행 상황은 작업마다 하나인 기록 코루틴이 최신 것만 모아 저장.
+    다른 워커에서 상태를 cancelled로 바꾸면 그다음 기록 때 작업을 멈춤.
+    hub(EventHub)를 주면 작업 정보가 바뀔 때마다 그 사본을 작업 ID 주제로 발행하고, 끝나면 주제를 닫음.
+    """
+
+    def __init__(self, store, hub=None):
+        self.store   = store
+        self.hub     = hub
+        self.running = {}       # 작업 ID -> asyncio.Task
+        self.pending = set()    # 시작 전에 취소된 작업의 상태 기록
+
+    async def _update(self, task_id, **fields):
+        record = await self.store.update(task_id, **fields)
+        if self.hub is not None and record is not None:
+            self.hub.publish(task_id, dict(record))
+            if record.get("status") in FINISHED:
+                self.hub.close(task_id)
+        return record
+
+    def start(self, task_id, run, record=None):
+        """작업 시작 (record는 방금 저장한 작업 정보 - 허브 구독자에게 처음 보낼 상태)"""
+        progress = {"value": 0, "fields": {}}
+        wake = asyncio.Event()
+        if self.hub is not None:
+            # 작업 시작 전에 붙은 구독자도 현재 상태부터 받도록 주제를 바로 만듦
+            self.hub.publish(task_id, dict(record or {}))
+
+        def report(value, message, **fields):
+            progress["value"] = max(progress["value"], int(value))     # 재시도 등으로 되돌아가지 않게
+            progress["fields"].update(progress=progress["value"], message=message, **fields)
+            wake.set()
+
+        async def writer():
+            while True:
+                await wake.wait()
+                wake.clear()
+                fields, progress["fields"] = progress["fields"], {}
+                current = await self.store.get(task_id)
+                if current is not None and current.get("status") == "cancelled":
+                    task.cancel()
+                    return
+                await self._update(task_id, **fields)
+
+        async def job():
+            await self._update(task_id, status="processing", started_at=datetime.now().isoformat())
+            recorder = asyncio.create_task(writer())
+            try:
+                result = await run(report)
+            except asyncio.CancelledError:
+                fields = {"status": "cancelled"}
+            except Exception as e:
+                fields = {"status": "error", "error": str(e)}
+            else:
+                fields = dict(progress["fields"], status="completed", progress=100, **(result or {}))
+            finally:
+                recorder.cancel()
+            await self._update(task_id, end_time=datetime.now().isoformat(), **fields)
+
+        def done(task):
+            self.running.pop(task_id, None)
+            if task.cancelled():        # 시작도 하기 전에 (또는 마지막 기록 중에) 취소된 경우
+                update = asyncio.ensure_future(
+                    self._update(task_id, status="cancelled", end_time=datetime.now().isoformat()))
+                self.pending.add(update)
+                update.add_done_callback(self.pending.discard)
+            elif self.hub is not None:
+                self.hub.close(task_id)     # 저장소에서 만료되어 마지막 상태를 못 쓴 경우에도 닫음
+
+        task = asyncio.create_task(job())
+        task.add_done_callback(done)
+        self.running[task_id] = task
+        return task
+
+    def cancel(self, task_id):
+        task = self.running.get(task_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def stop(self):
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*self.pending, return_exceptions=True)
@@ -4,26 +4,401 @@
 import warnings
 warnings.filterwarnings("ignore")
 
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import librosa
+import soundfile as sf
 import scipy.signal
 import noisereduce as nr
 from dtw import dtw
-from scipy.spatial.distance import euclidean, cosine
+import scipy.ndimage
+from scipy.spatial.distance import cdist, cosine
 import parselmouth
 from parselmouth.praat import call
 
+from DiskCache import DiskLRUCache
+
 # ---------- 분석 항목 가중치 ----------
 WEIGHTS = dict(
     mfcc=0.20, pitch=0.15, energy=0.10, speed=0.10,
     formant=0.15, intonation=0.15, rhythm=0.10, pause=0.05
 )
 
+# ---------- 특징량 설정 ----------
+N_MFCC          = 13
+N_FFT           = 2048  # librosa 기본값과 동일 (STFT/MFCC/RMS 공통)
+HOP_LENGTH      = 512
+FEATURE_VERSION = 3     # 특징량 계산 방식이 바뀌면 올려서 기존 캐시를 무효화
+
+# ---------- 항목별 필요한 특징량 (병렬 실행 시 먼저 계산) ----------
+METRIC_FEATURES = dict(
+    mfcc=("mfcc",), pitch=("pitch_grid", "pitch_freq"), energy=("rms",),
+    speed=("syllables",), formant=("formant_grid", "formant_freq"),
+    intonation=("pitch_grid", "pitch_freq"), rhythm=("rms",),
+    pause=("silences",)
+)
+
+# Praat 호출은 스레드 간 동시 실행을 피함
+_praat_lock = threading.Lock()
+
+# ---------- DTW 설정 ----------
+# 항목별 DTW 방식 ("full" / "band" / "fast", dtw_align 참고)
+DTW_MODES  = dict(mfcc="full", energy="full", intonation="full")
+DTW_BAND   = 0.1    # band: Sakoe-Chiba 대역 폭 (긴 시퀀스 길이 대비 비율)
+DTW_RADIUS = 8      # fast: 저해상도 경로 주변 탐색 반경(프레임)
+DTW_MIN_SIZE = 64   # fast: 이 길이 이하가 되면 전체 DTW로 계산
+
+
+def _highpass(y: np.ndarray, sr: int, cutoff: float):
+    sos = scipy.signal.butter(N=6, Wn=cutoff, btype='highpass',
+                              fs=sr, output='sos')
+    return scipy.signal.sosfiltfilt(sos, y)
+
+
+def _denoise(y: np.ndarray, sr: int, noise_head: float):
+    # 음성 앞부분에서 잡음 프로파일 추출
+    noise_clip = y[: int(sr * noise_head)]
+    return nr.reduce_noise(y=y,
+                           y_noise=noise_clip,
+                           sr=sr,
+                           prop_decrease=1.0,   # 강한 제거
+                           stationary=False)
+
+
+def load_signal(src, hp_cutoff: float = 60.0, noise_head: float = 0.3,
+                target_sr: int = None):
+    """파일 경로/파일 객체/(y, sr)를 읽어 (리샘플 →) 고역 차단 → 잡음 제거까지 수행"""
+    y, sr = src if isinstance(src, tuple) else librosa.load(src, sr=None)
+    if target_sr is not None and sr != target_sr:
+        y  = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        sr = target_sr
+    y = _highpass(y, sr, hp_cutoff)
+    y = _denoise(y, sr, noise_head)
+    return y, sr
+
+
+def _mask_window(iw, jw, query_size, reference_size, mask):
+    return mask
+
+
+def _halve(x: np.ndarray):
+    # 인접 두 프레임 평균으로 해상도 1/2 (홀수면 마지막 프레임 유지)
+    n = len(x) // 2 * 2
+    h = (x[:n:2] + x[1:n:2]) / 2
+    return np.concatenate([h, x[n:]]) if n < len(x) else h
+
+
+def _fast_dtw(x: np.ndarray, y: np.ndarray, radius: int, min_size: int):
+    if len(x) <= min_size or len(y) <= min_size:
+        return dtw(cdist(x, y, "euclidean"))
+
+    # 1) 절반 해상도에서 정렬 경로를 구하고
+    coarse = _fast_dtw(_halve(x), _halve(y), radius, min_size)
+    n, m = len(x), len(y)
+
+    # 2) 원래 해상도로 투영한 경로 주변 radius 프레임만 허용
+    mask = np.zeros((n, m), dtype=bool)
+    ci, cj = np.asarray(coarse.index1), np.asarray(coarse.index2)
+    for di in (0, 1):
+        for dj in (0, 1):
+            mask[np.minimum(2 * ci + di, n - 1), np.minimum(2 * cj + dj, m - 1)] = True
+    mask = scipy.ndimage.binary_dilation(mask, np.ones((3, 3), bool),
+                                         iterations=radius)
+
+    # 3) 허용된 칸의 거리만 계산 (나머지는 창 밖이라 사용되지 않음)
+    lm = np.full((n, m), np.nan)
+    ii, jj = np.nonzero(mask)
+    lm[ii, jj] = np.linalg.norm(x[ii] - y[jj], axis=1)
+    return dtw(lm, window_type=_mask_window, window_args={"mask": mask})
+
+
+def dtw_align(x, y, mode: str = "full"):
+    """두 특징 시퀀스 (frames, dims)의 DTW 정렬 (.distance / .normalizedDistance)
+
+    - full : 거리 행렬을 cdist로 한 번에 만든 뒤 dtw 패키지(C 구현)로 누적.
+             기존 dtw(x, y, dist_method=euclidean)와 같은 값(부동소수 오차 수준)
+    - band : Sakoe-Chiba 대역(DTW_BAND) 안에서만 정렬
+    - fast : FastDTW 방식 다해상도 근사 - 절반 해상도 경로 주변 DTW_RADIUS
+             프레임 안에서만 거리/누적 비용 계산 (긴 녹음용)
+
+    band/fast는 허용 경로가 full의 부분집합이므로 거리는 항상 full 이상
+    (점수는 같거나 낮음). 샘플 음성(최대 32초) 기준 full 대비 점수 차이:
+    band  MFCC 2.2점 / 억양 3.5점 / 에너지 0.1점 이내
+    fast  MFCC 0.7점 / 억양 0점   / 에너지 0.1점 이내
+    fast는 프레임 수가 수천 이상일 때만 full보다 빠르다.
+    """
+    x = np.asarray(x, dtype=float).reshape(len(x), -1)
+    y = np.asarray(y, dtype=float).reshape(len(y), -1)
+    if mode == "full":
+        return dtw(cdist(x, y, "euclidean"), distance_only=True)
+    if mode == "band":
+        size = max(abs(len(x) - len(y)),
+                   int(np.ceil(DTW_BAND * max(len(x), len(y)))))
+        return dtw(cdist(x, y, "euclidean"), distance_only=True,
+                   window_type="sakoechiba", window_args={"window_size": size})
+    if mode == "fast":
+        return _fast_dtw(x, y, DTW_RADIUS, DTW_MIN_SIZE)
+    raise ValueError(f"지원하지 않는 DTW 방식입니다: {mode}")
+
+
+def _sample_linear(grid: np.ndarray, values: np.ndarray, times):
+    """Praat "Get value at time ... Linear"의 NumPy 벡터 구현
+
+    grid   : [xmin, xmax, x1, dx] (Praat Sampled 시간축)
+    values : (levels, nx) 프레임 값, 정의되지 않은 값은 NaN
+    반환    : (levels, len(times)), Praat과 같은 규칙으로 구간 밖/미정의는 NaN
+    """
+    xmin, xmax, x1, dx = grid
+    values = np.atleast_2d(values)
+    nx     = values.shape[1]
+    times  = np.asarray(times, dtype=float)
+
+    ireal = (times - x1) / dx + 1.0                 # 1부터 시작하는 Praat 인덱스
+    ileft = np.floor(ireal).astype(int)
+    phase = ireal - ileft
+    upper = phase >= 0.5
+    inear = np.where(upper, ileft + 1, ileft)
+    ifar  = np.where(upper, ileft, ileft + 1)
+    phase = np.where(upper, 1.0 - phase, phase)
+
+    # 양 끝에 NaN 열을 덧대 범위 밖 인덱스를 '미정의'로 처리
+    nan    = np.full((values.shape[0], 1), np.nan)
+    padded = np.concatenate([nan, values, nan], axis=1)
+    fnear  = padded[:, np.clip(inear, 0, nx + 1)]
+    ffar   = padded[:, np.clip(ifar, 0, nx + 1)]
+    out = np.where(np.isnan(ffar), fnear, fnear + phase * (ffar - fnear))
+    out[:, (times < xmin) | (times > xmax)] = np.nan
+    return out
+
+
+class SignalFeatures:
+    """한 음성 신호의 분석 특징량 묶음
+
+    특징량은 처음 요청될 때 계산해 저장하며, export()/from_values()로
+    신호 없이 특징량만 저장·복원할 수 있다(레퍼런스 캐시용).
+    피치/포먼트는 Praat 객체를 한 번만 만들어 전체 프레임 배열로 보관하고,
+    특정 시각의 값은 pitch_at()/formants_at()으로 보간해 얻는다.
+    MFCC/RMS/무음 구간은 한 번 계산한 STFT 크기 스펙트로그램("spec")에서
+    파생하며, 파생 특징량이 모두 만들어지면 스펙트로그램은 바로 해제한다.
+    """
+    NAMES = ("mfcc", "pitch_grid", "pitch_freq",
+             "formant_grid", "formant_freq",
+             "rms", "syllables", "silences")
+    SPECTRAL = ("mfcc", "rms", "silences")     # "spec"에서 파생되는 특징량
+    # 중간 결과를 공유해 한 작업에서 순서대로 계산해야 하는 묶음
+    GROUPS = (SPECTRAL, ("pitch_grid", "pitch_freq"),
+              ("formant_grid", "formant_freq"), ("syllables",))
+
+    def __init__(self, y: np.ndarray, sr: int):
+        self.y     = y
+        self.sr    = sr
+        self.dur   = len(y) / sr
+        self.sound = parselmouth.Sound(y, sr)
+        self._values = {}
+
+    @classmethod
+    def from_values(cls, values: dict):
+        self = cls.__new__(cls)
+        self.y = self.sound = None
+        self.sr  = int(values["sr"])
+        self.dur = float(values["dur"])
+        self._values = {k: np.asarray(values[k]) for k in cls.NAMES}
+        return self
+
+    def __getitem__(self, name: str):
+        if name not in self._values:
+            if self.y is None:
+                raise KeyError(f"저장되지 않은 특징량입니다: {name}")
+            self._values[name] = getattr(self, f"_compute_{name}")()
+            if name in self.SPECTRAL and \
+                    all(k in self._values for k in self.SPECTRAL):
+                self._values.pop("spec", None)
+        return self._values[name]
+
+    def compute(self, names):
+        for name in names:
+            self[name]
+        return self
+
+    def compute_all(self):
+        return self.compute(self.NAMES)
+
+    def export(self) -> dict:
+        values = {name: self[name] for name in self.NAMES}
+        values["sr"], values["dur"] = np.asarray(self.sr), np.asarray(self.dur)
+        return values
+
+    # ──────────────────────────── 특징량 계산 ────────────────────────────
+    def _compute_spec(self):
+        return np.abs(librosa.stft(self.y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+    def _compute_mfcc(self):
+        mel = librosa.feature.melspectrogram(S=self["spec"] ** 2, sr=self.sr)
+        return librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=N_MFCC)
+
+    def _compute_pitch_grid(self):
+        return self._pitch_track()[0]
+
+    def _compute_pitch_freq(self):
+        return self._pitch_track()[1]
+
+    def _compute_formant_grid(self):
+        return self._formant_track()[0]
+
+    def _compute_formant_freq(self):
+        return self._formant_track()[1]
+
+    def _pitch_track(self):
+        # To Pitch 한 번으로 전체 프레임 값을 가져옴 (무성음 → NaN)
+        with _praat_lock:
+            p = call(self.sound, "To Pitch", 0.0, 75, 600)
+        freq = p.selected_array["frequency"].astype(float)
+        freq[(freq <= 0) | (freq >= p.ceiling)] = np.nan
+        grid = np.array([p.xmin, p.xmax, p.x1, p.dx])
+        self._values["pitch_grid"], self._values["pitch_freq"] = grid, freq
+        return grid, freq
+
+    def _formant_track(self):
+        # F1~F3 프레임 값을 포먼트별 행렬로 한 번에 가져옴 (없는 포먼트 → NaN)
+        try:
+            with _praat_lock:
+                fm = call(self.sound, "To Formant (burg)", 0, 5, 5500, 0.025, 50)
+                freq = np.vstack([call(fm, "To Matrix", idx).values[0]
+                                  for idx in (1, 2, 3)])
+            freq[freq <= 0] = np.nan
+            grid = np.array([fm.xmin, fm.xmax, fm.x1, fm.dx])
+        except Exception:
+            freq, grid = np.empty((3, 0)), np.array([0.0, 0.0, 0.0, 1.0])
+        self._values["formant_grid"], self._values["formant_freq"] = grid, freq
+        return grid, freq
+
+    def pitch_at(self, times):
+        return _sample_linear(self["pitch_grid"], self["pitch_freq"], times)[0]
+
+    def formants_at(self, times):
+        return _sample_linear(self["formant_grid"], self["formant_freq"], times)
+
+    def _compute_rms(self):
+        # 스펙트로그램 기반 RMS는 창 함수 에너지만큼 작아지므로 보정해
+        # 시간 영역 RMS와 같은 크기로 맞춤
+        window = scipy.signal.get_window("hann", N_FFT, fftbins=True)
+        rms = librosa.feature.rms(S=self["spec"], frame_length=N_FFT)[0]
+        return rms / np.sqrt(np.mean(window ** 2))
+
+    def _compute_syllables(self):
+        win = int(self.sr * 0.02)
+        env = np.convolve(np.abs(self.y), np.ones(win) / win, 'same')
+        peaks, _ = scipy.signal.find_peaks(env,
+                                           height=0.05,
+                                           distance=int(self.sr * 0.05))
+        return np.asarray(len(peaks))
+
+    def _compute_silences(self):
+        power = np.mean(librosa.amplitude_to_db(self["spec"], ref=np.max),
+                        axis=0)
+        times = librosa.times_like(power, sr=self.sr)
+        silent = power < -40
+        starts, ends = [], []
+        if silent[0]:
+            starts.append(times[0])
+        for i in range(1, len(silent)):
+            if silent[i] and not silent[i - 1]:
+                starts.append(times[i])
+            elif not silent[i] and silent[i - 1]:
+                ends.append(times[i])
+        if silent[-1]:
+            ends.append(times[-1])
+        return np.array([(s, e) for s, e in zip(starts, ends)
+                         if e - s >= 0.2]).reshape(-1, 2)
+
+
+class ReferenceFeatureStore(DiskLRUCache):
+    """레퍼런스(AI 아나운서) 음성 특징량의 영구 캐시 (DiskLRUCache)
+
+    - 키: 오디오 바이트 sha256 + 전처리 파라미터 + FEATURE_VERSION
+    - 메모리: 최근 사용 max_items개 LRU
+    - 디스크: cache_dir/<key>.npz, 전체 크기가 max_bytes를 넘으면
+              가장 오래 사용하지 않은 파일부터 삭제
+    - URL 별칭: 같은 URL은 다시 다운로드하지 않고 키로 바로 조회
+    """
+
+    suffix      = ".npz"
+    binary      = True
+    load_errors = (OSError, KeyError, ValueError)
+
+    def __init__(self, cache_dir: str = os.path.join("temp", "ref_features"),
+                 max_items: int = 64, max_bytes: int = 512 * 1024 * 1024,
+                 max_aliases: int = 4096):
+        super().__init__(cache_dir, max_items, max_bytes)
+        self.max_aliases = max_aliases
+        self._aliases   = OrderedDict()     # url -> key
+        self._key_locks = {}
+
+    @staticmethod
+    def make_key(data: bytes, hp_cutoff: float = 60.0,
+                 noise_head: float = 0.3) -> str:
+        h = hashlib.sha256(data)
+        h.update(f"|hp={hp_cutoff}|nh={noise_head}|v={FEATURE_VERSION}".encode())
+        return h.hexdigest()
+
+    def _load(self, f) -> SignalFeatures:
+        with np.load(f) as npz:
+            return SignalFeatures.from_values(npz)
+
+    def _dump(self, features: SignalFeatures, f):
+        np.savez(f, **features.export())
+
+    def key_for(self, url: str):
+        """이미 처리한 URL의 캐시 키 (모르면 None)"""
+        with self._lock:
+            key = self._aliases.get(url)
+            if key is not None:
+                self._aliases.move_to_end(url)
+        return key
+
+    def lookup(self, url: str):
+        """이미 처리한 URL이면 다운로드 없이 특징량 반환"""
+        key = self.key_for(url)
+        return self.get(key) if key is not None else None
+
+    def alias(self, url: str, key: str):
+        with self._lock:
+            self._aliases[url] = key
+            self._aliases.move_to_end(url)
+            while len(self._aliases) > self.max_aliases:
+                self._aliases.popitem(last=False)
+
+    def get_or_compute(self, data: bytes, hp_cutoff: float = 60.0,
+                       noise_head: float = 0.3, alias: str = None):
+        key = self.make_key(data, hp_cutoff, noise_head)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # 같은 레퍼런스를 동시에 여러 번 계산하지 않도록 키 단위로 잠금
+        with key_lock:
+            features = self.get(key)
+            if features is None:
+                y, sr = load_signal(io.BytesIO(data), hp_cutoff, noise_head)
+                features = SignalFeatures(y, sr).compute_all()
+                self.put(key, features)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        if alias:
+            self.alias(alias, key)
+        return features
+
+
 class Analyzer:
     # 초기화 & 전처리
     def __init__(self, ref_file: str, usr_file: str,
                  hp_cutoff: float = 60.0,           # 고역 차단 주파수(Hz)
-                 noise_head: float = 0.3):          # 잡음 프로파일 구간(초)
+                 noise_head: float = 0.3,           # 잡음 프로파일 구간(초)
+                 dtw_modes: dict = None):           # 항목별 DTW 방식
         # 1) 로드
         self.ref_y, self.ref_sr = librosa.load(ref_file, sr=None)
         self.usr_y, self.usr_sr = librosa.load(usr_file, sr=None)
@@ -43,53 +418,60 @@ class Analyzer:
         self.ref_y = self._denoise(self.ref_y, self.ref_sr, noise_head)
         self.usr_y = self._denoise(self.usr_y, self.usr_sr, noise_head)
 
-        # 5) parselmouth Sound 객체
-        self.ref_sound = parselmouth.Sound(self.ref_y, self.ref_sr)
-        self.usr_sound = parselmouth.Sound(self.usr_y, self.usr_sr)
-
-        # 6) 기타 정보
-        self.ref_dur = len(self.ref_y) / self.ref_sr
-        self.usr_dur = len(self.usr_y) / self.usr_sr
+        # 5) 특징량 묶음 (parselmouth Sound 객체 포함)
+        self.ref = SignalFeatures(self.ref_y, self.ref_sr)
+        self.usr = SignalFeatures(self.usr_y, self.usr_sr)
+        self._set_info(dtw_modes)
+
+    @classmethod
+    def from_reference_features(cls, ref_features: SignalFeatures, usr_file,
+                                hp_cutoff: float = 60.0,
+                                noise_head: float = 0.3,
+                                dtw_modes: dict = None):
+        """미리 계산된 레퍼런스 특징량으로 생성 - 사용자 음성만 전처리/분석"""
+        self = cls.__new__(cls)
+        self.ref = ref_features
+        self.ref_y, self.ref_sr = ref_features.y, ref_features.sr
+        self.usr_y, self.usr_sr = load_signal(usr_file, hp_cutoff, noise_head,
+                                              target_sr=self.ref_sr)
+        self.usr = SignalFeatures(self.usr_y, self.usr_sr)
+        self._set_info(dtw_modes)
+        return self
+
+    def _set_info(self, dtw_modes: dict = None):
+        # parselmouth Sound 객체 & 기타 정보
+        self.ref_sound, self.usr_sound = self.ref.sound, self.usr.sound
+        self.ref_dur,   self.usr_dur   = self.ref.dur,   self.usr.dur
         self.res     = {}   # 결과 저장용 dict
+        self.dtw_modes = {**DTW_MODES, **(dtw_modes or {})}
+
     #Noise-Reduction 단계 
     def _highpass(self, y: np.ndarray, sr: int, cutoff: float):
-        sos = scipy.signal.butter(N=6, Wn=cutoff, btype='highpass',
-                                  fs=sr, output='sos')
-        return scipy.signal.sosfiltfilt(sos, y)
+        return _highpass(y, sr, cutoff)
 
     def _denoise(self, y: np.ndarray, sr: int, noise_head: float):
-        # 음성 앞부분에서 잡음 프로파일 추출
-        noise_clip = y[: int(sr * noise_head)]
-        return nr.reduce_noise(y=y,
-                               y_noise=noise_clip,
-                               sr=sr,
-                               prop_decrease=1.0,   # 강한 제거
-                               stationary=False)
+        return _denoise(y, sr, noise_head)
 
     # ──────────────────────────────────────────────────────────────────
     #                             분석 함수
     # ──────────────────────────────────────────────────────────────────
     def mfcc(self, n=13):
         def cmvn(m): return (m - m.mean(1, keepdims=True)) / (m.std(1, keepdims=True)+1e-8)
-        ref = cmvn(librosa.feature.mfcc(y=self.ref_y, sr=self.ref_sr, n_mfcc=n))
-        usr = cmvn(librosa.feature.mfcc(y=self.usr_y, sr=self.usr_sr, n_mfcc=n))
+        ref = cmvn(self.ref["mfcc"][:n])
+        usr = cmvn(self.usr["mfcc"][:n])
         min_frames = min(ref.shape[1], usr.shape[1])
-        dist = dtw(ref[:, :min_frames].T, usr[:, :min_frames].T,
-                   dist_method=euclidean).distance
+        dist = dtw_align(ref[:, :min_frames].T, usr[:, :min_frames].T,
+                         self.dtw_modes["mfcc"]).distance
         norm = dist / (min_frames * n)
         score = 100 * (1 - norm / (norm + 1.8))
         self.res["mfcc"] = max(0, min(100, score))
 
     def pitch(self):
-        ref_p = call(self.ref_sound, "To Pitch", 0.0, 75, 600)
-        usr_p = call(self.usr_sound, "To Pitch", 0.0, 75, 600)
-
-        def get_vals(pitch, dur):
-            vals = [call(pitch, "Get value at time", t, "Hertz", "Linear")
-                    for t in np.arange(0, dur, 0.01)]
-            return np.array([v for v in vals if not np.isnan(v)])
+        def get_vals(feat, dur):
+            vals = feat.pitch_at(np.arange(0, dur, 0.01))
+            return vals[~np.isnan(vals)]
 
-        r, u = get_vals(ref_p, self.ref_dur), get_vals(usr_p, self.usr_dur)
+        r, u = get_vals(self.ref, self.ref_dur), get_vals(self.usr, self.usr_dur)
         if len(r) == 0 or len(u) == 0:
             self.res["pitch"] = 0
             return
@@ -102,51 +484,32 @@ class Analyzer:
         self.res["pitch"] = max(0, min(100, score))
 
     def energy(self):
-        r = librosa.feature.rms(y=self.ref_y)[0]
-        u = librosa.feature.rms(y=self.usr_y)[0]
+        r, u = self.ref["rms"], self.usr["rms"]
         rm, rs = np.mean(r), np.std(r)
         um, us = np.mean(u), np.std(u)
         min_len = min(len(r), len(u))
         r2 = librosa.resample(r, orig_sr=len(r), target_sr=min_len)
         u2 = librosa.resample(u, orig_sr=len(u), target_sr=min_len)
-        dtw_d = dtw(r2.reshape(-1, 1), u2.reshape(-1, 1),
-                    dist_method=euclidean).normalizedDistance
+        dtw_d = dtw_align(r2.reshape(-1, 1), u2.reshape(-1, 1),
+                          self.dtw_modes["energy"]).normalizedDistance
         score = 100 * (1 - (0.3 * abs(rm - um) / rm
                             + 0.3 * abs(rs - us) / rs
                             + 0.4 * min(1, dtw_d / 2)))
         self.res["energy"] = max(0, min(100, score))
 
     def speed(self):
-        def syllables(y, sr):
-            env = np.convolve(np.abs(y),
-                              np.ones(int(sr * 0.02)) / int(sr * 0.02),
-                              'same')
-            peaks, _ = scipy.signal.find_peaks(env,
-                                               height=0.05,
-                                               distance=int(sr * 0.05))
-            return len(peaks)
-
-        rs = syllables(self.ref_y, self.ref_sr) / self.ref_dur
-        us = syllables(self.usr_y, self.usr_sr) / self.usr_dur
+        rs = int(self.ref["syllables"]) / self.ref_dur
+        us = int(self.usr["syllables"]) / self.usr_dur
         score = 100 * (1 - min(1, abs(rs - us) / rs))
         self.res["speed"] = max(0, min(100, score))
 
     def formant(self):
         try:
-            r_fm = call(self.ref_sound, "To Formant (burg)",
-                        0, 5, 5500, 0.025, 50)
-            u_fm = call(self.usr_sound, "To Formant (burg)",
-                        0, 5, 5500, 0.025, 50)
             pts = np.arange(0.1,
                             min(self.ref_dur, self.usr_dur) - 0.1,
                             0.01)
-
-            def collect(fm, idx):
-                return np.array([call(fm, "Get value at time", idx,
-                                      t, "Hertz", "Linear") for t in pts])
-
-            rf1, rf2, rf3 = collect(r_fm, 1), collect(r_fm, 2), collect(r_fm, 3)
-            uf1, uf2, uf3 = collect(u_fm, 1), collect(u_fm, 2), collect(u_fm, 3)
+            rf1, rf2, rf3 = self.ref.formants_at(pts)
+            uf1, uf2, uf3 = self.usr.formants_at(pts)
             mask = lambda x: x[~np.isnan(x)]
             rf1, rf2, rf3, uf1, uf2, uf3 = map(mask,
                                                [rf1, rf2, rf3, uf1, uf2, uf3])
@@ -166,19 +529,16 @@ class Analyzer:
 
     def intonation(self):
         try:
-            def norm_pitch(sound, dur):
-                p = call(sound, "To Pitch", 0, 75, 600)
-                vals = [call(p, "Get value at time", t,
-                             "Hertz", "Linear")
-                        for t in np.linspace(0.1, dur - 0.1, 100)]
-                vals = np.array([v for v in vals if not np.isnan(v)])
+            def norm_pitch(feat, dur):
+                vals = feat.pitch_at(np.linspace(0.1, dur - 0.1, 100))
+                vals = vals[~np.isnan(vals)]
                 return (vals - vals.min()) / (vals.ptp() + 1e-6)
 
-            r, u = norm_pitch(self.ref_sound, self.ref_dur), \
-                   norm_pitch(self.usr_sound, self.usr_dur)
+            r, u = norm_pitch(self.ref, self.ref_dur), \
+                   norm_pitch(self.usr, self.usr_dur)
             L = min(len(r), len(u)); r, u = r[:L], u[:L]
-            dist = dtw(r.reshape(-1, 1), u.reshape(-1, 1),
-                       dist_method=euclidean).normalizedDistance
+            dist = dtw_align(r.reshape(-1, 1), u.reshape(-1, 1),
+                             self.dtw_modes["intonation"]).normalizedDistance
 
             def change(x): return np.std(np.diff(x))
             diff_change = abs(change(r) - change(u)) / max(change(r), 1e-6)
@@ -189,12 +549,11 @@ class Analyzer:
             self.res["intonation"] = 0
 
     def rhythm(self):
-        def envelope(y, sr):
-            rms = librosa.feature.rms(y=y)[0]
+        def envelope(rms):
             return rms / np.max(rms)
 
-        ref_env, usr_env = envelope(self.ref_y, self.ref_sr), \
-                           envelope(self.usr_y, self.usr_sr)
+        ref_env, usr_env = envelope(self.ref["rms"]), \
+                           envelope(self.usr["rms"])
 
         def autocorr(x): return np.correlate(x, x, mode='full')[len(x) - 1:]
 
@@ -213,25 +572,10 @@ class Analyzer:
         self.res["rhythm"] = max(0, min(100, score))
 
     def pause(self):
-        def silences(y, sr):
-            power = np.mean(librosa.amplitude_to_db(
-                np.abs(librosa.stft(y)), ref=np.max), axis=0)
-            times = librosa.times_like(power, sr=sr)
-            silent = power < -40
-            starts, ends = [], []
-            if silent[0]:
-                starts.append(times[0])
-            for i in range(1, len(silent)):
-                if silent[i] and not silent[i - 1]:
-                    starts.append(times[i])
-                elif not silent[i] and silent[i - 1]:
-                    ends.append(times[i])
-            if silent[-1]:
-                ends.append(times[-1])
-            return [(s, e) for s, e in zip(starts, ends) if e - s >= 0.2]
-
-        rs, us = silences(self.ref_y, self.ref_sr), \
-                 silences(self.usr_y, self.usr_sr)
+        def silences(feat):
+            return [(s, e) for s, e in feat["silences"]]
+
+        rs, us = silences(self.ref), silences(self.usr)
 
         cnt_sim = min(len(rs), len(us)) / max(len(rs), len(us)) if rs and us else 0
         ratio_diff = abs(sum(e - s for s, e in rs) / self.ref_dur
@@ -244,13 +588,28 @@ class Analyzer:
         self.res["pause"] = max(0, min(100, score))
 
     #실행
-    def run(self, verbose: bool = True):
-        self.mfcc();      self.pitch();      self.energy()
-        self.speed();     self.formant();    self.intonation()
-        self.rhythm();    self.pause()
+    def run(self, verbose: bool = True, parallel: bool = False,
+            executor=None, metrics=None):
+        """분석 실행
+
+        parallel : 특징량(신호 × 묶음) → 항목 점수 순으로 스레드에서 동시 계산
+        executor : 사용할 스레드 풀 (없으면 run 동안만 새로 만듦)
+        metrics  : 계산할 항목 일부 (기본 전체, 종합 점수는 해당 항목 가중치로 정규화)
+        """
+        metrics = list(metrics or WEIGHTS)
+        unknown = set(metrics) - set(WEIGHTS)
+        if unknown:
+            raise ValueError(f"알 수 없는 분석 항목입니다: {sorted(unknown)}")
+
+        if parallel:
+            self._run_parallel(metrics, executor)
+        else:
+            for name in metrics:
+                getattr(self, name)()
 
         # 종합 점수
-        self.res["total"] = sum(self.res[k] * WEIGHTS[k] for k in WEIGHTS)
+        weight = sum(WEIGHTS[k] for k in metrics)
+        self.res["total"] = sum(self.res[k] * WEIGHTS[k] for k in metrics) / weight
 
         # 콘솔 출력
         
@@ -263,4 +622,265 @@ class Analyzer:
         ]:
             print(f"{label:12s}: {self.res.get(k, 0):6.2f}")
 
-        return self.res
\ No newline at end of file
+        return self.res
+
+    def _run_parallel(self, metrics, executor=None):
+        own = executor is None
+        if own:
+            executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        try:
+            # 1) 공유 특징량 - 신호(ref/usr)와 묶음별로 동시에 계산
+            needed = {f for m in metrics for f in METRIC_FEATURES[m]}
+            jobs = [executor.submit(feat.compute, group)
+                    for feat in (self.ref, self.usr)
+                    for group in SignalFeatures.GROUPS
+                    if needed & set(group)]
+            for job in jobs:
+                job.result()
+
+            # 2) 항목별 점수 - 특징량이 준비되었으므로 서로 독립
+            jobs = [executor.submit(getattr(self, name)) for name in metrics]
+            for job in jobs:
+                job.result()
+        finally:
+            if own:
+                executor.shutdown()
+
+
+class StreamingAnalyzer:
+    """녹음 중 들어오는 PCM 조각으로 점수를 점진적으로 갱신하는 분석기
+
+    - MFCC   : 새로 채워진 프레임만 계산 후 레퍼런스 대비 온라인 DTW
+               (사용자 프레임마다 누적 비용 열 하나만 갱신, 끝점은 열린 상태)
+    - 피치   : 새 구간만 To Pitch → 개수/평균/분산/최소/최대 누적
+    partial()은 지금까지의 추정 점수이며, 최종 점수는 finish()(또는 wav_bytes()를
+    analyze_job에 넘겨) 전체 녹음으로 Analyzer와 같은 방식으로 계산한다.
+    부분 점수는 잡음 제거 없이 인과 고역 필터만 적용한 신호로 계산한다.
+    """
+    PITCH_BLOCK   = 0.5     # 피치를 새로 계산할 최소 구간(초)
+    PITCH_CONTEXT = 0.1     # 구간 경계 보정용 앞쪽 여유(초)
+
+    def __init__(self, ref_features: SignalFeatures, input_sr: int,
+                 hp_cutoff: float = 60.0, noise_head: float = 0.3):
+        self.ref        = ref_features
+        self.sr         = ref_features.sr
+        self.input_sr   = int(input_sr)
+        self.hp_cutoff  = hp_cutoff
+        self.noise_head = noise_head
+
+        self._raw = []                              # 원본 입력 (최종 분석용)
+        self._buf = np.zeros(self.sr, dtype=np.float32)     # 리샘플 + 고역 차단 신호 (앞 _len개 사용)
+        self._len = 0
+        self._sos = scipy.signal.butter(N=6, Wn=hp_cutoff, btype='highpass',
+                                        fs=self.sr, output='sos')
+        self._zi  = np.zeros((self._sos.shape[0], 2))
+        g = np.gcd(self.sr, self.input_sr)
+        self._up, self._down = self.sr // g, self.input_sr // g
+
+        # MFCC + 온라인 DTW 상태 (레퍼런스는 전체 CMVN 적용)
+        ref_mfcc = self.ref["mfcc"]
+        self._ref_mfcc = ((ref_mfcc - ref_mfcc.mean(1, keepdims=True))
+                          / (ref_mfcc.std(1, keepdims=True) + 1e-8)).T
+        self._mfcc_pos = 0                          # 다음 프레임 시작 샘플
+        self._frames   = 0
+        self._mfcc_mean = np.zeros(N_MFCC)
+        self._mfcc_m2   = np.zeros(N_MFCC)
+        self._D = None                              # 누적 비용 열 (레퍼런스 길이)
+
+        # 피치 통계 (레퍼런스는 Analyzer.pitch와 같은 10ms 격자)
+        r = self.ref.pitch_at(np.arange(0, self.ref.dur, 0.01))
+        r = r[~np.isnan(r)]
+        self._ref_pitch = (np.mean(r), np.std(r), np.ptp(r)) if len(r) else None
+        self._pitch_pos  = 0                        # 피치 계산이 끝난 샘플
+        self._pitch_next = 0                        # 다음 10ms 격자 인덱스
+        self._pitch_n, self._pitch_mean, self._pitch_m2 = 0, 0.0, 0.0
+        self._pitch_min, self._pitch_max = np.inf, -np.inf
+
+    @property
+    def _y(self):
+        return self._buf[:self._len]
+
+    @property
+    def duration(self):
+        return self._len / self.sr
+
+    def _append(self, x: np.ndarray):
+        # 용량을 두 배씩 늘려 조각마다 전체를 복사하지 않음
+        end = self._len + len(x)
+        if end > len(self._buf):
+            buf = np.zeros(max(end, 2 * len(self._buf)), dtype=np.float32)
+            buf[:self._len] = self._buf[:self._len]
+            self._buf = buf
+        self._buf[self._len:end] = x
+        self._len = end
+
+    def feed(self, pcm: np.ndarray):
+        """PCM 조각(mono, -1~1) 추가 → 새 MFCC 프레임이 생겼으면 부분 점수 반환"""
+        pcm = np.asarray(pcm, dtype=np.float32)
+        if len(pcm) == 0:
+            return None
+        self._raw.append(pcm)
+        x = pcm if self._up == self._down else \
+            scipy.signal.resample_poly(pcm, self._up, self._down)
+        x, self._zi = scipy.signal.sosfilt(self._sos, x, zi=self._zi)
+        self._append(x)
+
+        updated = self._update_mfcc()
+        if self._len - self._pitch_pos >= self.PITCH_BLOCK * self.sr:
+            self._update_pitch()
+        return self.partial() if updated else None
+
+    def _update_mfcc(self):
+        n = 1 + (self._len - self._mfcc_pos - N_FFT) // HOP_LENGTH
+        if n <= 0:
+            return False
+        seg = self._y[self._mfcc_pos: self._mfcc_pos + N_FFT + (n - 1) * HOP_LENGTH]
+        spec = np.abs(librosa.stft(seg, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                                   center=False))
+        mel  = librosa.feature.melspectrogram(S=spec ** 2, sr=self.sr)
+        mfcc = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=N_MFCC)
+        self._mfcc_pos += n * HOP_LENGTH
+        for v in mfcc.T:
+            self._add_frame(v)
+        return True
+
+    def _add_frame(self, v: np.ndarray):
+        # 사용자 CMVN은 누적 평균/분산(Welford)으로 근사
+        self._frames += 1
+        delta = v - self._mfcc_mean
+        self._mfcc_mean += delta / self._frames
+        self._mfcc_m2   += delta * (v - self._mfcc_mean)
+        std = np.sqrt(self._mfcc_m2 / self._frames)
+        v = (v - self._mfcc_mean) / (std + 1e-8)
+
+        # symmetric2 누적 비용 한 열 갱신:
+        # D[i] = min(D'[i] + c[i], D'[i-1] + 2c[i], D[i-1] + c[i])
+        c = np.linalg.norm(self._ref_mfcc - v, axis=1)
+        C = np.cumsum(c)
+        if self._D is None:
+            self._D = C
+            return
+        tmp = self._D + c
+        tmp[1:] = np.minimum(tmp[1:], self._D[:-1] + 2 * c[1:])
+        self._D = C + np.minimum.accumulate(tmp - C)
+
+    def _update_pitch(self):
+        # 아직 통계에 넣지 않은 프레임부터 (앞쪽 여유 포함) 다시 계산
+        pending = min(self._pitch_pos, int(round(self._pitch_next * 0.01 * self.sr)))
+        start = max(0, pending - int(self.PITCH_CONTEXT * self.sr))
+        with _praat_lock:
+            p = call(parselmouth.Sound(self._y[start:].astype(float), self.sr),
+                     "To Pitch", 0.0, 75, 600)
+        freq = p.selected_array["frequency"].astype(float)
+        freq[(freq <= 0) | (freq >= p.ceiling)] = np.nan
+        grid = np.array([p.xmin, p.xmax, p.x1, p.dx])
+
+        end   = int(np.ceil(self.duration / 0.01))
+        times = np.arange(self._pitch_next, end) * 0.01
+        vals  = _sample_linear(grid, freq, times - start / self.sr)[0]
+        # 끝쪽 무성(NaN) 프레임은 분석 창이 덜 차서일 수 있으므로 다음 구간에서 다시 봄 (최대 PITCH_CONTEXT초)
+        keep = len(vals)
+        floor = max(0, keep - int(round(self.PITCH_CONTEXT / 0.01)))
+        while keep > floor and np.isnan(vals[keep - 1]):
+            keep -= 1
+        vals = vals[:keep]
+        for v in vals[~np.isnan(vals)]:
+            self._pitch_n += 1
+            delta = v - self._pitch_mean
+            self._pitch_mean += delta / self._pitch_n
+            self._pitch_m2   += delta * (v - self._pitch_mean)
+            self._pitch_min, self._pitch_max = min(self._pitch_min, v), max(self._pitch_max, v)
+        self._pitch_next += keep
+        self._pitch_pos   = self._len
+
+    def partial(self):
+        """지금까지 들어온 음성 기준 추정 점수"""
+        res = {}
+        if self._D is not None:
+            # 열린 끝점: 사용자 진행분과 가장 잘 맞는 레퍼런스 위치
+            steps = np.arange(1, len(self._D) + 1) + self._frames
+            i = int(np.argmin(self._D / steps))
+            norm = self._D[i] / ((i + 1 + self._frames) / 2 * N_MFCC)
+            res["mfcc"] = max(0, min(100, 100 * (1 - norm / (norm + 1.8))))
+            progress = (i + 1) / len(self._D)
+        else:
+            progress = 0.0
+        if self._ref_pitch and self._pitch_n:
+            rm, rs, rr = self._ref_pitch
+            um = self._pitch_mean
+            us = np.sqrt(self._pitch_m2 / self._pitch_n)
+            ur = self._pitch_max - self._pitch_min
+            score = 100 * (1 - (0.4 * abs(rm - um) / rm
+                                + 0.3 * abs(rs - us) / rs
+                                + 0.3 * abs(rr - ur) / rr))
+            res["pitch"] = max(0, min(100, score))
+        if res:
+            res["total"] = sum(res[k] * WEIGHTS[k] for k in res) / \
+                           sum(WEIGHTS[k] for k in res)
+        return {"scores": res, "progress": progress,
+                "duration": self.duration}
+
+    def recording(self):
+        return np.concatenate(self._raw) if self._raw else np.zeros(0, np.float32)
+
+    def wav_bytes(self) -> bytes:
+        """지금까지 받은 원본 녹음을 WAV 바이트로 (analyze_job 입력용)"""
+        buf = io.BytesIO()
+        sf.write(buf, self.recording(), self.input_sr, format="WAV", subtype="FLOAT")
+        return buf.getvalue()
+
+    def finish(self, verbose: bool = True):
+        """전체 녹음으로 최종 점수 계산 (Analyzer와 같은 결과)"""
+        analyzer = Analyzer.from_reference_features(
+            self.ref, (self.recording(), self.input_sr),
+            self.hp_cutoff, self.noise_head)
+        return analyzer.run(verbose)
+
+
+# ──────────────────────────────────────────────────────────────────
+#                  프로세스 풀 작업 (server.py에서 사용)
+# ──────────────────────────────────────────────────────────────────
+class ReferenceNotCached(KeyError):
+    """워커 캐시에 레퍼런스 특징량이 없음 - 원본 오디오와 함께 다시 요청해야 함"""
+
+
+_worker_store = None
+
+
+def init_worker(cache_dir: str = os.path.join("temp", "ref_features"),
+                max_items: int = 64, max_bytes: int = 512 * 1024 * 1024):
+    """분석 워커 초기화 - 레퍼런스 캐시 연결 후 짧은 신호로 라이브러리 예열"""
+    global _worker_store
+    _worker_store = ReferenceFeatureStore(cache_dir, max_items, max_bytes)
+    sr = 16000
+    y  = np.random.RandomState(0).randn(sr).astype(np.float32) * 0.01
+    try:
+        SignalFeatures(_denoise(_highpass(y, sr, 60.0), sr, 0.3), sr).compute_all()
+    except Exception:
+        pass
+
+
+def prepare_reference(ref_data: bytes, hp_cutoff: float = 60.0,
+                      noise_head: float = 0.3):
+    """레퍼런스 특징량을 계산해 디스크 캐시에 저장 → 캐시 키"""
+    if _worker_store is None:
+        init_worker()
+    _worker_store.get_or_compute(ref_data, hp_cutoff, noise_head)
+    return _worker_store.make_key(ref_data, hp_cutoff, noise_head)
+
+
+def analyze_job(ref_key: str, ref_data: bytes, usr_data: bytes,
+                hp_cutoff: float = 60.0, noise_head: float = 0.3):
+    """레퍼런스(캐시 키 또는 원본 바이트) 대비 사용자 음성 분석 → (결과, 캐시 키)"""
+    if _worker_store is None:
+        init_worker()
+    if ref_data is not None:
+        ref_key  = _worker_store.make_key(ref_data, hp_cutoff, noise_head)
+        features = _worker_store.get_or_compute(ref_data, hp_cutoff, noise_head)
+    else:
+        features = _worker_store.get(ref_key)
+        if features is None:
+            raise ReferenceNotCached(ref_key)
+    analyzer = Analyzer.from_reference_features(features, io.BytesIO(usr_data),
+                                                hp_cutoff, noise_head)
+    return analyzer.run(), ref_key
@@ -1,8 +1,13 @@
-import requests
+import asyncio
+import hashlib
 import json
-import sseclient
+import re
 import time
+import unicodedata
+import uuid
 import os
+import httpx
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 # .env.local 파일 로드
@@ -17,197 +22,371 @@ SERVER_URL = f"{BASE_URL}:{PORT}"
 MODEL_NAME = "Zyphra/Zonos-v0.1-transformer"
 LANGUAGE = "ko"
 
-def set_server_url(url):
-    global SERVER_URL
-    SERVER_URL = url
-
-def upload_file(file_path, session_hash):
-    url = f"{SERVER_URL}/gradio_api/upload?upload_id={session_hash}"
-    
-    files = {
-        "files": (file_path, open(file_path, "rb"), "audio/wav")
-    }
-    
-    headers = {
-        "accept": "*/*",
-        "Referer": f"{SERVER_URL}/",
-    }
-    
-    response = requests.post(url, files=files, headers=headers)
-    #print(f"Upload Status: {response.status_code}")
-    #print(f"Upload Response: {response.text}")
-    return response.json()[0]  # 리스트의 첫 번째 항목 반환
-
-def call_api(session_hash, audio_path, silence_path, tts_text):
-    url = f"{SERVER_URL}/gradio_api/queue/join?"
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
-        "content-type": "application/json",
-        "Referer": f"{SERVER_URL}/",
-        "Referrer-Policy": "strict-origin-when-cross-origin"
-    }
-    
-    data = {
-        "data": [
-            MODEL_NAME,
-            tts_text,
-            LANGUAGE,
-            {
-                "path": audio_path,
-                "url": f"{SERVER_URL}/gradio_api/file={audio_path}",
-                "orig_name": "SPK080KBSCU083M001.wav",
-                "size": 673700,
-                "mime_type": "audio/wav",
-                "meta": {"_type": "gradio.FileData"}
-            },
-            {
-                "path": silence_path,
-                "url": f"{SERVER_URL}/gradio_api/file={silence_path}",
-                "size": None,
-                "orig_name": "silence_100ms.wav",
-                "mime_type": None,
-                "is_stream": False,
-                "meta": {"_type": "gradio.FileData"}
-            },
-            0.28, 0.05, 0.05, 0.05, 0.05, 0.05,
-            0.1, 0.8, 0.78, 24000,
-            45, 19.5, 4, False, 2,
-            0, 0, 0, 0.5, 0.4, 0,
-            420, True,
-            ["emotion"]
-        ],
-        "event_data": None,
-        "fn_index": 2,
-        "trigger_id": 60,
-        "session_hash": session_hash
-    }
-    
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-    #print(f"API Status: {response.status_code}")
-    #print(f"API Response: {response.text}")
-    return response.json()
-
-def wait_for_result(session_hash, timeout=300):
-    url = f"{SERVER_URL}/gradio_api/queue/data?session_hash={session_hash}"
-    headers = {
-        "accept": "text/event-stream",
-        "accept-language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
-        "content-type": "application/json",
-        "Referer": f"{SERVER_URL}/",
-        "Referrer-Policy": "strict-origin-when-cross-origin",
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive"
-    }
-    
-    start_time = time.time()
-    last_progress = 0
-    
-    #print("SSE 대기 시작...")
-    while time.time() - start_time < timeout:
-        #print("SSE 요청 시도...")
+
+def new_session_hash():
+    """요청마다 쓰는 Gradio 세션 해시"""
+    return uuid.uuid4().hex[:11]
+
+
+def normalize_text(text):
+    """합성 결과가 같은 문장을 같은 문자열로 (유니코드 NFC, 공백 정리)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def split_sentences(text, min_chars=8, max_chars=150):
+    """문장 단위로 나눔 (너무 짧은 조각은 다음 문장에 붙이고, 너무 긴 문장은 쉼표/공백에서 자름)"""
+    pieces = [p for p in re.split(r"(?<=[.!?。！？…])\s+|\n+", text) if p and p.strip()]
+
+    sentences = []
+    for piece in pieces:
+        piece = normalize_text(piece)
+        while len(piece) > max_chars:
+            cut = piece.rfind(",", 0, max_chars)
+            if cut < max_chars // 2:
+                cut = piece.rfind(" ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            sentences.append(piece[:cut].strip())
+            piece = piece[cut:].strip()
+        if piece:
+            sentences.append(piece)
+
+    merged = []
+    for sentence in sentences:
+        if merged and len(merged[-1]) < min_chars:
+            merged[-1] = f"{merged[-1]} {sentence}"
+        else:
+            merged.append(sentence)
+    return merged
+
+
+def notify(on_progress, **event):
+    """진행 콜백 호출 (콜백 오류가 합성을 멈추지 않도록)"""
+    if on_progress is None:
+        return
+    try:
+        on_progress(event)
+    except Exception:
+        pass
+
+
+async def iter_sse(response):
+    """text/event-stream 응답에서 이벤트 data 문자열을 하나씩 꺼냄"""
+    data = []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data:
+        yield "\n".join(data)
+
+
+class ZonosClient:
+    """Zonos(Gradio) TTS 서버 클라이언트
+
+    서버 URL과 연결 풀을 인스턴스가 들고 있고, 업로드/다운로드는 모두 메모리에서 처리.
+    요청마다 세션 해시를 따로 쓰므로 한 프로세스에서 여러 합성을 동시에 돌려도 섞이지 않음.
+    화자/무음 파일은 내용 해시별로 한 번만 올리고 서버 측 경로를 재사용
+    (upload_ttl이 지나면 다시 올리고, upload_check 초마다 서버에 남아 있는지 확인).
+    """
+
+    def __init__(self, server_url=SERVER_URL, model_name=MODEL_NAME, language=LANGUAGE,
+                 timeout=60.0, max_connections=20, upload_ttl=6 * 3600, upload_check=600,
+                 upload_cache_size=256):
+        self.server_url = server_url.rstrip("/")
+        self.model_name = model_name
+        self.language   = language
+        self.upload_ttl        = upload_ttl
+        self.upload_check      = upload_check
+        self.upload_cache_size = upload_cache_size
+        self.uploads      = OrderedDict()   # 내용 해시 → [서버 경로, 업로드 시각, 확인 시각]
+        self.upload_inflight = {}         # 내용 해시 → 진행 중인 확인/업로드 (같은 파일은 한 번만 올림)
+        self.client     = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            headers={"Referer": f"{self.server_url}/"}
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def warm_up(self):
+        """연결 풀에 TTS 서버 연결을 미리 만들어 둠 (실패해도 무시)"""
+        try:
+            await self.client.get(f"{self.server_url}/gradio_api/info", timeout=10.0)
+        except httpx.HTTPError:
+            pass
+
+    def file_url(self, path):
+        return f"{self.server_url}/gradio_api/file={path}"
+
+    async def upload_file(self, data, session_hash, filename="audio.wav"):
+        """메모리의 오디오 바이트를 업로드 → 서버 측 파일 경로"""
+        url = f"{self.server_url}/gradio_api/upload?upload_id={session_hash}"
+        files = {"files": (filename, data, "audio/wav")}
+        response = await self.client.post(url, files=files, headers={"accept": "*/*"})
+        response.raise_for_status()
+        return response.json()[0]  # 리스트의 첫 번째 항목 반환
+
+    async def file_exists(self, path):
+        """업로드한 파일이 아직 서버에 있는지 (재시작되면 사라짐)"""
         try:
-            with requests.get(url, headers=headers, stream=True) as response:
-                #print("SSE 응답 받음")
-                client = sseclient.SSEClient(response)
-                
-                #print("이벤트 처리 시작...")
-                for event in client.events():
-                    # heartbeat 이벤트는 무시
-                    if "heartbeat" in event.data:
-                        continue
-                        
-                    try:
-                        data = json.loads(event.data)
-                        
-                        # 진행률 표시
-                        if data.get("msg") == "progress":
-                            progress_data = data.get("progress_data", [{}])[0]
-                            current_index = progress_data.get("index", 0)
-                            total_length = progress_data.get("length", 1)
-                            progress = current_index / total_length
-                            if progress > last_progress:
-                                #print(f"진행률: {progress*100:.1f}%")
-                                last_progress = progress
-                        
+            async with self.client.stream("GET", self.file_url(path), timeout=10.0) as response:
+                return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def forget_upload(self, data):
+        self.uploads.pop(hashlib.sha256(data).hexdigest(), None)
+
+    async def ensure_uploaded(self, data, filename="audio.wav"):
+        """같은 내용이 이미 올라가 있으면 그 경로를, 없으면 업로드 후 경로 반환 → (경로, 재사용 여부)"""
+        key = hashlib.sha256(data).hexdigest()
+        entry = self.uploads.get(key)
+        now = time.monotonic()
+        if (entry is not None and now - entry[1] < self.upload_ttl
+                and now - entry[2] < self.upload_check):
+            self.uploads.move_to_end(key)
+            return entry[0], True
+
+        # 같은 파일을 동시에 확인/업로드하는 요청들은 진행 중인 하나를 같이 기다림
+        future = self.upload_inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh_upload(key, data, filename))
+            self.upload_inflight[key] = future
+            future.add_done_callback(lambda _: self.upload_inflight.pop(key, None))
+            # 아무도 기다리지 않게 되어도 예외가 경고로 남지 않도록
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            return await asyncio.shield(future)
+        path, _ = await asyncio.shield(future)
+        return path, True
+
+    async def _refresh_upload(self, key, data, filename):
+        """캐시된 경로가 서버에 아직 있는지 확인하고, 없으면 새로 업로드 → (경로, 재사용 여부)"""
+        entry = self.uploads.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.upload_ttl:
+            if await self.file_exists(entry[0]):
+                entry[2] = time.monotonic()
+                self.uploads.move_to_end(key)
+                return entry[0], True
+        self.uploads.pop(key, None)
+
+        path = await self.upload_file(data, new_session_hash(), filename)
+        now = time.monotonic()
+        self.uploads[key] = [path, now, now]
+        while len(self.uploads) > self.upload_cache_size:
+            self.uploads.popitem(last=False)
+        return path, False
+
+    def build_payload(self, session_hash, audio_path, silence_path, tts_text,
+                      audio_name="SPK080KBSCU083M001.wav", audio_size=673700):
+        return {
+            "data": [
+                self.model_name,
+                tts_text,
+                self.language,
+                {
+                    "path": audio_path,
+                    "url": self.file_url(audio_path),
+                    "orig_name": audio_name,
+                    "size": audio_size,
+                    "mime_type": "audio/wav",
+                    "meta": {"_type": "gradio.FileData"}
+                },
+                {
+                    "path": silence_path,
+                    "url": self.file_url(silence_path),
+                    "size": None,
+                    "orig_name": "silence_100ms.wav",
+                    "mime_type": None,
+                    "is_stream": False,
+                    "meta": {"_type": "gradio.FileData"}
+                },
+                0.28, 0.05, 0.05, 0.05, 0.05, 0.05,
+                0.1, 0.8, 0.78, 24000,
+                45, 19.5, 4, False, 2,
+                0, 0, 0, 0.5, 0.4, 0,
+                420, True,
+                ["emotion"]
+            ],
+            "event_data": None,
+            "fn_index": 2,
+            "trigger_id": 60,
+            "session_hash": session_hash
+        }
+
+    def synthesis_key(self, text, voice, silence):
+        """합성 결과를 결정하는 값(문장, 화자/무음 내용, 모델, 언어, 샘플링 파라미터)의 해시"""
+        params = self.build_payload("", "", "", "")["data"][5:]
+        signature = json.dumps([
+            normalize_text(text),
+            hashlib.sha256(voice).hexdigest(),
+            hashlib.sha256(silence).hexdigest(),
+            self.model_name,
+            self.language,
+            params
+        ], ensure_ascii=False)
+        return hashlib.sha256(signature.encode("utf-8")).hexdigest()
+
+    async def call_api(self, session_hash, audio_path, silence_path, tts_text, **file_info):
+        url = f"{self.server_url}/gradio_api/queue/join?"
+        headers = {
+            "accept": "*/*",
+            "accept-language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
+            "content-type": "application/json",
+            "Referrer-Policy": "strict-origin-when-cross-origin"
+        }
+        data = self.build_payload(session_hash, audio_path, silence_path, tts_text, **file_info)
+        response = await self.client.post(url, headers=headers, content=json.dumps(data))
+        response.raise_for_status()
+        return response.json()
+
+    async def cancel(self, session_hash, event_id):
+        """서버 대기열/실행 중인 작업 취소 요청 (실패해도 무시)"""
+        try:
+            await self.client.post(f"{self.server_url}/gradio_api/cancel",
+                                   json={"session_hash": session_hash, "fn_index": 2,
+                                         "event_id": event_id},
+                                   timeout=5.0)
+        except httpx.HTTPError:
+            pass
+
+    async def _consume(self, session_hash, on_progress):
+        """작업 하나의 SSE 스트림을 완료 이벤트까지 읽음 (끊기면 바로 다시 연결)"""
+        url = f"{self.server_url}/gradio_api/queue/data?session_hash={session_hash}"
+        headers = {
+            "accept": "text/event-stream",
+            "accept-language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
+            "Cache-Control": "no-cache"
+        }
+        backoff = 0.0
+        while True:
+            if backoff:
+                await asyncio.sleep(backoff)
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    async for event in iter_sse(response):
+                        backoff = 0.0
+                        try:
+                            data = json.loads(event)
+                        except json.JSONDecodeError:
+                            continue
+                        msg = data.get("msg")
+
+                        # 대기열 순번 / 시작 / 진행률 → 호출자에게 전달
+                        if msg == "estimation":
+                            notify(on_progress, stage="queue", rank=data.get("rank"),
+                                   eta=data.get("rank_eta"))
+                        elif msg == "process_starts":
+                            notify(on_progress, stage="synthesis", progress=0.0)
+                        elif msg == "progress":
+                            progress_data = (data.get("progress_data") or [{}])[0] or {}
+                            index = progress_data.get("index") or 0
+                            length = progress_data.get("length") or 0
+                            if length:
+                                notify(on_progress, stage="synthesis", progress=index / length)
+
                         # 완료 상태 확인
-                        if data.get("msg") == "process_completed":
-                            #print("\n=== 변환 완료! ===")
-                            output_data = data.get("output", {}).get("data", [])
+                        elif msg == "process_completed":
+                            output = data.get("output") or {}
+                            if data.get("success") is False:
+                                raise RuntimeError(
+                                    f"변환 중 오류 발생: {output.get('error') or '알 수 없는 오류'}")
+                            output_data = output.get("data", [])
                             if output_data and isinstance(output_data[0], dict):
-                                audio_data = output_data[0]
-                                #print("\n오디오 파일 정보:")
-                                #print(f"파일 경로: {audio_data.get('path')}")
-                                #print(f"URL: {audio_data.get('url')}")
-                                #print(f"파일명: {audio_data.get('orig_name')}")
-                                #print(f"파일 크기: {audio_data.get('size')}")
-                                #print(f"MIME 타입: {audio_data.get('mime_type')}")
-                                #print("==================\n")
-                                
-                                audio_url = audio_data.get("url")
+                                audio_url = output_data[0].get("url")
                                 if audio_url:
                                     return audio_url
-                        
+                            raise RuntimeError("변환 결과에 오디오가 없습니다.")
+
                         # 오류 상태 확인
-                        if data.get("msg") == "error":
-                            error_msg = data.get("error", "알 수 없는 오류")
-                            raise Exception(f"변환 중 오류 발생: {error_msg}")
-                        
-                    except json.JSONDecodeError as e:
-                        #print(f"JSON 파싱 오류: {str(e)}")
-                        continue
-                    except Exception as e:
-                        #print(f"이벤트 처리 중 오류: {str(e)}")
-                        continue
-                
-                #print("이벤트 처리 완료, 0.5초 대기...")
-        except Exception as e:
-            #print(f"SSE 연결 오류: {str(e)}")
-            time.sleep(1)
-            continue
-            
-        time.sleep(0.5)  # 폴링 간격 줄임
-    
-    raise TimeoutError("결과 대기 시간 초과")
-
-def download_audio(file_url, output_path="output.wav"):
-    response = requests.get(file_url)
-    if response.status_code == 200:
-        with open(output_path, "wb") as f:
-            f.write(response.content)
-        #print(f"오디오 저장 완료: {output_path}")
-        return True
-    else:
-        #print(f"오디오 다운로드 실패: {response.status_code}")
-        return False
+                        elif msg in ("error", "unexpected_error"):
+                            error_msg = data.get("error") or data.get("message") or "알 수 없는 오류"
+                            raise RuntimeError(f"변환 중 오류 발생: {error_msg}")
+                        elif msg == "close_stream":
+                            raise RuntimeError("결과 없이 스트림이 종료되었습니다.")
+            except (httpx.TransportError, httpx.HTTPStatusError):
+                pass
+            # 완료 전에 연결이 끊김 → 짧게 쉬고 재연결 (연속 실패 시 최대 2초까지 늘림)
+            backoff = min(max(backoff * 2, 0.2), 2.0)
 
-if __name__ == "__main__":
-    # 실행
-    session_hash = "6ldz6p8r96t"
+    async def wait_for_result(self, session_hash, timeout=300, on_progress=None, event_id=None):
+        """결과 오디오 URL을 기다림 (timeout 초과 시 TimeoutError, 취소/시간 초과 시 서버 작업도 취소)"""
+        try:
+            return await asyncio.wait_for(self._consume(session_hash, on_progress), timeout)
+        except asyncio.TimeoutError:
+            if event_id:
+                await asyncio.shield(self.cancel(session_hash, event_id))
+            raise TimeoutError("결과 대기 시간 초과")
+        except asyncio.CancelledError:
+            if event_id:
+                await asyncio.shield(self.cancel(session_hash, event_id))
+            raise
+
+    async def download_audio(self, file_url):
+        """결과 오디오를 메모리로 받기"""
+        response = await self.client.get(file_url)
+        response.raise_for_status()
+        return response.content
+
+    async def synthesize(self, text, voice, silence, voice_name="voice.wav", timeout=300,
+                         on_progress=None):
+        """업로드 → 합성 요청 → 결과 대기 → 다운로드 → WAV 바이트
+
+        on_progress(event)는 단계가 바뀔 때마다 {"stage": ..., "progress": ...} 형태로 호출됨.
+        """
+        for attempt in range(2):
+            session_hash = new_session_hash()
+            notify(on_progress, stage="upload")
+            (audio_path, audio_reused), (silence_path, silence_reused) = await asyncio.gather(
+                self.ensure_uploaded(voice, voice_name),
+                self.ensure_uploaded(silence, "silence_100ms.wav")
+            )
+            try:
+                joined = await self.call_api(session_hash, audio_path, silence_path, text,
+                                             audio_name=voice_name, audio_size=len(voice))
+                result = await self.wait_for_result(session_hash, timeout, on_progress,
+                                                    event_id=(joined or {}).get("event_id"))
+                break
+            except (RuntimeError, httpx.HTTPStatusError):
+                # 재사용한 업로드가 서버 재시작 등으로 사라졌을 수 있음 → 새로 올려서 한 번 더
+                if attempt or not (audio_reused or silence_reused):
+                    raise
+                self.forget_upload(voice)
+                self.forget_upload(silence)
+        notify(on_progress, stage="download")
+        return await self.download_audio(result)
 
+
+if __name__ == "__main__":
     # 파일 경로 설정
     audio = "C:/Users/smhrd/Desktop/SPK080KBSCU083M001.wav"
     silence_100ms = "C:/Users/smhrd/Desktop/silence_100ms.wav"
 
-    try:
-        # 파일 업로드
-        audio_path = upload_file(audio, session_hash)
-        silence_path = upload_file(silence_100ms, session_hash)
-
-        # API 호출
-        api_response = call_api(
-            session_hash=session_hash,
-            audio_path=audio_path,
-            silence_path=silence_path,
-            tts_text="텍스트 호출 실패. 조노스점파이 "
-        )
-
-        # 결과 대기 및 다운로드
-        #print("결과 대기 중...")
-        result = wait_for_result(session_hash)
-        if result:
-            download_audio(result)
+    async def main():
+        with open(audio, "rb") as f:
+            voice = f.read()
+        with open(silence_100ms, "rb") as f:
+            silence = f.read()
+        async with ZonosClient() as client:
+            wav = await client.synthesize("텍스트 호출 실패. 조노스점파이 ", voice, silence,
+                                          voice_name=os.path.basename(audio))
+        with open("output.wav", "wb") as f:
+            f.write(wav)
 
+    try:
+        asyncio.run(main())
     except Exception as e:
         print("")
@@ -316,7 +316,7 @@ export function VoiceCloningStudio({ onSaveSuccess }: VoiceCloningStudioProps) {
       //   type: recordedSamples[0].type
       // })
 
-      const response = await fetch(`${process.env.NEXT_PUBLIC_PY_URL }/upload_model`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_PY_URL }/upload_model?preview=true`, {
         method: 'POST',
         body: formData,
       })
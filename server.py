@@ -1,20 +1,30 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from fastapi import FastAPI, UploadFile, File, Query, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Query, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
-from ZonosTTS import upload_file, call_api, wait_for_result, download_audio, set_server_url
-from VoiceAnalyzer import Analyzer
-import requests as req
-from bs4 import BeautifulSoup as bs
+from starlette.background import BackgroundTask
+from ZonosTTS import ZonosClient, split_sentences
+from TTSQueue import PRIORITIES, TTSQueue
+from TaskStore import FINISHED, AsyncTaskStore, JobRunner, open_task_store
+from EventHub import EventHub
+from AudioDecoder import (concat_audio, float_to_pcm, pcm_to_wav, read_audio, resample_linear,
+                          stream_wav_header, to_wav)
+from S3Storage import EmptyUploadError, RecentUploads, S3Storage, iter_bytes, iter_upload
+from VoiceAnalyzer import (ReferenceFeatureStore, ReferenceNotCached, StreamingAnalyzer,
+                           init_worker, analyze_job, prepare_reference)
+import numpy as np
+import httpx
+from ArticleExtractor import ArticleParser, rule_for
 from pydantic import BaseModel
 import re
 import fitz
-from pykospacing import Spacing
-import tempfile
+from KoSpacing import get_spacing, space_texts
+from PDFText import LayoutIndexStore, extract_page_range, page_count, page_shards
 import os
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import NoCredentialsError, ClientError
 from dotenv import load_dotenv
 import uuid
@@ -23,10 +33,17 @@ import time
 import logging
 import sys
 import io
-import subprocess
 import json
+import hashlib
+import tempfile
 import asyncio
+import random
+import copy
+from collections import OrderedDict
+from urllib.parse import urlsplit
 from datetime import datetime
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait as futures_wait
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
@@ -45,7 +62,126 @@ load_dotenv("C:/Users/smhrd/Desktop/ggg/next-app/.env.local")
 # .env.local 파일에 OPENAI_API_KEY=sk-proj-... 추가 필요
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-app = FastAPI()
+# 음성 분석 프로세스 풀 설정 (0이면 스레드에서 실행)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+# 실행 중 + 대기 중인 분석 작업 최대 개수 (초과 시 429)
+ANALYSIS_MAX_PENDING = int(os.getenv("ANALYSIS_MAX_PENDING", str(max(1, ANALYSIS_WORKERS) * 2)))
+# 일괄 분석이 동시에 쓰는 분석 자리 (워커 하나는 단건/실시간 분석용으로 남겨 둠)
+ANALYSIS_BATCH_CONCURRENCY = int(os.getenv("ANALYSIS_BATCH_CONCURRENCY", str(max(1, ANALYSIS_WORKERS - 1))))
+# 일괄 분석 요청 하나가 동시에 받는 파일 수
+BATCH_DOWNLOAD_CONCURRENCY = int(os.getenv("BATCH_DOWNLOAD_CONCURRENCY", "4"))
+
+# 실시간 분석(WebSocket) 한 세션의 최대 녹음 길이(초)와 받는 바이트, 동시에 도는 부분 점수 계산 수
+LIVE_MAX_SECONDS = float(os.getenv("LIVE_MAX_SECONDS", "120"))
+LIVE_MAX_BYTES = int(os.getenv("LIVE_MAX_MB", "32")) * 1024 * 1024
+LIVE_PARTIAL_CONCURRENCY = int(os.getenv("LIVE_PARTIAL_CONCURRENCY", str(max(1, ANALYSIS_WORKERS))))
+
+analysis_pool = None
+analysis_pending = 0
+batch_analysis_slots = asyncio.Semaphore(ANALYSIS_BATCH_CONCURRENCY)
+live_partial_slots = asyncio.Semaphore(LIVE_PARTIAL_CONCURRENCY)
+
+# 외부 HTTP 호출 설정 (다운로드, 기사 추출, OpenAI)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+try:
+    import h2  # noqa: F401 - 설치되어 있으면 HTTP/2 사용
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+http_client = None
+http_host_limits = {}
+
+# 기사 본문 추출 캐시 (URL → 본문, ETag/Last-Modified로 재검증)
+ARTICLE_CACHE_FRESH = float(os.getenv("ARTICLE_CACHE_FRESH", "300"))   # 재검증 없이 바로 쓰는 기간(초)
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", "1024"))
+article_cache = OrderedDict()   # URL -> {"text", "etag", "last_modified", "checked_at"}
+article_inflight = {}           # URL -> 진행 중인 추출 (같은 기사 동시 요청은 한 번만 받음)
+
+# 업로드 오디오 디코딩 스레드 수
+AUDIO_DECODE_WORKERS = int(os.getenv("AUDIO_DECODE_WORKERS", "4"))
+decode_pool = None
+
+# 띄어쓰기 보정: 모델 하나를 전용 스레드 하나에서 사용 (시작할 때 미리 로드)
+SPACING_PRELOAD = os.getenv("SPACING_PRELOAD", "1") == "1"
+spacing_pool = None
+
+# PDF 추출 작업 프로세스 수 (0이면 스레드에서), 한 번에 맡기는 페이지 수
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(2, os.cpu_count() or 1))))
+PDF_SHARD_PAGES = int(os.getenv("PDF_SHARD_PAGES", "16"))
+pdf_pool = None
+pdf_jobs = {}       # 업로드 임시 PDF 경로 -> 그 파일을 읽는 추출 작업들
+
+@asynccontextmanager
+async def lifespan(app):
+    global analysis_pool, http_client, decode_pool, tts_client, tts_queue, spacing_pool, pdf_pool
+    global task_store, job_runner, event_hub
+    task_store = AsyncTaskStore(open_task_store(TASK_STORE, TASK_TTL, TASK_MAX_ITEMS))
+    event_hub = EventHub(SSE_HISTORY, SSE_BUFFER, SSE_LINGER)
+    job_runner = JobRunner(task_store, event_hub)
+    decode_pool = ThreadPoolExecutor(max_workers=AUDIO_DECODE_WORKERS,
+                                     thread_name_prefix="audio-decode")
+    spacing_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kospacing")
+    if PDF_WORKERS > 0:
+        pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    else:
+        pdf_pool = ThreadPoolExecutor(max_workers=min(2, os.cpu_count() or 1), thread_name_prefix="pdf")
+    if SPACING_PRELOAD:
+        # 모델 로드는 수 초 걸리므로 시작을 막지 않고 전용 스레드에서 (첫 요청은 로드가 끝날 때까지 대기)
+        def spacing_loaded(future):
+            if future.exception():
+                logger.warning(f"띄어쓰기 모델 로드 실패: {future.exception()}")
+        spacing_pool.submit(get_spacing).add_done_callback(spacing_loaded)
+    http_client = httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_CONNECTIONS // 2),
+        follow_redirects=True
+    )
+    tts_client = ZonosClient(SERVER_URL, MODEL_NAME, LANGUAGE,
+                             timeout=HTTP_TIMEOUT, max_connections=TTS_MAX_CONNECTIONS,
+                             upload_ttl=TTS_UPLOAD_TTL, upload_check=TTS_UPLOAD_CHECK)
+    tts_queue = TTSQueue(TTS_CONCURRENCY, TTS_RESERVED_INTERACTIVE, on_change=task_store.put_nowait)
+    tts_queue.start()
+    # TTS 서버 연결을 미리 열어 둠 (첫 합성의 연결 지연 제거)
+    warm_up = asyncio.create_task(tts_client.warm_up())
+    tts_background.add(warm_up)
+    warm_up.add_done_callback(tts_background.discard)
+    if ANALYSIS_WORKERS > 0:
+        analysis_pool = ProcessPoolExecutor(
+            max_workers=ANALYSIS_WORKERS,
+            initializer=init_worker,
+            initargs=(ref_feature_store.cache_dir,
+                      ref_feature_store.max_items,
+                      ref_feature_store.max_bytes)
+        )
+        # 워커를 미리 띄워 첫 요청부터 라이브러리가 로드된 상태로 처리
+        for _ in range(ANALYSIS_WORKERS):
+            analysis_pool.submit(os.getpid)
+        logger.info(f"음성 분석 워커 {ANALYSIS_WORKERS}개 시작")
+    else:
+        await asyncio.to_thread(init_worker,
+                                ref_feature_store.cache_dir,
+                                ref_feature_store.max_items,
+                                ref_feature_store.max_bytes)
+    yield
+    await job_runner.stop()
+    await tts_queue.stop()
+    await http_client.aclose()
+    await tts_client.aclose()
+    await task_store.close()
+    decode_pool.shutdown(wait=False)
+    spacing_pool.shutdown(wait=False)
+    if pdf_pool:
+        pdf_pool.shutdown(wait=False, cancel_futures=True)
+    if analysis_pool:
+        analysis_pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS 설정
 app.add_middleware(
@@ -72,20 +208,121 @@ SERVER_URL = f"{BASE_URL}:{PORT}"
 MODEL_NAME = "Zyphra/Zonos-v0.1-transformer"
 LANGUAGE = "ko"
 
-# ZonosTTS 모듈에 서버 URL 설정
-set_server_url(SERVER_URL)
+# TTS 클라이언트 (lifespan에서 생성)
+TTS_MAX_CONNECTIONS = int(os.getenv("TTS_MAX_CONNECTIONS", "20"))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "300"))           # 합성 결과 대기 최대 시간(초)
+TTS_UPLOAD_TTL = float(os.getenv("TTS_UPLOAD_TTL", str(6 * 3600)))  # 화자/무음 업로드 재사용 기간(초)
+TTS_UPLOAD_CHECK = float(os.getenv("TTS_UPLOAD_CHECK", "600"))  # 재사용 전 서버 보관 여부 확인 주기(초)
+
+# TTS 결과 캐시 (문장/화자/파라미터 해시 → S3 URL, 결과는 버킷에 해시 이름으로 저장)
+TTS_CACHE_TTL = float(os.getenv("TTS_CACHE_TTL", str(24 * 60 * 60)))
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", "4096"))
+tts_cache = OrderedDict()   # 합성 키 -> (만료 시각, S3 URL)
+tts_inflight = {}           # 합성 키 -> 진행 중인 합성 작업과 대기 중인 요청
+
+# 문장 단위 TTS: 요청 하나가 동시에 합성하는 문장 수
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "3"))
+
+# TTS 대기열: TTS 서버로 동시에 보내는 합성 수, 그중 interactive용으로 비워 둘 자리 수
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "2"))
+TTS_RESERVED_INTERACTIVE = int(os.getenv("TTS_RESERVED_INTERACTIVE", "1"))
+TTS_JOBS_MAX = int(os.getenv("TTS_JOBS_MAX", "200"))    # /tts/jobs 한 번에 넣을 수 있는 문장 수
+tts_queue = None
+tts_background = set()      # 응답 후에도 계속 도는 bulk 작업
+
+# 작업 상태 저장소: memory(기본) | sqlite:///경로.db | redis://호스트:포트/0
+# SQLite/Redis면 재시작해도 남고 uvicorn 워커끼리 공유 (다른 워커의 작업 진행률도 저장소에서 읽어 전송)
+TASK_STORE = os.getenv("TASK_STORE", "memory")
+TASK_TTL = float(os.getenv("TASK_TTL", str(6 * 3600)))             # 마지막 갱신 후 보관 기간(초)
+TASK_MAX_ITEMS = int(os.getenv("TASK_MAX_ITEMS", "10000"))          # memory 저장소 최대 작업 수
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", "0.5"))  # 다른 워커의 작업 진행률을 저장소에서 확인하는 주기(초)
+task_store = None
+job_runner = None
+
+# 진행률 방송: 작업이 한 번 발행하면 같은 작업을 보는 모든 SSE 연결이 받음 (이 프로세스에서 도는 작업)
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))   # 이벤트가 없을 때 연결 유지용 주석을 보내는 간격(초)
+SSE_HISTORY = int(os.getenv("SSE_HISTORY", "100"))        # 작업별로 보관해 재연결 때 다시 보낼 이벤트 수
+SSE_BUFFER = int(os.getenv("SSE_BUFFER", "64"))           # 구독자별 밀린 이벤트 최대 수 (넘치면 오래된 것부터 버림)
+SSE_LINGER = float(os.getenv("SSE_LINGER", "60"))         # 끝난 작업의 이벤트를 남겨 두는 기간(초)
+event_hub = None
+
+# 음성 클로닝: 복제한 목소리로 만들어 볼 문장, 최소 녹음 길이(초)
+VOICE_PREVIEW_TEXT = os.getenv("VOICE_PREVIEW_TEXT", "안녕하세요. 제 목소리로 만든 AI 음성입니다.")
+VOICE_MIN_SECONDS = float(os.getenv("VOICE_MIN_SECONDS", "1.0"))
+SILENCE_WAV = pcm_to_wav(np.zeros(8000, dtype=np.int16))           # 0.5초 무음 (합성 앞부분용)
+tts_client = None
 
 # AWS S3 설정
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 S3_REGION = os.getenv("S3_REGION")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None    # S3 호환 서버 (MinIO 등, 테스트용)
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL") or None        # 공개 URL 접두어 (CDN 등)
+S3_PART_SIZE_MB = int(os.getenv("S3_PART_SIZE_MB", "8"))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+S3_RECENT_CACHE_MB = int(os.getenv("S3_RECENT_CACHE_MB", "64"))     # 최근 업로드 메모리 캐시
+S3_RECENT_ITEM_MB = int(os.getenv("S3_RECENT_ITEM_MB", "8"))
 
 s3_client = boto3.client(
     "s3",
    region_name=S3_REGION,
+   endpoint_url=S3_ENDPOINT_URL,
    aws_access_key_id=AWS_ACCESS_KEY_ID,
-   aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+   aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+   config=BotoConfig(max_pool_connections=max(10, S3_UPLOAD_CONCURRENCY * 4))
+)
+s3_storage = S3Storage(s3_client, S3_BUCKET_NAME, region=S3_REGION,
+                       endpoint_url=S3_ENDPOINT_URL, public_url=S3_PUBLIC_URL,
+                       part_size=S3_PART_SIZE_MB * 1024 * 1024,
+                       max_concurrency=S3_UPLOAD_CONCURRENCY,
+                       recent=RecentUploads(S3_RECENT_CACHE_MB * 1024 * 1024,
+                                            S3_RECENT_ITEM_MB * 1024 * 1024))
+
+# 다시 보내도 결과가 같은 메서드 (5xx/전송 중 오류에도 재시도)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# 요청이 서버에 닿기 전에 난 오류 - 어떤 메서드든 다시 보내도 안전
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+async def http_request(method, url, retries=HTTP_RETRIES, stream=False, idempotent=None, **kwargs):
+    """공유 HTTP 클라이언트로 요청 (호스트별 동시 연결 제한, 지터를 둔 재시도)
+
+    연결 오류/429는 항상, 5xx/전송 중 오류는 idempotent 요청만 재시도
+    (idempotent를 안 주면 메서드로 판단 - POST는 서버가 이미 처리했을 수 있어 다시 보내지 않음).
+    stream=True면 본문을 읽기 전에 응답을 돌려줌 (aiter_bytes로 읽고 aclose 필요)
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    host = urlsplit(url).netloc
+    limit = http_host_limits.setdefault(host, asyncio.Semaphore(HTTP_MAX_PER_HOST))
+    for attempt in range(retries + 1):
+        try:
+            async with limit:
+                request = http_client.build_request(method, url, **kwargs)
+                response = await http_client.send(request, stream=stream)
+            retry = response.status_code == 429 or (idempotent and response.status_code >= 500)
+            if not retry or attempt == retries:
+                return response
+            if stream:
+                await response.aclose()
+        except httpx.TransportError as e:
+            if attempt == retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                raise
+        await asyncio.sleep(min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+# 레퍼런스 음성 특징량 캐시 (같은 AI 아나운서 음성은 한 번만 분석)
+# 특징량 자체는 분석 워커들이 디스크 캐시를 공유하고, 여기서는 URL → 키만 기억
+ref_feature_store = ReferenceFeatureStore(
+    cache_dir=os.getenv("REF_FEATURE_CACHE_DIR", os.path.join("temp", "ref_features")),
+    max_items=int(os.getenv("REF_FEATURE_CACHE_ITEMS", "64")),
+    max_bytes=int(os.getenv("REF_FEATURE_CACHE_MB", "512")) * 1024 * 1024
+)
+
+# PDF 레이아웃 색인 캐시 (같은 PDF를 다시 올리면 파싱/띄어쓰기 보정 없이 바로 응답)
+pdf_layout_store = LayoutIndexStore(
+    cache_dir=os.getenv("PDF_LAYOUT_CACHE_DIR", os.path.join("temp", "pdf_layout")),
+    max_items=int(os.getenv("PDF_LAYOUT_CACHE_ITEMS", "32")),
+    max_bytes=int(os.getenv("PDF_LAYOUT_CACHE_MB", "256")) * 1024 * 1024
 )
 
 # OpenAI API 호출 함수
@@ -227,10 +464,10 @@ Overall (전체 점수)	{analysis_result.get('total', 0):.2f}
         }
 
         logger.info("OpenAI API 호출 시작")
-        response = req.post("https://api.openai.com/v1/chat/completions", 
-                           headers=headers, 
-                           json=data, 
-                           timeout=60)
+        response = await http_request("POST", "https://api.openai.com/v1/chat/completions", 
+                                      headers=headers, 
+                                      json=data, 
+                                      timeout=60)
 
         logger.info(f"OpenAI API 응답 상태 코드: {response.status_code}")
         
@@ -268,6 +505,92 @@ Overall (전체 점수)	{analysis_result.get('total', 0):.2f}
         logger.error(f"상세 오류: {traceback.format_exc()}")
         return None
 
+# 피드백 항목 이름 → 분석 결과 키
+FEEDBACK_METRICS = [
+    ("pronunciation", "mfcc"),
+    ("pitch", "pitch"),
+    ("stress", "energy"),
+    ("speed", "speed"),
+    ("vowel", "formant"),
+    ("intonation", "intonation"),
+    ("rhythm", "rhythm"),
+    ("pause", "pause")
+]
+
+# AI 피드백 캐시 설정
+FEEDBACK_CACHE_TTL = float(os.getenv("FEEDBACK_CACHE_TTL", str(24 * 60 * 60)))
+FEEDBACK_CACHE_SIZE = int(os.getenv("FEEDBACK_CACHE_SIZE", "1024"))
+# OpenAI 응답을 기다리는 최대 시간 (초과 시 기본 피드백으로 먼저 응답, 0이면 끝까지 대기)
+FEEDBACK_WAIT_SECONDS = float(os.getenv("FEEDBACK_WAIT_SECONDS", "5"))
+
+feedback_cache = OrderedDict()   # 점수 구간 키 -> (만료 시각, 피드백)
+feedback_inflight = {}           # 점수 구간 키 -> 진행 중인 OpenAI 호출
+
+def score_band(score):
+    """프롬프트의 피드백 가이드라인과 같은 점수 구간 (0~4)"""
+    for band, threshold in enumerate([90, 80, 70, 60]):
+        if score >= threshold:
+            return 4 - band
+    return 0
+
+def feedback_key(analysis_result):
+    return tuple(score_band(analysis_result.get(key, 0)) for _, key in FEEDBACK_METRICS)
+
+def personalize_feedback(feedback, analysis_result):
+    """캐시된 피드백에 이번 분석의 점수와 새 ID를 채움"""
+    feedback = copy.deepcopy(feedback)
+    keys = dict(FEEDBACK_METRICS)
+    feedback["analysisId"] = str(uuid.uuid4())
+    feedback["overallScore"] = round(analysis_result.get('total', 0), 2)
+    for item in feedback.get("items", []):
+        if item.get("metric") in keys:
+            item["score"] = round(analysis_result.get(keys[item["metric"]], 0), 2)
+    return feedback
+
+async def fetch_voice_feedback(key, analysis_result):
+    try:
+        feedback = await generate_voice_feedback(analysis_result)
+        if feedback:
+            feedback_cache[key] = (time.monotonic() + FEEDBACK_CACHE_TTL, feedback)
+            feedback_cache.move_to_end(key)
+            while len(feedback_cache) > FEEDBACK_CACHE_SIZE:
+                feedback_cache.popitem(last=False)
+        return feedback
+    finally:
+        feedback_inflight.pop(key, None)
+
+async def get_voice_feedback(analysis_result):
+    """점수 구간별 캐시를 거쳐 AI 피드백 반환 → (피드백, 출처)
+
+    출처: "cache" | "openai" | "fallback"(OpenAI 응답이 늦어 기본 피드백으로 먼저 응답)
+    같은 구간의 요청이 동시에 오면 OpenAI 호출 하나를 함께 기다린다.
+    OpenAI 호출이 실패하면 피드백은 None.
+    """
+    key = feedback_key(analysis_result)
+    cached = feedback_cache.get(key)
+    if cached:
+        if cached[0] > time.monotonic():
+            feedback_cache.move_to_end(key)
+            return personalize_feedback(cached[1], analysis_result), "cache"
+        del feedback_cache[key]
+
+    task = feedback_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(fetch_voice_feedback(key, analysis_result))
+        feedback_inflight[key] = task
+    try:
+        if FEEDBACK_WAIT_SECONDS > 0:
+            # shield: 시간 초과로 응답해도 호출은 계속되어 캐시를 채움
+            feedback = await asyncio.wait_for(asyncio.shield(task), FEEDBACK_WAIT_SECONDS)
+        else:
+            feedback = await asyncio.shield(task)
+    except asyncio.TimeoutError:
+        logger.info("OpenAI 응답 지연 - 기본 피드백으로 먼저 응답")
+        return create_fallback_feedback(analysis_result), "fallback"
+    if not feedback:
+        return None, "openai"
+    return personalize_feedback(feedback, analysis_result), "openai"
+
 def create_fallback_feedback(analysis_result):
     """OpenAI API를 사용할 수 없을 때 기본 피드백 생성"""
     analysis_id = str(uuid.uuid4())
@@ -286,16 +609,7 @@ def create_fallback_feedback(analysis_result):
         else:
             return "많은 개선이 필요합니다.", ["발음 개선을 위한 기초 연습이 필요합니다.", "전문가의 도움을 받는 것을 권장합니다."]
     
-    metrics = [
-        ("pronunciation", analysis_result.get('mfcc', 0)),
-        ("pitch", analysis_result.get('pitch', 0)),
-        ("stress", analysis_result.get('energy', 0)),
-        ("speed", analysis_result.get('speed', 0)),
-        ("vowel", analysis_result.get('formant', 0)),
-        ("intonation", analysis_result.get('intonation', 0)),
-        ("rhythm", analysis_result.get('rhythm', 0)),
-        ("pause", analysis_result.get('pause', 0))
-    ]
+    metrics = [(metric, analysis_result.get(key, 0)) for metric, key in FEEDBACK_METRICS]
     
     items = []
     for metric, score in metrics:
@@ -320,52 +634,107 @@ class VoiceAnalysisRequest(BaseModel):
     reference_url: str  # AI 아나운서 음성 파일 URL
     user_url: str       # 사용자 녹음 파일 URL
 
+# 일괄 음성 분석 요청 모델 (한 레퍼런스 + 여러 사용자 녹음)
+class BatchVoiceAnalysisRequest(BaseModel):
+    reference_url: str
+    user_urls: list[str]
+    include_feedback: bool = False   # 파일별 OpenAI 피드백 생성 여부
+
+# 일괄 분석 최대 파일 수
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+
+def reserve_analysis_slot():
+    """분석 대기열 자리 확보 - 가득 차면 429로 거절"""
+    global analysis_pending
+    if analysis_pending >= ANALYSIS_MAX_PENDING:
+        raise HTTPException(
+            status_code=429,
+            detail="분석 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.",
+            headers={"Retry-After": "5"}
+        )
+    analysis_pending += 1
+
+def release_analysis_slot():
+    global analysis_pending
+    analysis_pending -= 1
+
+async def download_bytes(url, what):
+    """URL의 파일을 메모리로 받기 (우리 버킷 URL이면 공개 HTTPS 대신 S3/최근 업로드 캐시에서)"""
+    key = s3_storage.key_from_url(url)
+    if key is not None:
+        try:
+            return await s3_storage.fetch(key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise HTTPException(status_code=400, detail=f"{what} 파일을 다운로드할 수 없습니다.")
+            logger.warning(f"S3 직접 다운로드 실패, HTTP로 재시도: {e}")
+        except NoCredentialsError:
+            logger.warning("AWS 인증 정보 없음, HTTP로 다운로드")
+    response = await http_request("GET", url)
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"{what} 파일을 다운로드할 수 없습니다.")
+    return response.content
+
+async def run_analysis(reference_url, user_data):
+    """분석 워커에서 레퍼런스 대비 사용자 음성 분석 (레퍼런스는 캐시에 없을 때만 다운로드)"""
+    loop = asyncio.get_running_loop()
+    ref_key = ref_feature_store.key_for(reference_url)
+    ref_data = None
+    if ref_key is None:
+        ref_data = await download_bytes(reference_url, "레퍼런스 음성")
+    try:
+        result, ref_key = await loop.run_in_executor(
+            analysis_pool, analyze_job, ref_key, ref_data, user_data)
+    except ReferenceNotCached:
+        # 디스크 캐시에서 밀려난 경우 원본을 받아 다시 계산
+        ref_data = await download_bytes(reference_url, "레퍼런스 음성")
+        result, ref_key = await loop.run_in_executor(
+            analysis_pool, analyze_job, None, ref_data, user_data)
+    ref_feature_store.alias(reference_url, ref_key)
+    return result
+
+async def ensure_reference(reference_url):
+    """레퍼런스 특징량이 디스크 캐시에 있도록 보장 (없으면 분석 워커에서 계산) → 캐시 키"""
+    ref_key = ref_feature_store.key_for(reference_url)
+    if ref_key is None or not ref_feature_store.contains(ref_key):
+        ref_data = await download_bytes(reference_url, "레퍼런스 음성")
+        loop = asyncio.get_running_loop()
+        ref_key = await loop.run_in_executor(analysis_pool, prepare_reference, ref_data)
+        ref_feature_store.alias(reference_url, ref_key)
+    return ref_key
+
+async def load_reference_features(reference_url):
+    """레퍼런스 특징량을 이 프로세스로 로드"""
+    features = ref_feature_store.get(await ensure_reference(reference_url))
+    if features is None:
+        raise RuntimeError("레퍼런스 특징량을 불러올 수 없습니다.")
+    return features
+
 # 음성 분석 API 엔드포인트
 @app.post("/analyze-voice")
 async def analyze_voice(request: VoiceAnalysisRequest):
     """음성 분석 API - 레퍼런스 음성과 사용자 음성을 비교 분석"""
-    temp_ref_path = None
-    temp_user_path = None
+    reserve_analysis_slot()
     
     try:
         logger.info(f"음성 분석 시작 - 레퍼런스: {request.reference_url}, 사용자: {request.user_url}")
         
-        # 임시 디렉토리 생성
-        temp_dir = "temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 레퍼런스 음성 파일 다운로드
-        ref_response = req.get(request.reference_url)
-        if ref_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="레퍼런스 음성 파일을 다운로드할 수 없습니다.")
-        
-        temp_ref_path = os.path.join(temp_dir, f"ref_{uuid.uuid4()}.wav")
-        with open(temp_ref_path, "wb") as f:
-            f.write(ref_response.content)
-        
-        # 사용자 음성 파일 다운로드
-        user_response = req.get(request.user_url)
-        if user_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="사용자 음성 파일을 다운로드할 수 없습니다.")
+        # 사용자 음성 파일 다운로드 (임시 파일 없이 메모리에서 바로 분석)
+        user_data = await download_bytes(request.user_url, "사용자 음성")
         
-        temp_user_path = os.path.join(temp_dir, f"user_{uuid.uuid4()}.wav")
-        with open(temp_user_path, "wb") as f:
-            f.write(user_response.content)
+        logger.info(f"음성 파일 다운로드 완료 - 사용자: {len(user_data)} bytes")
         
-        logger.info(f"음성 파일 다운로드 완료 - 레퍼런스: {temp_ref_path}, 사용자: {temp_user_path}")
-        
-        # 음성 분석 실행
-        analyzer = Analyzer(temp_ref_path, temp_user_path)
-        result = analyzer.run()
+        # 음성 분석 실행 (분석 워커 프로세스, 레퍼런스는 캐시된 특징량 사용)
+        result = await run_analysis(request.reference_url, user_data)
         
         logger.info("음성 분석 완료")
         logger.info(f"분석 결과: {result}")
         
-        # OpenAI 피드백 생성
+        # OpenAI 피드백 생성 (점수 구간별 캐시)
         feedback = None
         if OPENAI_API_KEY:
             logger.info("OpenAI 피드백 생성 시작")
-            feedback = await generate_voice_feedback(result)
+            feedback, feedback_source = await get_voice_feedback(result)
             if feedback:
                 logger.info("OpenAI 피드백 생성 완료")
             else:
@@ -390,6 +759,7 @@ async def analyze_voice(request: VoiceAnalysisRequest):
             "success": True,
             "analysis_result": result,
             "ai_feedback": feedback,
+            "feedback_source": feedback_source,
             "timestamp": datetime.now().isoformat(),
             "files": {
                 "reference_url": request.reference_url,
@@ -408,128 +778,196 @@ async def analyze_voice(request: VoiceAnalysisRequest):
         }
     
     finally:
-        # 임시 파일 정리
-        for path in [temp_ref_path, temp_user_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                    logger.info(f"임시 파일 삭제: {path}")
-                except Exception as e:
-                    logger.error(f"임시 파일 삭제 실패: {path}, 에러: {e}")
+        release_analysis_slot()
+
+
+
 
+@app.post("/analyze-voice/batch")
+async def analyze_voice_batch(request: BatchVoiceAnalysisRequest):
+    """일괄 음성 분석 API - 한 레퍼런스에 대해 여러 사용자 녹음을 분석
 
+    레퍼런스는 한 번만 준비하고 사용자 녹음은 분석 워커들에 나눠 처리하며,
+    끝나는 순서대로 파일별 결과를 NDJSON 한 줄씩 스트리밍한다.
+    """
+    if not request.user_urls:
+        raise HTTPException(status_code=400, detail="분석할 사용자 음성 URL이 없습니다.")
+    if len(request.user_urls) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"한 번에 최대 {BATCH_MAX_FILES}개까지 분석할 수 있습니다.")
+
+    logger.info(f"일괄 음성 분석 시작 - 레퍼런스: {request.reference_url}, 파일 수: {len(request.user_urls)}")
+
+    # 받아 놓고 분석을 기다리는 파일이 쌓이지 않도록 분석 자리를 얻을 때까지 다운로드 자리를 잡고 있음
+    downloads = asyncio.Semaphore(BATCH_DOWNLOAD_CONCURRENCY)
+
+    async def analyze_one(index, user_url):
+        try:
+            async with downloads:
+                user_data = await download_bytes(user_url, "사용자 음성")
+                # 분석 자리는 다운로드가 끝난 뒤에 (단건 분석의 대기열과는 따로)
+                await batch_analysis_slots.acquire()
+            try:
+                result = await run_analysis(request.reference_url, user_data)
+            finally:
+                batch_analysis_slots.release()
+            item = {"index": index, "user_url": user_url, "success": True, "analysis_result": result}
+            if request.include_feedback and OPENAI_API_KEY:
+                item["ai_feedback"], item["feedback_source"] = await get_voice_feedback(result)
+            return item
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"일괄 분석 중 오류 발생 - {user_url}: {detail}")
+            return {"index": index, "user_url": user_url, "success": False, "error": detail}
+
+    async def generate():
+        try:
+            # 레퍼런스는 파일들을 분배하기 전에 한 번만 준비
+            await ensure_reference(request.reference_url)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield json.dumps({"done": True, "success": False, "error": detail}, ensure_ascii=False) + "\n"
+            return
+
+        tasks = [asyncio.create_task(analyze_one(i, url)) for i, url in enumerate(request.user_urls)]
+        failed = 0
+        try:
+            for task in asyncio.as_completed(tasks):
+                item = await task
+                failed += 0 if item["success"] else 1
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            # 클라이언트가 연결을 끊으면 남은 작업 취소
+            for task in tasks:
+                task.cancel()
+
+        yield json.dumps({
+            "done": True,
+            "success": failed == 0,
+            "total": len(tasks),
+            "failed": failed,
+            "timestamp": datetime.now().isoformat()
+        }, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/analyze-voice")
+async def analyze_voice_stream(websocket: WebSocket):
+    """녹음 중 실시간 음성 분석 WebSocket
+
+    1) 클라이언트 → {"reference_url": ..., "sample_rate": 16000, "format": "f32" | "s16"}
+    2) 클라이언트 → mono PCM 바이너리 조각 반복, 서버 → {"type": "partial", ...}
+    3) 클라이언트 → {"type": "stop"}, 서버 → {"type": "final", "analysis_result": ...}
+
+    녹음이 LIVE_MAX_SECONDS초나 LIVE_MAX_BYTES를 넘으면 오류를 보내고 닫음 (1009).
+    부분 점수 계산은 모든 세션을 합쳐 LIVE_PARTIAL_CONCURRENCY개까지만 동시에 실행.
+    """
+    await websocket.accept()
+    try:
+        start = await websocket.receive_json()
+        ref_features = await load_reference_features(start["reference_url"])
+        dtype = np.int16 if start.get("format") == "s16" else np.float32
+        streamer = StreamingAnalyzer(ref_features, int(start.get("sample_rate", 16000)))
+        await websocket.send_json({"type": "ready"})
+
+        received = 0
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                received += len(message["bytes"])
+                if received > LIVE_MAX_BYTES or streamer.duration >= LIVE_MAX_SECONDS:
+                    await websocket.send_json({
+                        "type": "error",
+                        "error": f"녹음이 너무 깁니다. (최대 {LIVE_MAX_SECONDS:g}초)"
+                    })
+                    await websocket.close(code=1009)
+                    return
+                pcm = np.frombuffer(message["bytes"], dtype=dtype)
+                if dtype == np.int16:
+                    pcm = pcm.astype(np.float32) / 32768.0
+                # 자리가 날 때까지 다음 조각을 읽지 않음 (클라이언트 쪽으로 역압)
+                async with live_partial_slots:
+                    partial = await asyncio.to_thread(streamer.feed, pcm)
+                if partial:
+                    await websocket.send_json({"type": "partial", **partial})
+            elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                break
+
+        # 녹음 종료 → 전체 녹음으로 최종 점수 (분석 워커)
+        if streamer.duration == 0:
+            raise ValueError("수신된 음성이 없습니다.")
+        try:
+            reserve_analysis_slot()
+        except HTTPException as he:
+            await websocket.send_json({"type": "error", "error": he.detail})
+            return
+        try:
+            result = await run_analysis(start["reference_url"], streamer.wav_bytes())
+        finally:
+            release_analysis_slot()
+        await websocket.send_json({
+            "type": "final",
+            "analysis_result": result,
+            "timestamp": datetime.now().isoformat()
+        })
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        logger.error(f"실시간 음성 분석 중 오류 발생: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "error": str(e)})
+        except Exception:
+            pass
+    finally:
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+async def store_upload_as_wav(file: UploadFile, key):
+    """업로드 파일을 WAV로 S3에 스트리밍 업로드 (WebM은 16kHz 모노로 변환) → 원본 파일 크기"""
+    # 파일 확장자 확인
+    file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ""
+    is_wav_file = file_extension == ".wav"
+    is_webm_file = file_extension == ".webm"
+    
+    if not is_wav_file and not is_webm_file:
+        raise ValueError("지원하지 않는 파일 형식입니다. WAV 또는 WebM 파일만 업로드 가능합니다.")
+    
+    # WAV 파일은 변환 없이 요청 본문을 그대로 멀티파트로 흘려보냄
+    if is_wav_file:
+        try:
+            return await s3_storage.upload(key, iter_upload(file), "audio/wav")
+        except EmptyUploadError:
+            raise EmptyUploadError("업로드된 파일이 비어있습니다.")
+    
+    content = await file.read()
+    if not content:
+        raise EmptyUploadError("업로드된 파일이 비어있습니다.")
+    
+    # WebM 파일은 메모리에서 바로 디코딩 (임시 파일/프로세스 없이, 디코딩 풀에서 실행)
+    loop = asyncio.get_running_loop()
+    wav_content = await loop.run_in_executor(decode_pool, to_wav, content)
+    await s3_storage.upload(key, iter_bytes(wav_content), "audio/wav")
+    return len(content)
 
 
 @app.post("/upload_record")
 async def upload_recording(file: UploadFile = File(...)):
-    tmp_in_path = None
-    tmp_out_path = None
     try:
         #print(f"[DEBUG] 파일 업로드 시작: {file.filename}, 타입: {file.content_type}")
         
-        # 파일 확장자 확인
-        file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ""
-        is_wav_file = file_extension == ".wav"
-        is_webm_file = file_extension == ".webm"
-        
-        #print(f"[DEBUG] 파일 확장자: {file_extension}")
-        #print(f"[DEBUG] WAV 파일 여부: {is_wav_file}")
-        #print(f"[DEBUG] WebM 파일 여부: {is_webm_file}")
-        
-        if not is_wav_file and not is_webm_file:
-            raise ValueError("지원하지 않는 파일 형식입니다. WAV 또는 WebM 파일만 업로드 가능합니다.")
-        
-        # 파일을 임시 저장
-        if is_wav_file:
-            # WAV 파일인 경우 바로 임시 저장
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_in:
-                content = await file.read()
-                if not content:
-                    raise ValueError("업로드된 파일이 비어있습니다.")
-                #print(f"[DEBUG] 파일 크기: {len(content)} bytes")
-                tmp_in.write(content)
-                tmp_in_path = tmp_in.name
-                tmp_out_path = tmp_in_path  # WAV 파일은 변환하지 않으므로 같은 경로 사용
-                #print(f"[DEBUG] 임시 WAV 파일 저장됨: {tmp_in_path}")
-        else:
-            # WebM 파일인 경우 기존 로직 사용
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_in:
-                content = await file.read()
-                if not content:
-                    raise ValueError("업로드된 파일이 비어있습니다.")
-                #print(f"[DEBUG] 파일 크기: {len(content)} bytes")
-                tmp_in.write(content)
-                tmp_in_path = tmp_in.name
-                #print(f"[DEBUG] 임시 WebM 파일 저장됨: {tmp_in_path}")
-
-            # WebM 파일을 WAV로 변환할 경로 생성
-            tmp_out_path = tmp_in_path.replace(".webm", ".wav")
-            #print(f"[DEBUG] 변환될 WAV 파일 경로: {tmp_out_path}")
-
-            # ffmpeg를 이용한 변환 수행
-            ffmpeg_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"  # ffmpeg 전체 경로
-            cmd = [
-                ffmpeg_path,
-                "-i", tmp_in_path,
-                "-ar", "16000",  # 16kHz 샘플레이트
-                "-ac", "1",      # 모노
-                "-y",            # 기존 파일 덮어쓰기
-                tmp_out_path
-            ]
-            #print(f"[DEBUG] ffmpeg 명령어: {' '.join(cmd)}")
-            try:
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                #print(f"[DEBUG] ffmpeg 실행 결과 - 반환 코드: {result.returncode}")
-                #print(f"[DEBUG] ffmpeg stdout: {result.stdout}")
-                #print(f"[DEBUG] ffmpeg stderr: {result.stderr}")
-                if result.returncode != 0:
-                    error_msg = result.stderr
-                    #print(f"[ERROR] ffmpeg 변환 실패. 에러: {error_msg}")
-                    raise RuntimeError(f"ffmpeg 변환 실패: {error_msg}")
-            except FileNotFoundError as e:
-                #print(f"[ERROR] ffmpeg 실행 파일을 찾을 수 없습니다: {e}")
-                #print(f"[DEBUG] 현재 작업 디렉토리: {os.getcwd()}")
-                #print(f"[DEBUG] ffmpeg 경로 존재 여부: {os.path.exists(ffmpeg_path)}")
-                raise
-            #print("[DEBUG] ffmpeg 변환 성공")
-
-        # 변환된 파일이 존재하는지 확인
-        if not os.path.exists(tmp_out_path):
-            raise RuntimeError("WAV 파일이 생성되지 않았습니다.")
-
-        # 변환된 파일 크기 확인
-        wav_size = os.path.getsize(tmp_out_path)
-        #print(f"[DEBUG] WAV 파일 크기: {wav_size} bytes")
-        if wav_size == 0:
-            raise RuntimeError("WAV 파일이 비어있습니다.")
-
         # 고유한 파일 이름 생성
         unique_filename = f"recordings/{uuid.uuid4()}.wav"
 
-        # S3에 업로드
+        # S3에 스트리밍 업로드
         #print(f"[DEBUG] S3 업로드 시작: {unique_filename}")
-        try:
-            with open(tmp_out_path, "rb") as wav_file:
-                file_content = wav_file.read()
-                if not file_content:
-                    raise ValueError("WAV 파일이 비어있습니다.")
-                #print(f"[DEBUG] S3에 업로드할 파일 크기: {len(file_content)} bytes")
-                s3_client.upload_fileobj(
-                    io.BytesIO(file_content),
-                    S3_BUCKET_NAME,
-                    unique_filename,
-                    ExtraArgs={"ContentType": "audio/wav"}
-                )
-            #print(f"[DEBUG] S3_BUCKET_NAME: {S3_BUCKET_NAME} (type: {type(S3_BUCKET_NAME)})")
-            #print(f"[DEBUG] S3_REGION: {S3_REGION}")
-            #print(f"[DEBUG] unique_filename: {unique_filename}")
-            #print("[DEBUG] S3 업로드 완료")
-        except Exception as e:
-            #print(f"[ERROR] S3 업로드 실패: {str(e)}")
-            raise
+        size_bytes = await store_upload_as_wav(file, unique_filename)
 
         # S3 URL 생성
-        s3_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{unique_filename}"
+        s3_url = s3_storage.object_url(unique_filename)
         #print(f"[DEBUG] S3 URL 생성됨: {s3_url}")
 
         return {
@@ -547,158 +985,45 @@ async def upload_recording(file: UploadFile = File(...)):
     except Exception as e:
         #print(f"[ERROR] 예외 발생: {str(e)}")
         return {"success": False, "error": str(e)}
-    finally:
-        # 임시 파일 정리
-        for path in [tmp_in_path, tmp_out_path]:
-            if path and os.path.exists(path) and path != tmp_in_path:  # tmp_in_path와 tmp_out_path가 같은 경우 중복 삭제 방지
-                try:
-                    os.unlink(path)
-                    print("")
-                except Exception as e:
-                    print("")
-        # tmp_in_path가 tmp_out_path와 다른 경우에만 삭제
-        if tmp_in_path and tmp_in_path != tmp_out_path and os.path.exists(tmp_in_path):
-            try:
-                os.unlink(tmp_in_path)
-                print("")
-            except Exception as e:
-                print("")
 
 
 @app.post("/upload_model")
-async def upload_recording(file: UploadFile = File(...)):
-    tmp_in_path = None
-    tmp_out_path = None
+async def upload_recording(
+    request: Request,
+    file: UploadFile = File(...),
+    preview: bool = Query(False, description="true면 업로드한 목소리로 미리듣기 음성을 만드는 클로닝 작업도 시작")
+):
     try:
         #print(f"[DEBUG] 파일 업로드 시작: {file.filename}, 타입: {file.content_type}")
         
-        # 파일 확장자 확인
-        file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ""
-        is_wav_file = file_extension == ".wav"
-        is_webm_file = file_extension == ".webm"
-        
-        #print(f"[DEBUG] 파일 확장자: {file_extension}")
-        #print(f"[DEBUG] WAV 파일 여부: {is_wav_file}")
-        #print(f"[DEBUG] WebM 파일 여부: {is_webm_file}")
-        
-        if not is_wav_file and not is_webm_file:
-            raise ValueError("지원하지 않는 파일 형식입니다. WAV 또는 WebM 파일만 업로드 가능합니다.")
-        
-        # 파일을 임시 저장
-        if is_wav_file:
-            # WAV 파일인 경우 바로 임시 저장
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_in:
-                content = await file.read()
-                if not content:
-                    raise ValueError("업로드된 파일이 비어있습니다.")
-                #print(f"[DEBUG] 파일 크기: {len(content)} bytes")
-                tmp_in.write(content)
-                tmp_in_path = tmp_in.name
-                tmp_out_path = tmp_in_path  # WAV 파일은 변환하지 않으므로 같은 경로 사용
-                #print(f"[DEBUG] 임시 WAV 파일 저장됨: {tmp_in_path}")
-        else:
-            # WebM 파일인 경우 기존 로직 사용
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_in:
-                content = await file.read()
-                if not content:
-                    raise ValueError("업로드된 파일이 비어있습니다.")
-                #print(f"[DEBUG] 파일 크기: {len(content)} bytes")
-                tmp_in.write(content)
-                tmp_in_path = tmp_in.name
-                #print(f"[DEBUG] 임시 WebM 파일 저장됨: {tmp_in_path}")
-
-            # WebM 파일을 WAV로 변환할 경로 생성
-            tmp_out_path = tmp_in_path.replace(".webm", ".wav")
-            #print(f"[DEBUG] 변환될 WAV 파일 경로: {tmp_out_path}")
-
-            # ffmpeg를 이용한 변환 수행
-            ffmpeg_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"  # ffmpeg 전체 경로
-            cmd = [
-                ffmpeg_path,
-                "-i", tmp_in_path,
-                "-ar", "16000",  # 16kHz 샘플레이트
-                "-ac", "1",      # 모노
-                "-y",            # 기존 파일 덮어쓰기
-                tmp_out_path
-            ]
-            #print(f"[DEBUG] ffmpeg 명령어: {' '.join(cmd)}")
-            try:
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                #print(f"[DEBUG] ffmpeg 실행 결과 - 반환 코드: {result.returncode}")
-                #print(f"[DEBUG] ffmpeg stdout: {result.stdout}")
-                #print(f"[DEBUG] ffmpeg stderr: {result.stderr}")
-                if result.returncode != 0:
-                    error_msg = result.stderr
-                    #print(f"[ERROR] ffmpeg 변환 실패. 에러: {error_msg}")
-                    raise RuntimeError(f"ffmpeg 변환 실패: {error_msg}")
-            except FileNotFoundError as e:
-                #print(f"[ERROR] ffmpeg 실행 파일을 찾을 수 없습니다: {e}")
-                #print(f"[DEBUG] 현재 작업 디렉토리: {os.getcwd()}")
-                #print(f"[DEBUG] ffmpeg 경로 존재 여부: {os.path.exists(ffmpeg_path)}")
-                raise
-            #print("[DEBUG] ffmpeg 변환 성공")
-
-        # 변환된 파일이 존재하는지 확인
-        if not os.path.exists(tmp_out_path):
-            raise RuntimeError("WAV 파일이 생성되지 않았습니다.")
-
-        # 변환된 파일 크기 확인
-        wav_size = os.path.getsize(tmp_out_path)
-        #print(f"[DEBUG] WAV 파일 크기: {wav_size} bytes")
-        if wav_size == 0:
-            raise RuntimeError("WAV 파일이 비어있습니다.")
-
         # 고유한 파일 이름 생성
         unique_filename = f"model/{uuid.uuid4()}.wav"
 
-        # S3에 업로드
+        # S3에 스트리밍 업로드
         #print(f"[DEBUG] S3 업로드 시작: {unique_filename}")
-        try:
-            with open(tmp_out_path, "rb") as wav_file:
-                file_content = wav_file.read()
-                if not file_content:
-                    raise ValueError("WAV 파일이 비어있습니다.")
-                #print(f"[DEBUG] S3에 업로드할 파일 크기: {len(file_content)} bytes")
-                s3_client.upload_fileobj(
-                    io.BytesIO(file_content),
-                    S3_BUCKET_NAME,
-                    unique_filename,
-                    ExtraArgs={"ContentType": "audio/wav"}
-                )
-            #print(f"[DEBUG] S3_BUCKET_NAME: {S3_BUCKET_NAME} (type: {type(S3_BUCKET_NAME)})")
-            #print(f"[DEBUG] S3_REGION: {S3_REGION}")
-            #print(f"[DEBUG] unique_filename: {unique_filename}")
-            #print("[DEBUG] S3 업로드 완료")
-        except Exception as e:
-            #print(f"[ERROR] S3 업로드 실패: {str(e)}")
-            raise
+        size_bytes = await store_upload_as_wav(file, unique_filename)
 
         # S3 URL 생성
-        s3_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{unique_filename}"
+        s3_url = s3_storage.object_url(unique_filename)
         #print(f"[DEBUG] S3 URL 생성됨: {s3_url}")
 
-        # 작업 ID 생성
-        task_id = str(uuid.uuid4())
-        
-        # 작업 정보 저장
-        processing_tasks[task_id] = {
-            "status": "processing",
-            "start_time": datetime.now(),
-            "file_info": {
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size_bytes": len(content)
-            }
-        }
-
-        return {
+        result = {
             "success": True,
             "filename": unique_filename,
             "url": s3_url,
-            "status": "success",
-            "task_id": task_id
+            "status": "success"
         }
 
+        # 요청한 경우에만 음성 클로닝 작업 시작 (진행률은 /process-voice-stream/{task_id})
+        if preview:
+            result["task_id"] = await start_voice_job(VOICE_PREVIEW_TEXT, unique_filename, {
+                "filename": file.filename,
+                "content_type": file.content_type,
+                "size_bytes": size_bytes
+            }, request.client.host if request.client else "anonymous")
+
+        return result
+
     except ClientError as e:
         #print(f"[ERROR] AWS ClientError: {e}")
         return {"success": False, "error": f"AWS ClientError: {e}"}
@@ -708,22 +1033,6 @@ async def upload_recording(file: UploadFile = File(...)):
     except Exception as e:
         #print(f"[ERROR] 예외 발생: {str(e)}")
         return {"success": False, "error": str(e)}
-    finally:
-        # 임시 파일 정리
-        for path in [tmp_in_path, tmp_out_path]:
-            if path and os.path.exists(path) and path != tmp_in_path:  # tmp_in_path와 tmp_out_path가 같은 경우 중복 삭제 방지
-                try:
-                    os.unlink(path)
-                    print("")
-                except Exception as e:
-                    print("")
-        # tmp_in_path가 tmp_out_path와 다른 경우에만 삭제
-        if tmp_in_path and tmp_in_path != tmp_out_path and os.path.exists(tmp_in_path):
-            try:
-                os.unlink(tmp_in_path)
-                print("")
-            except Exception as e:
-                print("")
 
 
 @app.get("/health")
@@ -733,194 +1042,644 @@ async def health_check():
 class URLRequest(BaseModel):
     url: str
 
-def extract_two_columns_text(pdf_path, column_split_ratio=0.5):
-    doc = fitz.open(pdf_path)
-    all_text = []
+async def fetch_article(url, cached=None):
+    """기사 페이지를 받으며 바로 파싱해 본문 추출 → 캐시 항목 (본문 끝을 만나면 나머지는 받지 않음)
 
-    for page in doc:
-        blocks = page.get_text("blocks")
-        page_width = page.rect.width
-        split_x = page_width * column_split_ratio
+    cached가 있으면 조건부 요청으로 재검증하고, 304면 본문은 그대로 두고 확인 시각만 갱신
+    """
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-        left_col = []
-        right_col = []
-
-        for block in blocks:
-            x0, y0, x1, y1, text, *_ = block
-            if x1 < split_x:
-                left_col.append((y0, text))
-            elif x0 >= split_x:
-                right_col.append((y0, text))
-            else:
-                left_col.append((y0, text))
-
-        left_col.sort()
-        right_col.sort()
-
-        left_text = "\n".join([t for _, t in left_col])
-        right_text = "\n".join([t for _, t in right_col])
-        page_text = left_text + "\n" + right_text
-
-        all_text.append(page_text)
-
-    return "\n\n".join(all_text)
+    res = await http_request("GET", url, stream=True, headers=headers)
+    try:
+        if res.status_code == 304 and cached:
+            return dict(cached, checked_at=time.monotonic())
+        res.raise_for_status()
+        # 응답 헤더에 charset이 없으면 파서가 meta 태그로 판단
+        charset = (res.headers.get("content-type") or "").lower().partition("charset=")[2]
+        parser = ArticleParser(rule_for(str(res.url)), charset.strip(' "\'') or None)
+        async for chunk in res.aiter_bytes():
+            if parser.feed(chunk):
+                break
+        return {
+            "text": parser.close(),
+            "etag": res.headers.get("etag"),
+            "last_modified": res.headers.get("last-modified"),
+            "checked_at": time.monotonic()
+        }
+    finally:
+        await res.aclose()
+
+async def get_article_text(url):
+    """URL의 기사 본문 (캐시 → 재검증 → 새로 추출, 같은 URL 동시 요청은 한 번만 받음)"""
+    cached = article_cache.get(url)
+    if cached and time.monotonic() - cached["checked_at"] < ARTICLE_CACHE_FRESH:
+        article_cache.move_to_end(url)
+        return cached["text"]
+
+    future = article_inflight.get(url)
+    if future is None:
+        future = asyncio.ensure_future(fetch_article(url, cached))
+        article_inflight[url] = future
+        future.add_done_callback(lambda _: article_inflight.pop(url, None))
+        # 아무도 기다리지 않게 되어도 예외가 경고로 남지 않도록
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    entry = await asyncio.shield(future)
+
+    # 검증할 수단(ETag/Last-Modified)이 없는 페이지도 신선한 기간 동안은 재사용
+    article_cache[url] = entry
+    article_cache.move_to_end(url)
+    while len(article_cache) > ARTICLE_CACHE_SIZE:
+        article_cache.popitem(last=False)
+    return entry["text"]
 
 @app.post("/extract-text")
 async def extract_text(request: URLRequest):
     try:
-        res = req.get(request.url)
-        soup = bs(res.text, 'lxml')
-        text = soup.get_text(separator='\n', strip=True)
-        lines = text.split('\n')
-        
-        filtered_lines = []
-        stop = False
-        
-        for line in lines:
-            if stop:
-                break
-                
-            if '@' in line and '.' in line:
-                filtered_lines.append(line)
-                stop = True
-                
-            elif len(line) > 20 and line.endswith("."):
-                filtered_lines.append(line)
-                
-        filtered_text = '\n'.join(filtered_lines)
-        
-        # 특정 텍스트 제거
-        remove_text = "자동 추출 기술로 요약된 내용입니다. 요약 기술의 특성상 본문의 주요 내용이 제외될 수 있어, 전체 맥락을 이해하기 위해서는 기사 본문 전체보기를 권장합니다.\n이동 통신망을 이용하여 음성을 재생하면 별도의 데이터 통화료가 부과될 수 있습니다."
-        filtered_text = filtered_text.replace(remove_text, "").strip()
-        
-        return {"text": filtered_text}
+        # 기사 본문만 남김 (마침표로 끝나는 긴 줄 ~ 기자 이메일 줄, 사이트별 규칙은 ArticleExtractor)
+        return {"text": await get_article_text(request.url)}
     except Exception as e:
         return {"error": str(e)}
         
 
-@app.post("/extract-pdf")
-async def extract_pdf(file: UploadFile = File(...)):
+async def save_upload_pdf(file):
+    """업로드한 PDF를 조각 단위로 임시 파일에 쓰면서 해시 → (임시 파일 경로, 문서 ID)
+
+    문서 ID = PDF 내용 해시 (레이아웃 색인 키, /pdf-pages 조회에 사용). 임시 파일은 호출한 쪽에서 삭제.
+    """
+    loop = asyncio.get_running_loop()
+    h = hashlib.sha256()
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+
+    def write(chunk):
+        h.update(chunk)
+        temp_file.write(chunk)
+
     try:
-        # 임시 파일 생성
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        # PDF 텍스트 추출
-        text = extract_two_columns_text(temp_file_path)
-        
-        # 공백 제거 및 띄어쓰기 보정
-        result_text = re.sub(r"\s+", "", text)
-        spacing = Spacing()
-        spaced_text = spacing(result_text)
+        with temp_file:
+            async for chunk in iter_upload(file):
+                await loop.run_in_executor(None, write, chunk)
+    except BaseException:
+        os.unlink(temp_file.name)
+        raise
+    return temp_file.name, LayoutIndexStore.finish_key(h)
+
+async def discard_upload_pdf(path):
+    """업로드 임시 PDF를 읽는 추출 작업이 모두 끝난 뒤에 삭제 (Windows는 열린 파일을 못 지움)
+
+    실패해도 응답을 바꾸지 않고 로그만 남김.
+    """
+    running = [job for job in pdf_jobs.pop(path, []) if not job.cancel()]
+    if running:
+        # 실패한 작업의 예외는 추출 쪽에서 이미 처리했으므로 끝나기만 기다림
+        await asyncio.to_thread(futures_wait, running)
+    try:
+        os.unlink(path)
+    except OSError as e:
+        logger.warning(f"임시 파일 삭제 실패: {path} ({e})")
+
+async def iter_pdf_pages(pdf_path):
+    """PDF 페이지 구간을 작업 프로세스들에서 동시에 추출해 앞 구간부터 순서대로 내보냄 → 구간별 페이지 레이아웃 목록
+
+    작업 프로세스에는 PDF 내용 대신 파일 경로와 페이지 구간만 넘기고, 각자 파일을 열어 그 구간만 읽음.
+    """
+    # 이 파일을 읽는 작업은 pdf_jobs에 남겨 discard_upload_pdf가 끝날 때까지 기다린 뒤 지우게 함
+    jobs = pdf_jobs.setdefault(pdf_path, [])
+    counter = pdf_pool.submit(page_count, pdf_path)
+    jobs.append(counter)
+    count = await asyncio.wrap_future(counter)
+    shards = [pdf_pool.submit(extract_page_range, pdf_path, start, stop)
+              for start, stop in page_shards(count, PDF_SHARD_PAGES)]
+    jobs.extend(shards)
+    try:
+        for shard in shards:
+            yield await asyncio.wrap_future(shard)
+    finally:
+        for shard in shards:
+            shard.cancel()          # 아직 시작하지 않은 구간만 취소됨
+
+async def iter_cached_shards(pages):
+    """색인에 저장된 페이지 레이아웃을 구간 단위로 내보냄"""
+    for start in range(0, len(pages), PDF_SHARD_PAGES):
+        yield pages[start:start + PDF_SHARD_PAGES]
+
+async def iter_spaced_pages(pdf_path, doc_id):
+    """페이지별로 공백 제거 후 띄어쓰기 보정 (구간 단위로 묶어서 모델 스레드에 넘김) → (페이지 번호, 텍스트)
+
+    단 검출이 끝나면 띄어쓰기 보정 성공 여부와 상관없이 레이아웃 색인에 저장하고,
+    보정까지 끝났으면 보정한 텍스트도 함께 저장. 색인이 있으면 저장된 결과를 그대로 씀.
+    """
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(None, pdf_layout_store.get, doc_id)
+    if index and index.get("spaced") is not None:
+        for number, text in enumerate(index["spaced"], 1):
+            yield number, text
+        return
+
+    # 레이아웃만 저장되어 있으면 (띄어쓰기 보정 실패 등) 파싱은 건너뜀
+    shards = iter_cached_shards(index["pages"]) if index else iter_pdf_pages(pdf_path)
+    layouts, spaced, error = [], [], None
+    try:
+        async for pages in shards:
+            layouts.extend(pages)
+            if error is not None:
+                continue                # 보정이 실패해도 나머지 구간의 단 검출은 끝까지
+            stripped = [re.sub(r"\s+", "", page["text"]) for page in pages]
+            try:
+                texts = await loop.run_in_executor(spacing_pool, space_texts, stripped)
+            except Exception as e:
+                error = e
+                continue
+            for text in texts:
+                spaced.append(text)
+                yield len(spaced), text
+    finally:
+        await shards.aclose()       # 중간에 끝나도 추출 작업이 정리된 뒤에 돌아가도록
 
-        # 임시 파일 삭제
-        os.unlink(temp_file_path)
+    if error is None:
+        await loop.run_in_executor(None, pdf_layout_store.put, doc_id,
+                                   {"pages": layouts, "spaced": spaced})
+        return
+    if not index:
+        await loop.run_in_executor(None, pdf_layout_store.put, doc_id, {"pages": layouts})
+    raise error
 
-        return {"text": spaced_text}
+@app.post("/extract-pdf")
+async def extract_pdf(
+    file: UploadFile = File(...),
+    stream: bool = Query(False, description="true면 페이지마다 NDJSON 한 줄씩 바로 전송")
+):
+    # 업로드 파일은 한 번만 임시 파일로 저장하고, 추출 프로세스들은 그 파일에서 각자 페이지 구간만 읽음
+    pdf_path, doc_id = await save_upload_pdf(file)
+    
+    if stream:
+        async def generate():
+            pages = 0
+            try:
+                async for number, text in iter_spaced_pages(pdf_path, doc_id):
+                    pages = number
+                    yield json.dumps({"page": number, "text": text}, ensure_ascii=False) + "\n"
+                yield json.dumps({"done": True, "pages": pages, "doc_id": doc_id}, ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({"done": True, "pages": pages, "error": str(e)}, ensure_ascii=False) + "\n"
+        
+        # 본문을 보내기 전에 연결이 끊겨도 지워지도록 응답이 끝난 뒤 백그라운드 작업으로 삭제
+        return StreamingResponse(generate(), media_type="application/x-ndjson",
+                                 background=BackgroundTask(discard_upload_pdf, pdf_path))
+    
+    try:
+        # PDF 텍스트 추출 + 공백 제거 및 띄어쓰기 보정 (페이지 구간별로 동시에)
+        spaced_pages = [text async for _, text in iter_spaced_pages(pdf_path, doc_id)]
+        return {"text": " ".join(text for text in spaced_pages if text), "doc_id": doc_id}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        await discard_upload_pdf(pdf_path)
+
+@app.get("/pdf-pages/{doc_id}")
+async def get_pdf_pages(
+    doc_id: str,
+    page: int = Query(None, ge=1, description="페이지 번호 (없으면 전체)")
+):
+    """이미 추출한 PDF의 페이지별 텍스트와 단 경계를 색인에서 바로 조회"""
+    if not LayoutIndexStore.is_key(doc_id):
+        raise HTTPException(status_code=400, detail="문서 ID는 64자리 소문자 16진수여야 합니다.")
+    index = await asyncio.get_running_loop().run_in_executor(None, pdf_layout_store.get, doc_id)
+    if not index:
+        raise HTTPException(status_code=404, detail="추출된 적 없는 문서입니다.")
+    spaced = index.get("spaced") or []
+    pages = [
+        {"page": number, "columns": layout["columns"],
+         "text": spaced[number - 1] if number <= len(spaced) else layout["text"]}
+        for number, layout in enumerate(index["pages"], 1)
+    ]
+    if page is not None:
+        if page > len(pages):
+            raise HTTPException(status_code=404, detail="페이지 번호가 범위를 벗어났습니다.")
+        return pages[page - 1]
+    return {"doc_id": doc_id, "pages": pages}
+
+async def synthesize_to_s3(text, voice, silence, voice_name, on_progress=None, key=None):
+    """TTS 합성 후 결과를 S3에 업로드 → S3 URL (key를 주면 그 객체 키로 저장)"""
+    # 업로드 → 합성 → 결과 대기 → 다운로드 (요청마다 별도 세션 해시)
+    wav = await tts_client.synthesize(text, voice, silence, voice_name=voice_name,
+                                      timeout=TTS_TIMEOUT, on_progress=on_progress)
+    logger.info("TTS 변환 완료")
+    
+    # 고유한 파일 이름 생성
+    unique_filename = key or f"tts_output/{uuid.uuid4()}.wav"
+    
+    # S3에 스트리밍 업로드
+    try:
+        size_bytes = await s3_storage.upload(unique_filename, iter_bytes(wav), "audio/wav")
+    except EmptyUploadError:
+        raise EmptyUploadError("TTS 결과 파일이 비어있습니다.")
+    logger.info(f"S3에 업로드한 파일 크기: {size_bytes} bytes")
+    
+    # S3 URL 생성
+    s3_url = s3_storage.object_url(unique_filename)
+    logger.info(f"TTS 결과 S3 업로드 완료: {s3_url}")
+    return s3_url
+
+def tts_object_key(key):
+    return f"tts_output/{key}.wav"
+
+async def new_tts_task(text, voice_name, user, priority):
+    """TTS 합성 작업 상태를 작업 저장소에 등록 → 작업 ID"""
+    task_id = str(uuid.uuid4())
+    await task_store.put(task_id, {
+        "type": "tts",
+        "status": "queued",
+        "start_time": datetime.now().isoformat(),
+        "text": text,
+        "user": user,
+        "priority": priority,
+        "audio_info": {"filename": voice_name}
+    })
+    return task_id
+
+async def produce_tts(key, text, voice, silence, voice_name, job):
+    """버킷에 같은 합성 결과가 있으면 재사용, 없으면 대기열을 거쳐 합성 → (S3 URL, 출처)"""
+    def on_progress(event):
+        for listener in list(job["listeners"]):
+            listener(event)
+    
+    object_key = tts_object_key(key)
+    try:
+        if await s3_storage.exists(object_key):
+            url, source = s3_storage.object_url(object_key), "stored"
+        else:
+            url, source = None, "synthesized"
+    except (ClientError, NoCredentialsError) as e:
+        logger.warning(f"TTS 결과 존재 확인 실패: {e}")
+        url, source = None, "synthesized"
+    if url is None:
+        task_id = job.get("task_id") or await new_tts_task(text, voice_name, job["user"], job["priority"])
+        job["task_id"] = task_id
+        info = await task_store.get(task_id) or {}
+        url = await tts_queue.run(
+            task_id,
+            lambda: synthesize_to_s3(text, voice, silence, voice_name, on_progress, key=object_key),
+            user=job["user"], priority=job["priority"], info=info)
+        await task_store.update(task_id, result_url=url)
+    
+    tts_cache[key] = (time.monotonic() + TTS_CACHE_TTL, url)
+    tts_cache.move_to_end(key)
+    while len(tts_cache) > TTS_CACHE_SIZE:
+        tts_cache.popitem(last=False)
+    return url, source
+
+async def get_tts_url(text, voice, silence, voice_name, on_progress=None,
+                      user="anonymous", priority="interactive", task_id=None):
+    """문장/화자/파라미터가 같은 TTS 결과를 재사용 → (S3 URL, 출처)
+
+    출처: "cache" | "stored"(버킷에 이미 있음) | "synthesized" | "coalesced"(진행 중인 합성을 함께 기다림)
+    같은 합성을 기다리는 요청이 모두 떠나면 합성도 취소된다.
+    실제 합성은 TTS 대기열(user별 공평 분배, priority 순)을 거친다. task_id를 주면 그 작업 ID로 상태를 기록.
+    """
+    key = tts_client.synthesis_key(text, voice, silence)
+    cached = tts_cache.get(key)
+    if cached:
+        if cached[0] > time.monotonic():
+            tts_cache.move_to_end(key)
+            return cached[1], "cache"
+        del tts_cache[key]
+    
+    job = tts_inflight.get(key)
+    coalesced = job is not None
+    if job is None:
+        job = {"listeners": [], "waiters": 0, "user": user, "priority": priority, "task_id": task_id}
+        job["task"] = asyncio.create_task(
+            produce_tts(key, text, voice, silence, voice_name, job))
+        tts_inflight[key] = job
+        job["task"].add_done_callback(
+            lambda _: tts_inflight.pop(key, None) if tts_inflight.get(key) is job else None)
+    elif PRIORITIES[priority] < PRIORITIES[job["priority"]]:
+        # 더 급한 요청이 같은 합성을 기다리게 되면 대기열 순서를 앞당김
+        job["priority"] = priority
+        if job.get("task_id"):
+            tts_queue.promote(job["task_id"], priority)
+    if on_progress is not None:
+        job["listeners"].append(on_progress)
+    job["waiters"] += 1
+    try:
+        url, source = await asyncio.shield(job["task"])
+    finally:
+        job["waiters"] -= 1
+        if on_progress is not None:
+            job["listeners"].remove(on_progress)
+        if job["waiters"] == 0 and not job["task"].done():
+            job["task"].cancel()
+    return url, "coalesced" if coalesced else source
+
+def tts_requester(request, user_id, priority):
+    """대기열에서 쓸 사용자 식별값 (우선순위 값도 검사)"""
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority는 {', '.join(PRIORITIES)} 중 하나여야 합니다.")
+    return user_id or (request.client.host if request.client else "anonymous")
 
 @app.post("/tts")
 async def create_tts(
+    request: Request,
     text: str = Query(..., description="TTS로 변환할 텍스트"),
     voice_file: UploadFile = File(...),
-    silence_file: UploadFile = File(...)
+    silence_file: UploadFile = File(...),
+    user_id: str = Query(None, description="대기열 공평 분배 기준 (없으면 클라이언트 IP)"),
+    priority: str = Query("interactive", description="interactive 또는 bulk")
 ):
     
     logger.info("/tts 엔드포인트 호출됨")
-    # 임시 파일 저장
-    temp_dir = "temp"
-    os.makedirs(temp_dir, exist_ok=True)
+    user = tts_requester(request, user_id, priority)
+    # 업로드 파일은 메모리에서 바로 사용 (요청끼리 임시 파일을 공유하지 않음)
+    voice = await voice_file.read()
+    silence = await silence_file.read()
     
-    logger.info("/tts 임시 파일 저장됨")
-    voice_path = os.path.join(temp_dir, "voice.wav")
-    silence_path = os.path.join(temp_dir, "silence.wav")
+    try:
+        s3_url, source = await get_tts_url(text, voice, silence, voice_file.filename or "voice.wav",
+                                           user=user, priority=priority)
+        return {"success": True, "url": s3_url, "source": source}
+    except Exception as e:
+        logger.error(f"TTS 변환 실패: {str(e)}")
+        return {"success": False, "error": f"TTS 변환 실패: {str(e)}"}
+
+@app.post("/tts-stream")
+async def create_tts_stream(
+    request: Request,
+    text: str = Query(..., description="TTS로 변환할 텍스트"),
+    voice_file: UploadFile = File(...),
+    silence_file: UploadFile = File(...),
+    user_id: str = Query(None, description="대기열 공평 분배 기준 (없으면 클라이언트 IP)"),
+    priority: str = Query("interactive", description="interactive 또는 bulk")
+):
+    """TTS 변환 진행 상황(대기열 순번, 진행률)을 SSE로 보내고 마지막에 S3 URL 전송"""
+    user = tts_requester(request, user_id, priority)
+    voice = await voice_file.read()
+    silence = await silence_file.read()
+    voice_name = voice_file.filename or "voice.wav"
     
-    # 파일 저장
-    with open(voice_path, "wb") as f:
-        f.write(await voice_file.read())
-    with open(silence_path, "wb") as f:
-        f.write(await silence_file.read())
+    async def generate():
+        events = asyncio.Queue()
+        task = asyncio.create_task(
+            get_tts_url(text, voice, silence, voice_name, on_progress=events.put_nowait,
+                        user=user, priority=priority))
+        try:
+            while True:
+                getter = asyncio.ensure_future(events.get())
+                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                event = dict(getter.result(), timestamp=datetime.now().isoformat())
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            
+            # 합성이 끝나기 직전에 들어온 진행 이벤트도 최종 이벤트보다 먼저 보냄
+            while not events.empty():
+                event = dict(events.get_nowait(), timestamp=datetime.now().isoformat())
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            
+            if task.cancelled():
+                data = {"stage": "error", "error": "TTS 작업이 취소되었습니다."}
+            elif task.exception() is not None:
+                logger.error(f"TTS 변환 실패: {str(task.exception())}")
+                data = {"stage": "error", "error": f"TTS 변환 실패: {str(task.exception())}"}
+            else:
+                url, source = task.result()
+                data = {"stage": "completed", "completed": True, "url": url, "source": source}
+            data["timestamp"] = datetime.now().isoformat()
+            yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            # 클라이언트가 연결을 끊으면 합성도 취소 (TTS 서버 작업까지 취소 요청)
+            task.cancel()
     
-    logger.info("파일 저장됨")
-    # 세션 해시 생성 (현재 시간 기반)
-    session_hash = str(int(time.time()))
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/tts/jobs")
+async def create_tts_jobs(
+    request: Request,
+    texts: list[str] = Form(..., description="미리 만들어 둘 문장들"),
+    voice_file: UploadFile = File(...),
+    silence_file: UploadFile = File(...),
+    user_id: str = Query(None, description="대기열 공평 분배 기준 (없으면 클라이언트 IP)"),
+    priority: str = Query("bulk", description="interactive 또는 bulk")
+):
+    """문장 여러 개를 대기열에 넣고 바로 작업 ID 반환 (진행 상황은 /status/{task_id}, /tasks)"""
+    user = tts_requester(request, user_id, priority)
+    texts = [text for text in texts if text.strip()]
+    if not texts:
+        raise HTTPException(status_code=400, detail="변환할 텍스트가 비어있습니다.")
+    if len(texts) > TTS_JOBS_MAX:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {TTS_JOBS_MAX}개까지 요청할 수 있습니다.")
+    voice = await voice_file.read()
+    silence = await silence_file.read()
+    voice_name = voice_file.filename or "voice.wav"
+    
+    async def run_job(task_id, text):
+        try:
+            url, source = await get_tts_url(text, voice, silence, voice_name,
+                                            user=user, priority=priority, task_id=task_id)
+            fields = {"status": "completed", "result_url": url, "source": source}
+        except asyncio.CancelledError:
+            fields = {"status": "cancelled"}
+        except Exception as e:
+            fields = {"status": "error", "error": str(e)}
+        info = await task_store.get(task_id) or {}
+        await task_store.update(task_id, end_time=info.get("end_time") or datetime.now().isoformat(), **fields)
+    
+    jobs = []
+    for text in texts:
+        task_id = await new_tts_task(text, voice_name, user, priority)
+        task = asyncio.create_task(run_job(task_id, text))
+        tts_background.add(task)
+        task.add_done_callback(tts_background.discard)
+        jobs.append({"task_id": task_id, "text": text})
+    return {"success": True, "jobs": jobs, "queue": tts_queue.stats()}
+
+def audio_to_pcm(audio, sr=None):
+    """(신호, 샘플레이트) → (16bit PCM 바이트, 샘플레이트) - sr을 주면 그 샘플레이트로 맞춤"""
+    y, clip_sr = audio
+    sr = sr or clip_sr
+    return float_to_pcm(resample_linear(y, clip_sr, sr)).tobytes(), sr
+
+def wav_to_pcm(wav, sr=None):
+    """WAV 바이트 → (16bit PCM 바이트, 샘플레이트)"""
+    return audio_to_pcm(read_audio(wav), sr)
+
+async def synthesize_sentences(sentences, voice, silence, voice_name, user, priority):
+    """문장들을 동시에(최대 TTS_CHUNK_CONCURRENCY개) 합성하고 앞 문장부터 순서대로 내보냄
+
+    → (순번, 문장, S3 URL, 출처, WAV 바이트). 첫 문장은 먼저 대기열에 들어가 가장 먼저 끝난다.
+    """
+    slots = asyncio.Semaphore(TTS_CHUNK_CONCURRENCY)
     
+    async def synthesize_one(sentence):
+        async with slots:
+            url, source = await get_tts_url(sentence, voice, silence, voice_name,
+                                            user=user, priority=priority)
+        # 방금 올린 결과는 최근 업로드 캐시에서 바로 꺼냄
+        return url, source, await download_bytes(url, "TTS 결과")
+    
+    tasks = [asyncio.create_task(synthesize_one(sentence)) for sentence in sentences]
     try:
-        logger.info("try")
-        # 파일 업로드
-        logger.info("음성 파일 업로드 시작")
-        
-        # 파일 업로드
-        uploaded_voice_path = upload_file(voice_path, session_hash)
-        logger.info("무음 파일 업로드 시작")
-        uploaded_silence_path = upload_file(silence_path, session_hash)
-        
-        # API 호출
-        logger.info("API 호출 시작")
-        call_api(
-            session_hash=session_hash,
-            audio_path=uploaded_voice_path,
-            silence_path=uploaded_silence_path,
-            tts_text=text
-        )
-        
-        # 결과 대기 및 다운로드
-        logger.info("결과 대기 시작")
-        result = wait_for_result(session_hash)
-        if result:
-            logger.info("결과 다운로드 시작")
-            output_path = os.path.join("temp", "output.wav")
-            download_audio(result, output_path)
-            logger.info("TTS 변환 완료")
+        for index, (sentence, task) in enumerate(zip(sentences, tasks)):
+            url, source, wav = await task
+            yield index, sentence, url, source, wav
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.post("/tts-chunked")
+async def create_tts_chunked(
+    request: Request,
+    text: str = Query(..., description="TTS로 변환할 텍스트"),
+    output: str = Query("events", description="events: 문장별 URL을 SSE로 / audio: WAV를 바로 스트리밍"),
+    voice_file: UploadFile = File(...),
+    silence_file: UploadFile = File(...),
+    user_id: str = Query(None, description="대기열 공평 분배 기준 (없으면 클라이언트 IP)"),
+    priority: str = Query("interactive", description="interactive 또는 bulk")
+):
+    """긴 텍스트를 문장 단위로 나눠 동시에 합성하고, 앞 문장부터 준비되는 대로 전송
+
+    events: 문장마다 {"stage": "chunk", "index", "total", "text", "url"}를 보내고
+            마지막에 무음 클립으로 이어 붙인 전체 음성의 URL을 보냄
+    audio : 길이 미정 WAV(16bit 모노)로 문장 사이에 무음 클립을 넣어 바로 재생 가능하게 스트리밍
+    """
+    if output not in ("events", "audio"):
+        raise HTTPException(status_code=400, detail="output은 events 또는 audio만 가능합니다.")
+    user = tts_requester(request, user_id, priority)
+    sentences = split_sentences(text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="변환할 텍스트가 비어있습니다.")
+    voice = await voice_file.read()
+    silence = await silence_file.read()
+    voice_name = voice_file.filename or "voice.wav"
+    
+    async def generate_events():
+        clips = []
+        try:
+            async for index, sentence, url, source, wav in synthesize_sentences(
+                    sentences, voice, silence, voice_name, user, priority):
+                clips.append(wav)
+                data = {"stage": "chunk", "index": index, "total": len(sentences),
+                        "text": sentence, "url": url, "source": source,
+                        "timestamp": datetime.now().isoformat()}
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
             
-            # output.wav 파일을 S3에 업로드
-            try:
-                logger.info("output.wav 파일 S3 업로드 시작")
-                
-                # 고유한 파일 이름 생성
-                unique_filename = f"tts_output/{uuid.uuid4()}.wav"
-                
-                # S3에 업로드
-                with open(output_path, "rb") as wav_file:
-                    file_content = wav_file.read()
-                    if not file_content:
-                        raise ValueError("output.wav 파일이 비어있습니다.")
-                    logger.info(f"S3에 업로드할 파일 크기: {len(file_content)} bytes")
-                    s3_client.upload_fileobj(
-                        io.BytesIO(file_content),
-                        S3_BUCKET_NAME,
-                        unique_filename,
-                        ExtraArgs={"ContentType": "audio/wav"}
-                    )
-                
-                # S3 URL 생성
-                s3_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{unique_filename}"
-                logger.info(f"TTS 결과 S3 업로드 완료: {s3_url}")
-                
-                return {"success": True, "url": s3_url}
-                
-            except Exception as e:
-                logger.error(f"output.wav S3 업로드 실패: {str(e)}")
-                return {"success": False, "error": f"S3 업로드 실패: {str(e)}"}
-            finally:
-                # output.wav 파일 정리
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                        logger.info("output.wav 임시 파일 삭제됨")
-                    except Exception as e:
-                        logger.error(f"output.wav 파일 삭제 실패: {e}")
-        else:
-            logger.error("TTS 변환 실패")
-            return {"success": False, "error": "TTS 변환 실패"}
-    except Exception as e:
-        logger.error(f"에러 발생: {str(e)}")
-        return {"error": str(e)}
+            # 전체 음성: 문장 사이에 무음 클립을 넣어 이어 붙여 업로드
+            loop = asyncio.get_running_loop()
+            full = await loop.run_in_executor(decode_pool, concat_audio, clips, silence)
+            unique_filename = f"tts_output/{uuid.uuid4()}.wav"
+            await s3_storage.upload(unique_filename, iter_bytes(full), "audio/wav")
+            data = {"stage": "completed", "completed": True, "total": len(sentences),
+                    "url": s3_storage.object_url(unique_filename)}
+        except Exception as e:
+            logger.error(f"문장 단위 TTS 실패: {str(e)}")
+            data = {"stage": "error", "error": f"TTS 변환 실패: {str(e)}"}
+        data["timestamp"] = datetime.now().isoformat()
+        yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    async def generate_audio(chunks, sr, first, gap):
+        loop = asyncio.get_running_loop()
+        try:
+            yield stream_wav_header(sr)
+            yield first
+            async for index, sentence, url, source, wav in chunks:
+                pcm, _ = await loop.run_in_executor(decode_pool, wav_to_pcm, wav, sr)
+                yield gap
+                yield pcm
+        except Exception as e:
+            # 헤더를 이미 보냈으므로 오류는 로그로 남기고 연결을 끊어 클라이언트가 불완전한 응답임을 알게 함
+            logger.error(f"문장 단위 TTS 스트리밍 중단: {str(e)}")
+            raise
+        finally:
+            await chunks.aclose()
+    
+    if output == "audio":
+        loop = asyncio.get_running_loop()
+        # 무음 클립은 합성과 동시에 한 번만 디코딩
+        silence_audio = loop.run_in_executor(decode_pool, read_audio, silence)
+        chunks = synthesize_sentences(sentences, voice, silence, voice_name, user, priority)
+        try:
+            # 첫 문장까지는 응답 전에 준비 - 실패하면 오류 응답으로 알림
+            # 첫 문장의 샘플레이트로 헤더를 쓰고 나머지는 맞춰서 이어 보냄
+            _, _, _, _, wav = await anext(chunks)
+            first, sr = await loop.run_in_executor(decode_pool, wav_to_pcm, wav, None)
+            gap, _ = await loop.run_in_executor(decode_pool, audio_to_pcm, await silence_audio, sr)
+        except Exception as e:
+            await chunks.aclose()
+            logger.error(f"문장 단위 TTS 실패: {str(e)}")
+            raise HTTPException(status_code=502, detail=f"TTS 변환 실패: {str(e)}")
+        return StreamingResponse(generate_audio(chunks, sr, first, gap),
+                                 media_type="audio/wav", headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-processing_tasks = {}
+async def clone_voice(report, text, voice_key, user, audio=None):
+    """음성 클로닝 작업: (전처리 → 업로드) → 녹음 확인 → 복제한 목소리로 문장 합성 → 결과 필드
+
+    audio가 없으면 voice_key에 이미 올라간 WAV를 사용.
+    """
+    loop = asyncio.get_running_loop()
+    if audio is not None:
+        report(10, "음성 전처리 중")
+        wav = await loop.run_in_executor(decode_pool, to_wav, audio)
+        await s3_storage.upload(voice_key, iter_bytes(wav), "audio/wav")
+    else:
+        # 방금 올린 파일은 최근 업로드 캐시에서 바로 꺼냄
+        wav = await s3_storage.fetch(voice_key)
+    report(20, "음성 파일 업로드 완료")
+    
+    y, sr = await loop.run_in_executor(decode_pool, read_audio, wav)
+    duration = len(y) / sr
+    if duration < VOICE_MIN_SECONDS:
+        raise ValueError(f"녹음이 너무 짧습니다. (최소 {VOICE_MIN_SECONDS:g}초)")
+    report(35, "음성 특성 분석 완료", duration_sec=round(duration, 2))
+    
+    # TTS 진행 단계 → 전체 진행률
+    def on_progress(event):
+        stage = event.get("stage")
+        if stage == "upload":
+            report(45, "음성 모델 준비 중")
+        elif stage == "queue":
+            report(50, "음성 합성 대기 중")
+        elif stage == "synthesis":
+            report(55 + 35 * (event.get("progress") or 0), "음성 합성 중")
+        elif stage == "download":
+            report(92, "결과 저장 중")
+    
+    report(40, "음성 합성 대기 중")
+    url, source = await get_tts_url(text, wav, SILENCE_WAV, os.path.basename(voice_key),
+                                    on_progress=on_progress, user=user)
+    return {"result_url": url, "voice_url": s3_storage.object_url(voice_key),
+            "message": "AI 모델 생성 완료"}
+
+async def start_voice_job(text, voice_key, audio_info, user, audio=None):
+    """음성 클로닝 작업을 등록하고 백그라운드에서 시작 → 작업 ID"""
+    task_id = str(uuid.uuid4())
+    record = {
+        "type": "voice",
+        "status": "queued",
+        "start_time": datetime.now().isoformat(),
+        "text": text,
+        "progress": 0,
+        "message": "대기 중",
+        "user": user,
+        "audio_info": audio_info
+    }
+    await task_store.put(task_id, record)
+    job_runner.start(task_id, lambda report: clone_voice(report, text, voice_key, user, audio), record)
+    return task_id
 
 @app.get("/")
 async def root():
@@ -934,6 +1693,7 @@ async def root():
 
 @app.post("/process-voice")
 async def process_voice(
+    request: Request,
     text: str = Form(...),
     audio: UploadFile = File(...)
 ):
@@ -946,9 +1706,6 @@ async def process_voice(
         if not audio.filename:
             raise HTTPException(status_code=400, detail="오디오 파일이 필요합니다.")
         
-        # 고유 작업 ID 생성
-        task_id = str(uuid.uuid4())
-        
         # 파일 정보 읽기
         audio_content = await audio.read()
         
@@ -957,17 +1714,12 @@ async def process_voice(
         if len(audio_content) > max_size:
             raise HTTPException(status_code=413, detail="파일 크기가 너무 큽니다. (최대 10MB)")
         
-        # 작업 정보 저장
-        processing_tasks[task_id] = {
-            "status": "processing",
-            "start_time": datetime.now(),
-            "text": text,
-            "audio_info": {
-                "filename": audio.filename,
-                "content_type": audio.content_type,
-                "size_bytes": len(audio_content)
-            }
-        }
+        # 작업 등록 후 바로 시작 (WAV 변환 → 업로드 → 합성, 진행률은 스트림으로)
+        task_id = await start_voice_job(text, f"model/{uuid.uuid4()}.wav", {
+            "filename": audio.filename,
+            "content_type": audio.content_type,
+            "size_bytes": len(audio_content)
+        }, request.client.host if request.client else "anonymous", audio=audio_content)
         
         # 받은 데이터 정보
         received_data = {
@@ -1026,79 +1778,83 @@ async def process_voice(
         #print(f"오류 발생: {str(e)}")
         return error_response
 
+def voice_event(task_id, task):
+    """음성 클로닝 작업 정보 → 진행률 스트림 이벤트 (끝난 작업이면 완료/오류 이벤트)"""
+    if task["status"] == "completed":
+        # 완료 신호
+        return {"task_id": task_id, "progress": 100, "message": "처리 완료", "completed": True,
+                "result_url": task.get("result_url"), "voice_url": task.get("voice_url")}
+    if task["status"] in FINISHED:
+        return {"task_id": task_id, "progress": task.get("progress", 0),
+                "error": task.get("error") or "작업이 취소되었습니다.", "status": task["status"]}
+    return {"task_id": task_id, "progress": task.get("progress", 0), "message": task.get("message")}
+
+def sse_message(data, event_id=None):
+    data = dict(data, timestamp=datetime.now().isoformat())
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.get("/process-voice-stream/{task_id}")
-async def process_voice_stream(task_id: str):
-    """실시간 진행률을 스트리밍하는 엔드포인트"""
+async def process_voice_stream(
+    task_id: str,
+    request: Request,
+    last_event_id: int = Query(None, description="이 이벤트 ID 다음부터 받기 (없으면 Last-Event-ID 헤더)")
+):
+    """실시간 진행률을 스트리밍하는 엔드포인트
+
+    이 프로세스에서 도는 작업은 방송 허브를 구독 (여러 화면이 같은 작업을 봐도 작업은 한 번만 발행),
+    다른 워커의 작업이면 작업 저장소의 진행률이 바뀔 때마다 전송.
+    이벤트가 없으면 SSE_HEARTBEAT초마다 주석 줄을 보내 연결을 유지.
+    """
     
     # 작업 ID 유효성 검사
-    if task_id not in processing_tasks:
+    if await task_store.get(task_id) is None:
         raise HTTPException(status_code=404, detail="작업 ID를 찾을 수 없습니다.")
     
-    async def generate():
-        try:
-            #print(f"SSE 스트림 시작 - Task ID: {task_id}")
-            
-            steps = [
-                (10, "음성 파일 업로드 완료"),
-                (20, "음성 전처리 시작"),
-                (35, "음성 특성 분석 중"),
-                (50, "텍스트-음성 매핑 진행"),
-                (65, "AI 모델 훈련 시작"),
-                (80, "모델 최적화 중"),
-                (95, "품질 검증 수행"),
-                (100, "AI 모델 생성 완료")
-            ]
-            
-            for progress, message in steps:
-                data = {
-                    "task_id": task_id,
-                    "progress": progress,
-                    "message": message,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                #print(f"진행률 전송: {progress}% - {message}")
-                
-                # SSE 형식으로 데이터 전송
-                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-                
-                # 각 단계별 대기시간
-                if progress < 100:
-                    await asyncio.sleep(1.5)  # 1.5초 대기
-                    
-            # 완료 신호
-            completion_data = {
-                "task_id": task_id,
-                "progress": 100,
-                "message": "처리 완료",
-                "completed": True,
-                "timestamp": datetime.now().isoformat(),
-                "result_url": f"/download/{task_id}"  # 결과 다운로드 URL 추가
-            }
-            yield f"data: {json.dumps(completion_data, ensure_ascii=False)}\n\n"
-            
-            # 작업 상태 업데이트
-            processing_tasks[task_id]["status"] = "completed"
-            processing_tasks[task_id]["end_time"] = datetime.now()
-            
-            #print(f"SSE 스트림 완료 - Task ID: {task_id}")
-            
-        except Exception as e:
-            #print(f"SSE 스트림 오류: {str(e)}")
-            error_data = {
-                "task_id": task_id,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
-            yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
-            
-            # 작업 상태를 오류로 업데이트
-            if task_id in processing_tasks:
-                processing_tasks[task_id]["status"] = "error"
-                processing_tasks[task_id]["error"] = str(e)
+    # 브라우저 EventSource는 재연결할 때 마지막으로 받은 id를 Last-Event-ID 헤더로 보냄
+    header = request.headers.get("last-event-id", "")
+    if last_event_id is None and header.isdigit():
+        last_event_id = int(header)
+    
+    async def from_hub(sub):
+        with sub:
+            while not sub.done:
+                event = await sub.get(SSE_HEARTBEAT)
+                if event is None:
+                    if not sub.done:
+                        yield ": keep-alive\n\n"
+                    continue
+                event_id, task = event
+                if task:
+                    # SSE 형식으로 데이터 전송
+                    yield sse_message(voice_event(task_id, task), event_id)
+    
+    async def from_store():
+        last, sent_at = None, time.monotonic()
+        while True:
+            task = await task_store.get(task_id)
+            if task is None:
+                yield sse_message({"task_id": task_id, "error": "작업 정보가 만료되었습니다."})
+                break
+            event = voice_event(task_id, task)
+            if event != last:
+                last, sent_at = event, time.monotonic()
+                yield sse_message(event)
+            elif time.monotonic() - sent_at >= SSE_HEARTBEAT:
+                sent_at = time.monotonic()
+                yield ": keep-alive\n\n"
+            if task["status"] in FINISHED:
+                break
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+    
+    # 응답을 돌려주기 전에 구독해 둠 (스트림이 시작될 때쯤 주제가 만료되어 사라져도 받은 이벤트는 남음)
+    try:
+        stream = from_hub(event_hub.subscribe(task_id, last_event_id))
+    except KeyError:
+        stream = from_store()
 
     return StreamingResponse(
-        generate(),
+        stream,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -1113,39 +1869,72 @@ async def process_voice_stream(task_id: str):
 @app.get("/status/{task_id}")
 async def get_task_status(task_id: str):
     """작업 상태 조회"""
-    if task_id not in processing_tasks:
+    task = await task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="작업 ID를 찾을 수 없습니다.")
     
-    task = processing_tasks[task_id]
-    return {
+    status = {
         "task_id": task_id,
         "status": task["status"],
-        "start_time": task["start_time"].isoformat(),
-        "text_length": len(task["text"]),
-        "audio_filename": task["audio_info"]["filename"]
+        "start_time": task["start_time"],
+        "text_length": len(task.get("text", "")),
+        "audio_filename": (task.get("audio_info") or task.get("file_info") or {}).get("filename")
     }
+    if task.get("type") == "tts":
+        # TTS 대기열 작업: 우선순위, 앞에 남은 작업 수, 결과
+        status.update(
+            type="tts",
+            priority=task.get("priority"),
+            position=tts_queue.position(task_id) if task["status"] == "queued" else None,
+            result_url=task.get("result_url"),
+            error=task.get("error")
+        )
+    elif task.get("type") == "voice":
+        # 음성 클로닝 작업: 진행률, 결과
+        status.update(
+            type="voice",
+            progress=task.get("progress", 0),
+            message=task.get("message"),
+            result_url=task.get("result_url"),
+            voice_url=task.get("voice_url"),
+            error=task.get("error")
+        )
+    return status
 
 @app.delete("/tasks/{task_id}")
 async def cancel_task(task_id: str):
     """작업 취소"""
-    if task_id not in processing_tasks:
+    task = await task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="작업 ID를 찾을 수 없습니다.")
+    if task["status"] in FINISHED:
+        # 이미 끝난 작업의 결과(완료/오류)를 취소로 덮어쓰지 않음
+        raise HTTPException(status_code=409, detail=f"이미 끝난 작업입니다. (상태: {task['status']})")
     
-    processing_tasks[task_id]["status"] = "cancelled"
+    # TTS 대기열 작업은 대기열에서 빼거나 실행을 중단, 음성 클로닝 작업은 실행 중단
+    # (다른 워커에서 실행 중인 작업은 상태를 보고 다음 진행 단계에서 멈춤)
+    if task.get("type") == "tts":
+        tts_queue.cancel(task_id)
+    else:
+        job_runner.cancel(task_id)
+    await task_store.update(task_id, status="cancelled")
     return {"message": "작업이 취소되었습니다.", "task_id": task_id}
 
 @app.get("/tasks")
 async def list_tasks():
-    """모든 작업 목록 조회"""
+    """모든 작업 목록 조회 (보관 기간이 지난 작업은 제외)"""
     tasks = []
-    for task_id, task_info in processing_tasks.items():
+    for task_id, task_info in await task_store.items():
+        text = task_info.get("text", "")
         tasks.append({
             "task_id": task_id,
+            "type": task_info.get("type"),
             "status": task_info["status"],
-            "start_time": task_info["start_time"].isoformat(),
-            "text_preview": task_info["text"][:50] + "..." if len(task_info["text"]) > 50 else task_info["text"]
+            "start_time": task_info["start_time"],
+            "text_preview": text[:50] + "..." if len(text) > 50 else text
         })
-    return {"tasks": tasks, "total": len(tasks)}
+    return {"tasks": tasks, "total": len(tasks), "tts_queue": tts_queue.stats(),
+            "event_hub": event_hub.stats()}
 
 
 if __name__ == "__main__":
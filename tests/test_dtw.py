@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""dtw_align 회귀 테스트 - full은 기존 dtw와 같은 값, band/fast는 문서에 적힌 오차 안"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+from dtw import dtw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VoiceAnalyzer import dtw_align
+
+
+def warped(frames, dims, seed):
+    """시간축을 살짝 늘이고 줄인 사인파 묶음 + 잡음 (말하는 속도가 다른 두 녹음 흉내)"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, frames)
+    w = t + 0.05 * np.sin(2 * np.pi * t * rng.uniform(1, 3))
+    base = np.stack([np.sin(2 * np.pi * (k + 1) * 1.7 * w + k) for k in range(dims)], axis=1)
+    return base + 0.3 * rng.standard_normal((frames, dims))
+
+
+def envelope(frames, seed):
+    """RMS처럼 0 이상이고 부드러운 1차원 포락선"""
+    x = np.abs(warped(frames, 1, seed)[:, 0])
+    return np.convolve(x, np.ones(9) / 9, mode="same").reshape(-1, 1)
+
+
+# Analyzer의 점수 식에서 DTW 거리가 들어가는 부분만
+def mfcc_score(dist, frames, dims=13):
+    norm = dist / (frames * dims)
+    return 100 * (1 - norm / (norm + 1.8))
+
+
+def energy_term(normalized):
+    return 100 * 0.4 * min(1, normalized / 2)
+
+
+def intonation_term(normalized):
+    return 100 * 0.7 * min(1, normalized)
+
+
+class DtwAlignTest(unittest.TestCase):
+    # dtw_align 문서의 full 대비 점수 차이 상한 (band / fast)
+    MFCC_TOL       = {"band": 2.2, "fast": 0.7}
+    ENERGY_TOL     = {"band": 0.1, "fast": 0.1}
+    INTONATION_TOL = {"band": 3.5, "fast": 0.0}
+
+    def test_full_matches_dtw_package(self):
+        for frames in (50, 300):
+            x, y = warped(frames, 13, 1), warped(frames, 13, 2)
+            expected = dtw(x, y, dist_method="euclidean")
+            got = dtw_align(x, y, "full")
+            self.assertAlmostEqual(got.distance, expected.distance, places=9)
+            self.assertAlmostEqual(got.normalizedDistance, expected.normalizedDistance, places=9)
+
+    def test_restricted_modes_never_beat_full(self):
+        # band/fast는 허용 경로가 full의 부분집합이라 거리가 줄어들 수 없음
+        x, y = warped(400, 13, 3), warped(360, 13, 4)
+        full = dtw_align(x, y, "full").distance
+        for mode in ("band", "fast"):
+            self.assertGreaterEqual(dtw_align(x, y, mode).distance, full - 1e-9, mode)
+
+    def test_mfcc_score_within_documented_bound(self):
+        # 32초 녹음 = 약 1000~1400프레임 (hop 512) - fast가 여러 단계 재귀하는 길이
+        frames = 1500
+        x, y = warped(frames, 13, 5), warped(frames, 13, 6)
+        full = mfcc_score(dtw_align(x, y, "full").distance, frames)
+        for mode, tol in self.MFCC_TOL.items():
+            diff = full - mfcc_score(dtw_align(x, y, mode).distance, frames)
+            self.assertLessEqual(diff, tol + 1e-9, mode)
+
+    def test_energy_and_intonation_within_documented_bound(self):
+        for seed in range(5):
+            rms_r, rms_u = envelope(800, seed), envelope(800, seed + 10)
+            contour_r, contour_u = warped(100, 1, seed), warped(100, 1, seed + 10)
+            energy = energy_term(dtw_align(rms_r, rms_u, "full").normalizedDistance)
+            intonation = intonation_term(dtw_align(contour_r, contour_u, "full").normalizedDistance)
+            for mode in ("band", "fast"):
+                self.assertLessEqual(
+                    energy_term(dtw_align(rms_r, rms_u, mode).normalizedDistance) - energy,
+                    self.ENERGY_TOL[mode] + 1e-9, mode)
+                self.assertLessEqual(
+                    intonation_term(dtw_align(contour_r, contour_u, mode).normalizedDistance) - intonation,
+                    self.INTONATION_TOL[mode] + 1e-9, mode)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            dtw_align(np.zeros((3, 1)), np.zeros((3, 1)), "exact")
+
+
+if __name__ == "__main__":
+    unittest.main()
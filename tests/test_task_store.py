@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""작업 저장소/JobRunner 동작 테스트 (python -m pytest 또는 python -m unittest discover tests)"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EventHub import EventHub
+from TaskStore import (AsyncTaskStore, JobRunner, MemoryTaskStore, SQLiteTaskStore,
+                       open_task_store)
+
+
+class MemoryTaskStoreTest(unittest.TestCase):
+    def test_update_merges_fields(self):
+        store = MemoryTaskStore()
+        store.put("a", {"status": "queued", "progress": 0})
+        self.assertEqual(store.update("a", progress=50), {"status": "queued", "progress": 50})
+        self.assertIsNone(store.update("없음", progress=1))
+
+    def test_ttl_eviction(self):
+        store = MemoryTaskStore(ttl=10)
+        with mock.patch("TaskStore.time.monotonic", return_value=100.0):
+            store.put("old", {"status": "queued"})
+        with mock.patch("TaskStore.time.monotonic", return_value=105.0):
+            store.put("new", {"status": "queued"})
+        with mock.patch("TaskStore.time.monotonic", return_value=111.0):
+            self.assertIsNone(store.get("old"))
+            self.assertIsNotNone(store.get("new"))
+            self.assertEqual([task_id for task_id, _ in store.items()], ["new"])
+
+    def test_max_items_drops_least_recently_updated(self):
+        store = MemoryTaskStore(max_items=2)
+        for task_id in ("a", "b"):
+            store.put(task_id, {"status": "queued"})
+        store.update("a", status="processing")     # a가 가장 최근
+        store.put("c", {"status": "queued"})
+        self.assertEqual([task_id for task_id, _ in store.items()], ["a", "c"])
+
+
+class SQLiteTaskStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "tasks.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_shared_between_connections(self):
+        first, second = SQLiteTaskStore(self.path), SQLiteTaskStore(self.path)
+        try:
+            first.put("a", {"status": "queued", "text": "안녕하세요"})
+            self.assertEqual(second.update("a", status="cancelled"),
+                             {"status": "cancelled", "text": "안녕하세요"})
+            self.assertEqual(first.get("a")["status"], "cancelled")
+            second.delete("a")
+            self.assertIsNone(first.get("a"))
+        finally:
+            first.close()
+            second.close()
+
+    def test_ttl_eviction(self):
+        store = SQLiteTaskStore(self.path, ttl=10)
+        try:
+            with mock.patch("TaskStore.time.time", return_value=1000.0):
+                store.put("old", {"status": "queued"})
+            with mock.patch("TaskStore.time.time", return_value=1005.0):
+                store.put("new", {"status": "queued"})
+            with mock.patch("TaskStore.time.time", return_value=1011.0):
+                self.assertIsNone(store.get("old"))
+                self.assertIsNone(store.update("old", status="error"))
+                self.assertEqual([task_id for task_id, _ in store.items()], ["new"])
+        finally:
+            store.close()
+
+
+class OpenTaskStoreTest(unittest.TestCase):
+    def test_urls(self):
+        self.assertIsInstance(open_task_store("memory"), MemoryTaskStore)
+        self.assertIsInstance(open_task_store(""), MemoryTaskStore)
+        store = open_task_store("sqlite://:memory:")
+        self.assertIsInstance(store, SQLiteTaskStore)
+        store.close()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = open_task_store("sqlite://" + os.path.join(tmp, "tasks.db"), ttl=60)
+            self.assertEqual(store.ttl, 60)
+            store.close()
+        with self.assertRaises(ValueError):
+            open_task_store("mongodb://localhost")
+
+
+class JobRunnerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.dir.name, "tasks.db")
+        # 같은 파일을 쓰는 두 워커
+        self.store = AsyncTaskStore(SQLiteTaskStore(path))
+        self.other = AsyncTaskStore(SQLiteTaskStore(path))
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        await self.other.close()
+        self.dir.cleanup()
+
+    async def start(self, runner, run):
+        record = {"status": "queued", "progress": 0}
+        await self.store.put("job", record)
+        return runner.start("job", run, record)
+
+    async def test_completed_with_result(self):
+        hub = EventHub()
+        runner = JobRunner(self.store, hub)
+
+        async def run(report):
+            report(30, "절반")
+            await asyncio.sleep(0)
+            report(20, "되돌아가지 않음")
+            return {"result_url": "s3://결과"}
+
+        await (await self.start(runner, run))
+        record = await self.other.get("job")
+        self.assertEqual(record["status"], "completed")
+        self.assertEqual(record["progress"], 100)
+        self.assertEqual(record["result_url"], "s3://결과")
+        with hub.subscribe("job") as sub:
+            events = []
+            while (event := await sub.get(0.1)) is not None:
+                events.append(event[1])
+        self.assertEqual(events[-1]["status"], "completed")
+        self.assertEqual([e["progress"] for e in events if "progress" in e],
+                         sorted(e["progress"] for e in events if "progress" in e))
+
+    async def test_cancel_from_other_worker(self):
+        runner = JobRunner(self.store)
+        step = asyncio.Event()
+
+        async def run(report):
+            for i in range(1000):
+                report(i % 100, "진행 중")
+                step.set()
+                await asyncio.sleep(0.01)
+            return {}
+
+        task = await self.start(runner, run)
+        await step.wait()
+        await self.other.update("job", status="cancelled")
+        await asyncio.wait_for(asyncio.gather(task, return_exceptions=True), 5)
+        record = await self.other.get("job")
+        self.assertEqual(record["status"], "cancelled")
+        self.assertIn("end_time", record)
+
+    async def test_error(self):
+        runner = JobRunner(self.store)
+
+        async def run(report):
+            raise ValueError("녹음이 너무 짧습니다.")
+
+        await (await self.start(runner, run))
+        record = await self.store.get("job")
+        self.assertEqual((record["status"], record["error"]), ("error", "녹음이 너무 짧습니다."))
+
+    async def test_cancel_before_start(self):
+        runner = JobRunner(self.store)
+
+        async def run(report):
+            return {}
+
+        await self.start(runner, run)
+        self.assertTrue(runner.cancel("job"))
+        await runner.stop()
+        self.assertEqual((await self.store.get("job"))["status"], "cancelled")
+        self.assertFalse(runner.cancel("job"))
+
+
+if __name__ == "__main__":
+    unittest.main()